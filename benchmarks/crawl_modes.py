@@ -0,0 +1,146 @@
+# End to end benchmark of the crawlers against a local synthetic site (see synthetic_site.py). Every crawl
+# runs in a process of its own, so its peak memory and CPU time aren't mixed with the server's or with the
+# other crawls'. The pages are split over two hosts by default, which the sharded modes crawl with a coordinator
+# and one worker process per shard, all on localhost. Reports pages per second, fetch latency percentiles, bytes received, peak RSS and CPU time per
+# page. HTTP/2 modes crawl the same site served over h2c and need the h2 package. Every crawl has to finish and
+# find the same pages as the first one, including the pages answering corrupted bodies, or the benchmark fails.
+# Run from the repository root: python benchmarks/crawl_modes.py [--pages N] [--modes sync async ...]
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_site import add_site_arguments, site_from_arguments  # noqa: E402
+
+
+# Crawler class and options of every mode
+MODES = {
+    'sync': ('sync', {}),
+    'sync-workers-8': ('sync', {'workers': 8}),
+    'async': ('async', {}),
+    'async-parse-2': ('async', {'parse_processes': 2}),
+    'async-max-memory': ('async', {'max_memory': 16}),
+    'async-http2': ('async', {'http2': 'h2c'}),
+    'sync-identity': ('sync', {'request_header': {'Accept-Encoding': 'identity'}}),
+    'sync-shards-2': ('shards', {'shards': 2}),
+    'async-shards-2': ('shards', {'shards': 2, 'asynchronous': True}),
+}
+
+
+def run_crawl(mode, url):
+    # Runs in the child process, prints the measurements as JSON
+    if MODES[mode][0] == 'sync':
+        from pysitemap.crawler import Crawler
+    elif MODES[mode][0] == 'async':
+        from pysitemap.async_crawler import Crawler
+    else:
+        from pysitemap.distributed import Coordinator as Crawler
+    # Every host of the site is on 127.0.0.1
+    crawler = Crawler(url, no_verbose=True, domain=urlsplit(url).hostname, **MODES[mode][1])
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    started = time.perf_counter()
+    pages = crawler.start()
+    # The coordinator doesn't collect metrics, the workers do
+    metrics = getattr(crawler, 'metrics', None)
+    fetch = metrics.fetch_seconds if metrics is not None else None
+    # Parse processes are shut down by close(), their usage is only reported once they exited
+    crawler.close()
+    elapsed = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = after.ru_utime + after.ru_stime - before.ru_utime - before.ru_stime + children.ru_utime + \
+        children.ru_stime
+    # Kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    print(json.dumps({
+        'pages': len(pages),
+        # Without the host, HTTP/2 modes crawl the site on another port
+        'paths': sorted(urlsplit(page)._replace(scheme='', netloc='').geturl() for page in pages),
+        'parsed': metrics.pages if metrics is not None else None,
+        'requests': metrics.requests if metrics is not None else None,
+        'bytes': metrics.bytes if metrics is not None else None,
+        'errors': sum(metrics.errors.values()) if metrics is not None else None,
+        'seconds': elapsed,
+        'cpu': cpu,
+        'p50': fetch.quantile(0.5) if fetch is not None else None,
+        'p99': fetch.quantile(0.99) if fetch is not None else None,
+        'rss': max(after.ru_maxrss, children.ru_maxrss) * scale,
+    }))
+
+
+def measure(mode, url):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', mode, url],
+                            check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawler benchmark on a local synthetic site')
+    add_site_arguments(parser)
+    parser.set_defaults(hosts=2)
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=list(MODES), help='crawler modes to run')
+    parser.add_argument('--repeat', type=int, default=3, help='crawls per mode, the median one is reported')
+    parser.add_argument('--run', nargs=2, metavar=('MODE', 'URL'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        return run_crawl(*args.run)
+
+    site = site_from_arguments(args)
+    url = site.start()
+    http2_url = site.start_http2() if any(MODES[mode][1].get('http2') for mode in args.modes) else None
+    try:
+        print('%d pages on %d hosts, fanout %d, depth %d, %.0f%% redirects (chains of %d), %.0f%% errors, %s latency %.1f ms, '
+              '%.0f%% corrupted, %d bytes per page' % (
+                  site.pages, site.hosts, site.fanout, site.depth, site.redirect_rate * 100, site.redirect_chain,
+                  site.error_rate * 100, site.latency_distribution, site.latency * 1000, site.corrupt_rate * 100,
+                  site.page_size))
+        # Found counts the urls that redirected too, parsed only the pages that were read. Sharded modes have no
+        # metrics of the whole crawl, their rates are per url found.
+        print('%-18s %7s %7s %9s %9s %9s %9s %11s %13s' % ('mode', 'found', 'parsed', 'pages/s', 'p50 ms', 'p99 ms',
+                                                            'MB in', 'peak RSS MB', 'CPU ms/page'))
+        expected = None
+        different = []
+        for mode in args.modes:
+            mode_url = http2_url if MODES[mode][1].get('http2') else url
+            runs = sorted((measure(mode, mode_url) for _ in range(args.repeat)), key=lambda run: run['seconds'])
+            run = runs[len(runs) // 2]
+            if expected is None:
+                expected = runs[0]['paths']
+            if any(r['paths'] != expected for r in runs):
+                different.append(mode)
+            print('%-18s %7d %7s %9.1f %9s %9s %9s %11.1f %13.3f' % (
+                mode, run['pages'], _optional('%d', run['parsed']), _count(run) / run['seconds'],
+                _milliseconds(run['p50']), _milliseconds(run['p99']),
+                _optional('%.1f', run['bytes'] / 1024 / 1024 if run['bytes'] is not None else None),
+                run['rss'] / 1024 / 1024, run['cpu'] / max(1, _count(run)) * 1000))
+            if len(runs) > 1:
+                spread = statistics.pstdev(_count(r) / r['seconds'] for r in runs)
+                print('%-18s %7s %7s %9s' % ('', '', '', '+-%.1f' % spread))
+    finally:
+        site.close()
+    if different:
+        print('pages found differ from %s: %s' % (args.modes[0], ' '.join(different)))
+        return 1
+
+
+def _count(run):
+    return run['parsed'] if run['parsed'] is not None else run['pages']
+
+
+def _optional(format, value):
+    return format % value if value is not None else '-'
+
+
+def _milliseconds(seconds):
+    return _optional('%.2f', seconds * 1000 if seconds is not None else None)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
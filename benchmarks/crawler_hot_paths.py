@@ -0,0 +1,67 @@
+# Micro-benchmarks of the per-page and per-link work of the crawler, on the pages of a synthetic site (see
+# synthetic_site.py): _extract_urls, _normalize, _url_excluded and generate_sitemap. Nothing is fetched.
+# Run from the repository root: python benchmarks/crawler_hot_paths.py [--pages N] [--fanout N]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pysitemap.crawler import Crawler  # noqa: E402
+from synthetic_site import add_site_arguments, site_from_arguments  # noqa: E402
+
+
+ROOT_URL = 'http://127.0.0.1:8000/'
+EXCLUDE = r'/static/ \.pdf$ [?&]session= /tag/ /archive/20\d\d/'
+
+
+def best(function, items, repeat):
+    # Seconds per item of the fastest run
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for item in items:
+            function(item)
+        timings.append(time.perf_counter() - started)
+    return min(timings) / len(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawler hot path micro-benchmarks')
+    add_site_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs, the best one is reported')
+    args = parser.parse_args()
+
+    site = site_from_arguments(args)
+    bodies = [site.body(page) for page in range(site.pages)]
+    hrefs = [href for page in range(site.pages) for href in site.links(page)]
+    urls = [ROOT_URL + href.lstrip('/') for href in hrefs]
+    print('%d pages of %d bytes, %d links' % (len(bodies), site.page_size, len(hrefs)))
+
+    crawler = Crawler(ROOT_URL, exclude=EXCLUDE, no_verbose=True, robots=False)
+    print('%-34s %12.2f us/page' % ('_extract_urls', best(crawler._extract_urls, bodies, args.repeat) * 1e6))
+
+    # A fresh crawler for each, so the normalize and exclude caches start empty and the first run pays for
+    # the misses like a crawl does
+    print('%-34s %12.3f us/link' % ('_normalize', best(
+        Crawler(ROOT_URL, no_verbose=True, robots=False)._normalize, urls, 1) * 1e6))
+    print('%-34s %12.3f us/link' % ('_normalize, cached', best(crawler._normalize, urls, args.repeat) * 1e6))
+    print('%-34s %12.3f us/link' % ('_url_excluded', best(
+        Crawler(ROOT_URL, exclude=EXCLUDE, no_verbose=True, robots=False)._url_excluded, urls, 1) * 1e6))
+    print('%-34s %12.3f us/link' % ('_url_excluded, memoized', best(crawler._url_excluded, urls, args.repeat) * 1e6))
+
+    for url in sorted(set(urls)):
+        crawler._add_node(crawler._urls.intern(url), '2024-01-01')
+    pages = len(crawler._graph)
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        sitemap = crawler.generate_sitemap()
+    elapsed = (time.perf_counter() - started) / args.repeat
+    print('%-34s %12.2f ms (%d urls, %.2f us/url, %d bytes)' % ('generate_sitemap', elapsed * 1e3, pages,
+                                                              elapsed / pages * 1e6, len(sitemap)))
+    crawler.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# Micro-benchmark of _Crawler._url_excluded against the per-pattern loop it replaced, as the number of
+# --exclude patterns grows. Links repeat across pages like navigation links do on a real site.
+# Run from the repository root: python benchmarks/exclude_patterns.py [--links N] [--distinct N]
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pysitemap.crawler import Crawler  # noqa: E402
+
+
+def legacy_excluded(url, patterns, max_path_depth=None):
+    # _Crawler._url_excluded before the patterns were compiled
+    excluded = False
+    for pattern in patterns:
+        excluded |= (re.search(pattern, url) is not None)
+    if max_path_depth:
+        excluded |= url.count('/') > max_path_depth
+    return excluded
+
+
+def build_patterns(count):
+    kinds = (r'/tag/word%d(/|$)', r'\.ext%d$', r'/section-%d/', r'[?&]session%d=', r'/archive/20%02d/')
+    return [kinds[i % len(kinds)] % i for i in range(count)]
+
+
+def build_links(count, distinct, seed=0):
+    generator = random.Random(seed)
+    urls = ['http://www.example.com/section-%d/item/%d?page=%d' % (i % 40, i, i % 7) for i in range(distinct)]
+    return [generator.choice(urls) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exclude pattern micro-benchmark')
+    parser.add_argument('--links', type=int, default=20000, help='links checked per timing run')
+    parser.add_argument('--distinct', type=int, default=2000, help='distinct urls among those links')
+    parser.add_argument('--patterns', type=int, nargs='+', default=[1, 10, 100, 300],
+                        help='numbers of exclude patterns to time')
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs, the best one is reported')
+    args = parser.parse_args()
+
+    links = build_links(args.links, args.distinct)
+    print('%d links per run, %d distinct' % (len(links), args.distinct))
+    print('%9s %16s %16s %16s' % ('patterns', 'legacy us/link', 'combined us/link', 'memoized us/link'))
+    for count in args.patterns:
+        patterns = build_patterns(count)
+        timings = [best(make, links, args.repeat) for make in (
+            lambda: lambda link: legacy_excluded(link, patterns),
+            lambda: Crawler('http://www.example.com', exclude=' '.join(patterns), robots=False)._filter.pattern.search,
+            # A fresh crawler every run, so the memo starts empty
+            lambda: Crawler('http://www.example.com', exclude=' '.join(patterns), robots=False)._url_excluded,
+        )]
+        print('%9d %16.2f %16.2f %16.2f' % ((count,) + tuple(timings)))
+
+
+def best(make, links, repeat):
+    timings = []
+    for _ in range(repeat):
+        excluded = make()
+        started = time.perf_counter()
+        for link in links:
+            excluded(link)
+        timings.append(time.perf_counter() - started)
+    return min(timings) / len(links) * 1e6
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# Micro-benchmark of the link extraction engine against the regex the crawlers used before.
+# Run from the repository root: python benchmarks/extract_urls.py [--pages N] [--links N]
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pysitemap.link_extractor import LinkExtractor, extract_links  # noqa: E402
+
+
+# The pattern _Crawler._extract_urls used to run on str(html)
+LEGACY_PATTERN = '<a [^>]*href=[\'|"](.*?)[\'"].*?>'
+
+
+def legacy_extract(body):
+    return re.findall(LEGACY_PATTERN, str(body))
+
+
+def compiled_legacy_extract(body, _pattern=re.compile(LEGACY_PATTERN)):
+    return _pattern.findall(str(body))
+
+
+def streaming_extract(body, chunk_size=16 * 1024):
+    extractor = LinkExtractor(base_url='http://www.example.com/')
+    for i in range(0, len(body), chunk_size):
+        extractor.feed(body[i:i + chunk_size])
+    return extractor.close().links
+
+
+def build_page(links):
+    parts = ['<!DOCTYPE html><html><head><meta charset="utf-8"><title>Benchmark page</title>',
+             '<link rel="stylesheet" href="/static/site.css">',
+             '<link rel="canonical" href="http://www.example.com/page">',
+             '<link rel="alternate" hreflang="de" href="/de/page">',
+             '<script>var x = "<a href=\\"/not-a-link\\">";</script></head><body>']
+    for i in range(links):
+        parts.append('<div class="item item-%d"><p>Überschrift %d &mdash; some descriptive text to pad the '
+                     'document like real markup does, with <b>inline</b> <i>tags</i>.</p>' % (i, i))
+        if i % 10 == 0:
+            parts.append('<area shape="rect" coords="0,0,10,10" href="/map/%d">' % i)
+        parts.append('<a class="link" data-id="%d" href="/section/%d/item?id=%d&amp;ref=list">Item %d</a></div>'
+                     % (i, i % 17, i, i))
+    parts.append('</body></html>')
+    return ''.join(parts).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Link extraction micro-benchmark')
+    parser.add_argument('--pages', type=int, default=200, help='pages extracted per timing run')
+    parser.add_argument('--links', type=int, default=300, help='links per synthetic page')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs, the best one is reported')
+    args = parser.parse_args()
+
+    body = build_page(args.links)
+    print('page size: %d bytes, %d links, %d pages per run' % (len(body), args.links, args.pages))
+
+    candidates = (
+        ('legacy regex on str(bytes)', legacy_extract),
+        ('legacy regex, precompiled', compiled_legacy_extract),
+        ('extract_links on bytes', lambda page: extract_links(page, base_url='http://www.example.com/').links),
+        ('LinkExtractor, 16KB chunks', streaming_extract),
+    )
+    baseline = None
+    for name, function in candidates:
+        best = min(timeit.repeat(lambda: function(body), number=args.pages, repeat=args.repeat))
+        per_page = best / args.pages * 1e6
+        baseline = baseline or per_page
+        print('%-30s %10.1f us/page %8.2fx  (%d links found)'
+              % (name, per_page, baseline / per_page, len(function(body))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# Benchmark of the PageRank and in-degree computation behind sitemap <priority>, on a random link graph shaped
+# like a crawl: every page links to fanout others, picked with a preference for a small set of popular pages
+# (navigation, home and category pages). Optionally compares with networkx.pagerank on the same graph.
+# Run from the repository root: python benchmarks/link_analysis.py [--pages N] [--fanout N] [--networkx]
+import argparse
+import os
+import random
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pysitemap.link_analysis import LinkAnalysis  # noqa: E402
+
+
+def crawl_graph(pages, fanout, compact, seed):
+    # {page id: target ids} with int32 arrays like compact_graph=True, or sets
+    generator = random.Random(seed)
+    popular = max(1, pages // 100)
+    graph = {}
+    for page in range(pages):
+        targets = {generator.randrange(popular) if generator.random() < 0.3 else generator.randrange(pages)
+                   for _ in range(fanout)}
+        graph[page] = array('i', sorted(targets)) if compact else targets
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PageRank priority benchmark')
+    parser.add_argument('--pages', type=int, default=1000000, help='pages of the graph')
+    parser.add_argument('--fanout', type=int, default=10, help='links per page')
+    parser.add_argument('--sets', action='store_true', default=False,
+                        help='keep the links in sets instead of int32 arrays (compact_graph=False)')
+    parser.add_argument('--networkx', action='store_true', default=False,
+                        help='also time networkx.pagerank, slow past a few hundred thousand pages')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    graph = crawl_graph(args.pages, args.fanout, not args.sets, args.seed)
+    edges = sum(len(targets) for targets in graph.values())
+    print('%d pages, %d links, built in %.1f s' % (len(graph), edges, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    analysis = LinkAnalysis(graph)
+    ranked = time.perf_counter() - started
+    started = time.perf_counter()
+    priorities = analysis.priorities()
+    mapped = time.perf_counter() - started
+    print('%-24s %9.2f s (%d iterations)' % ('LinkAnalysis', ranked, analysis.iterations))
+    print('%-24s %9.2f s' % ('priorities', mapped))
+    print('priority deciles: ' + ' '.join('%.1f' % value for value in
+                                          sorted(priorities.tolist())[::max(1, len(priorities) // 10)]))
+
+    if args.networkx:
+        import networkx
+        started = time.perf_counter()
+        digraph = networkx.DiGraph()
+        digraph.add_nodes_from(graph.keys())
+        digraph.add_edges_from((source, target) for source, targets in graph.items() for target in targets
+                               if source != target)
+        built = time.perf_counter() - started
+        started = time.perf_counter()
+        ranks = networkx.pagerank(digraph)
+        elapsed = time.perf_counter() - started
+        print('%-24s %9.2f s (+ %.2f s to build the DiGraph)' % ('networkx.pagerank', elapsed, built))
+        difference = max(abs(rank - ranks[page]) for page, rank in zip(analysis.pages.tolist(),
+                                                                         analysis.rank.tolist()))
+        print('largest rank difference: %.2e' % difference)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# Startup benchmark of the command line: runs python -m pysitemap in every mode against a small local synthetic
+# site (see synthetic_site.py), the way it runs from cron for small sites where starting up takes most of the
+# time. Reports the wall time of the whole run, the time spent importing modules, and which of the slow to import
+# optional packages each mode loaded. The benchmark fails if a mode loads one of them it doesn't need.
+# Run from the repository root: python benchmarks/startup.py [--pages N] [--repeat N] [--modes help sync ...]
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pysitemap import http2_backend, link_analysis  # noqa: E402
+from synthetic_site import add_site_arguments, site_from_arguments  # noqa: E402
+
+
+# Command line arguments of every mode after --url and --output, {directory} is a temporary directory, and the
+# checked packages the mode needs
+MODES = {
+    'help': (['--help'], ()),
+    'sync': ([], ()),
+    'sync-workers-4': (['--workers=4'], ()),
+    'sync-cache': (['--cache={directory}/cache.db'], ('sqlite3',)),
+    'async': (['--asynchronous'], ('aiohttp',)),
+    'async-http2': (['--asynchronous', '--http2'], ('aiohttp', 'h2')),
+    'sync-priority': (['--priority'], ('numpy', 'scipy')),
+}
+# Packages worth keeping out of a run that doesn't use them, loading a checked one fails the benchmark
+CHECKED = ('aiohttp', 'h2', 'numpy', 'scipy', 'networkx', 'sqlite3')
+OPTIONAL = CHECKED + ('ujson', 'multiprocessing', 'urllib.request')
+
+
+def command(mode, url, directory, import_time=False):
+    return [sys.executable] + (['-X', 'importtime'] if import_time else []) + \
+        ['-m', 'pysitemap', '--url', url, '--output', os.path.join(directory, 'sitemap.xml'), '--no-verbose'] + \
+        [argument.format(directory=directory) for argument in MODES[mode][0]]
+
+
+def imports(mode, url, directory):
+    # Seconds spent importing and the optional packages loaded, from the output of python -X importtime
+    result = subprocess.run(command(mode, url, directory, True), cwd=ROOT, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    total = 0
+    loaded = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        # Top level imports include the time of the ones they made
+        if not name.startswith('  '):
+            total += int(cumulative)
+        module = name.strip()
+        loaded.update(package for package in OPTIONAL if module == package or module.startswith(package + '.'))
+    return total / 1000000, loaded
+
+
+def wall_time(mode, url, directory):
+    started = time.perf_counter()
+    subprocess.run(command(mode, url, directory), cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                   check=mode != 'help')
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Command line startup benchmark on a local synthetic site')
+    add_site_arguments(parser)
+    parser.set_defaults(pages=20, fanout=5, depth=2, latency_ms=0.0)
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES), help='modes to run')
+    parser.add_argument('--repeat', type=int, default=10, help='runs per mode, the median one is reported')
+    args = parser.parse_args()
+
+    # Modes whose optional packages aren't installed are left out
+    missing = {'async-http2': None if http2_backend.available() else 'the h2 package',
+               'sync-priority': None if link_analysis.available() else 'numpy and scipy'}
+    site = site_from_arguments(args)
+    url = site.start()
+    http2_url = site.start_http2() if 'async-http2' in args.modes and not missing['async-http2'] else None
+    # Plain python, the floor of any run
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    interpreter = time.perf_counter() - started
+    try:
+        print('%d pages, python startup %.0f ms' % (site.pages, interpreter * 1000))
+        print('%-16s %9s %9s %11s  %s' % ('mode', 'run ms', '+-', 'imports ms', 'optional packages loaded'))
+        unneeded = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for mode in args.modes:
+                if missing.get(mode):
+                    print('%-16s needs %s' % (mode, missing[mode]))
+                    continue
+                mode_url = http2_url if mode == 'async-http2' else url
+                runs = sorted(wall_time(mode, mode_url, directory) for _ in range(args.repeat))
+                seconds, loaded = imports(mode, mode_url, directory)
+                unneeded[mode] = [package for package in CHECKED if package in loaded and
+                                  package not in MODES[mode][1]]
+                print('%-16s %9.1f %9.1f %11.1f  %s' % (
+                    mode, runs[len(runs) // 2] * 1000, statistics.pstdev(runs) * 1000, seconds * 1000,
+                    ' '.join(package for package in OPTIONAL if package in loaded) or '-'))
+    finally:
+        site.close()
+    failed = ['%s: %s' % (mode, ' '.join(packages)) for mode, packages in unneeded.items() if packages]
+    if failed:
+        print('modes loading packages they don\'t need, ' + ', '.join(failed))
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,385 @@
+# A synthetic website served from a local thread, for benchmarking the crawlers without the network.
+# Pages are spread over depth levels, every page links to fanout others: one of them keeps the next level
+# reachable, the rest are picked at random. A share of the links goes through redirect chains, a share of
+# the pages answer 500, another share answers a corrupted brotli body, and every response waits for a latency
+# drawn from the chosen distribution. Pages are gzip compressed for clients that accept it. The pages can be
+# split over several hosts, local servers on ports of their own linking to each other, for crawls spanning
+# hosts like the sharded ones (crawl them with domain='127.0.0.1'). Besides HTTP/1.1 the site can be served
+# over HTTP/2 without TLS (h2c with prior knowledge, needs the h2 package), as a local stand-in for an HTTP/2
+# server.
+# Everything is derived from the seed, so the same arguments always give the same site.
+# Serve one on its own: python benchmarks/synthetic_site.py --port 8000 [--http2-port 8001] [--pages N] ...
+import argparse
+import asyncio
+import gzip
+import itertools
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'exponential', 'lognormal')
+
+
+def _words(count, seed=1):
+    # Words of the text filling the pages, 2 to 10 letters drawn more often from the frequent ones
+    generator = random.Random(seed)
+    return [''.join(generator.choice('etaoinshrdlucmfwypvbgkjqxz'[:generator.randint(8, 26)])
+                    for _ in range(generator.randint(2, 10))) for _ in range(count)]
+
+
+_WORDS = _words(2000)
+# Word frequencies follow Zipf's law, the n-th most frequent word shows up about 1/n as often as the first
+_WORD_WEIGHTS = list(itertools.accumulate(1.0 / rank for rank in range(1, len(_WORDS) + 1)))
+# Not a valid brotli stream, decoders fail on the first bytes
+_CORRUPT_BODY = b'\xff' * 64
+
+
+class SyntheticSite:
+    def __init__(self, pages=1000, fanout=10, depth=5, redirect_rate=0.05, redirect_chain=2, error_rate=0.01,
+                 latency_ms=0.0, latency_distribution='fixed', page_size=16 * 1024, seed=0, compress=True,
+                 corrupt_rate=0.01, hosts=1):
+        self.pages = max(1, pages)
+        self.fanout = max(1, fanout)
+        self.depth = max(1, depth)
+        self.redirect_rate = redirect_rate
+        self.redirect_chain = max(1, redirect_chain)
+        self.error_rate = error_rate
+        self.corrupt_rate = corrupt_rate
+        self.latency = latency_ms / 1000.0
+        self.latency_distribution = latency_distribution
+        self.page_size = page_size
+        self.seed = seed
+        self.compress = compress
+        self.hosts = max(1, hosts)
+        self._servers = []
+        self._http2 = []
+        self._latency_random = random.Random(seed)
+        self._latency_lock = threading.Lock()
+        # Page 0 is the root, pages 1 .. pages - 1 are split into depth levels of about the same size below it
+        per_level = max(1, -(-(self.pages - 1) // self.depth))
+        self._levels = [(0, 1)] + [(start, min(start + per_level, self.pages))
+                                   for start in range(1, self.pages, per_level)]
+        self._bodies = {}
+        self._compressed = {}
+
+    @property
+    def url(self):
+        return self._base_urls('http')[0] + '/'
+
+    @property
+    def http2_url(self):
+        return self._base_urls('h2')[0] + '/'
+
+    def _base_urls(self, protocol):
+        # Url of every host, the HTTP/1.1 ones or the h2c ones
+        if protocol == 'h2':
+            return ['http://127.0.0.1:%d' % server.port for server in self._http2]
+        return ['http://127.0.0.1:%d' % server.server_address[1] for server in self._servers]
+
+    def host_of(self, page):
+        return page % self.hosts
+
+    def level_of(self, page):
+        for level, (start, end) in enumerate(self._levels):
+            if page < end:
+                return level
+        return len(self._levels) - 1
+
+    def is_error(self, page):
+        return page and random.Random(self.seed * 1000003 + page).random() < self.error_rate
+
+    def is_corrupt(self, page):
+        return page and random.Random(self.seed * 2000003 + page).random() < self.corrupt_rate
+
+    def links(self, page):
+        # Paths linked from page, one to the next level so every page is reachable from the root
+        generator = random.Random(self.seed * 7919 + page)
+        level = self.level_of(page)
+        targets = []
+        if level + 1 < len(self._levels):
+            start, end = self._levels[level]
+            next_start, next_end = self._levels[level + 1]
+            # Pages of the next level are handed out to the pages of this one in turn
+            for target in range(next_start + page - start, next_end, end - start):
+                targets.append(target)
+        while len(targets) < self.fanout:
+            targets.append(generator.randrange(self.pages))
+        paths = []
+        for target in targets:
+            if generator.random() < self.redirect_rate:
+                paths.append('/r/%d/%d' % (self.redirect_chain, target))
+            else:
+                paths.append('/p/%d' % target)
+        return paths
+
+    def body(self, page, protocol='http'):
+        # Links to the pages of other hosts are absolute, to the servers of the same protocol
+        body = self._bodies.get((page, protocol))
+        if body is None:
+            host = self.host_of(page)
+            base_urls = self._base_urls(protocol) if self.hosts > 1 else None
+            parts = ['<!DOCTYPE html><html><head><meta charset="utf-8"><title>Page %d</title>' % page,
+                     '<link rel="stylesheet" href="/static/site.css"></head><body><h1>Page %d</h1><ul>' % page]
+            for i, path in enumerate(self.links(page)):
+                target_host = self.host_of(int(path.rsplit('/', 1)[1]))
+                if target_host != host:
+                    path = base_urls[target_host] + path
+                parts.append('<li><a class="link" href="%s">Link %d</a></li>' % (path, i))
+            parts.append('</ul>')
+            size = sum(len(part) for part in parts) + len('</body></html>')
+            # Paragraphs of words drawn at random, so the page compresses about as well as real text does
+            generator = random.Random(self.seed * 104729 + page)
+            while size < self.page_size:
+                paragraph = '<p>' + ' '.join(generator.choices(_WORDS, cum_weights=_WORD_WEIGHTS, k=40)) + '.</p>'
+                parts.append(paragraph)
+                size += len(paragraph)
+            parts.append('</body></html>')
+            body = self._bodies[page, protocol] = ''.join(parts).encode('utf-8')
+        return body
+
+    def compressed_body(self, page, protocol='http'):
+        body = self._compressed.get((page, protocol))
+        if body is None:
+            body = self._compressed[page, protocol] = gzip.compress(self.body(page, protocol), 6)
+        return body
+
+    def respond(self, path, accept_encoding=None, protocol='http'):
+        # (status, body, headers) of the response to path, the same on every host
+        parts = path.strip('/').split('/')
+        page = None
+        if path == '/':
+            page = 0
+        try:
+            if parts[0] == 'p' and len(parts) == 2:
+                page = int(parts[1])
+                if not 0 <= page < self.pages:
+                    page = None
+                elif self.is_error(page):
+                    return 500, b'', {}
+                elif self.is_corrupt(page):
+                    # Sent whatever the client accepts, like a misconfigured server or a broken cache would
+                    return 200, _CORRUPT_BODY, {'Content-Encoding': 'br'}
+            elif parts[0] == 'r' and len(parts) == 3:
+                hops, target = int(parts[1]), int(parts[2])
+                location = '/r/%d/%d' % (hops - 1, target) if hops > 1 else '/p/%d' % target
+                return 301, b'', {'Location': location}
+        except ValueError:
+            page = None
+        if page is None:
+            return 404, b'', {}
+        if self.compress and accept_encoding and 'gzip' in accept_encoding:
+            return 200, self.compressed_body(page, protocol), {'Content-Encoding': 'gzip'}
+        return 200, self.body(page, protocol), {}
+
+    def delay(self):
+        if not self.latency:
+            return 0
+        with self._latency_lock:
+            generator = self._latency_random
+            if self.latency_distribution == 'uniform':
+                delay = generator.uniform(0, 2 * self.latency)
+            elif self.latency_distribution == 'exponential':
+                delay = generator.expovariate(1 / self.latency)
+            elif self.latency_distribution == 'lognormal':
+                # Median of latency, with the long right tail real servers have
+                delay = generator.lognormvariate(0, 0.75) * self.latency
+            else:
+                delay = self.latency
+        return delay
+
+    def sleep(self):
+        delay = self.delay()
+        if delay:
+            time.sleep(delay)
+
+    def start(self, host='127.0.0.1', port=0):
+        # One server per host, on consecutive ports from port. A handler class of its own, the server only
+        # passes the request to it.
+        handler = type('Handler', (_Handler,), {'site': self})
+        for i in range(self.hosts):
+            server = _Server((host, port + i if port else 0), handler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+        return self.url
+
+    def start_http2(self, host='127.0.0.1', port=0):
+        for i in range(self.hosts):
+            self._http2.append(_Http2Server(self, host, port + i if port else 0))
+        return self.http2_url
+
+    def close(self):
+        servers, self._servers = self._servers, []
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        http2, self._http2 = self._http2, []
+        for server in http2:
+            server.close()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for the connections of an asynchronous crawl opened all at once
+    request_queue_size = 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body leave in one write, a separate small write for the headers would wait for the delayed
+    # ACK of the client and add 40ms to every response
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+    site = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        site = self.site
+        site.sleep()
+        status, body, headers = site.respond(self.path, self.headers.get('Accept-Encoding'))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _Http2Server:
+    # Serves the site over h2c from an event loop of its own thread, every request is answered from a task so
+    # the streams of a connection are served concurrently
+    def __init__(self, site, host, port):
+        import h2.config
+        import h2.connection
+        import h2.events
+        import h2.exceptions
+        self._h2 = h2
+        self.site = site
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._serve, host, port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _shutdown(self):
+        # Connections still open are ended while the loop runs, so they close their sockets
+        self._server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _serve(self, reader, writer):
+        h2 = self._h2
+        connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False,
+                                                                          header_encoding='utf-8'))
+        connection.initiate_connection()
+        writer.write(connection.data_to_send())
+        # Streams waiting for the client to open their flow control window
+        windows = {}
+        tasks = set()
+        try:
+            while True:
+                data = await reader.read(64 * 1024)
+                if not data:
+                    break
+                for event in connection.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        task = asyncio.ensure_future(self._respond(connection, writer, windows, event.stream_id,
+                                                                   dict(event.headers)))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    elif isinstance(event, (h2.events.WindowUpdated, h2.events.StreamReset)):
+                        for window in windows.values():
+                            window.set()
+                writer.write(connection.data_to_send())
+        except (OSError, h2.exceptions.H2Error):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _respond(self, connection, writer, windows, stream_id, headers):
+        h2 = self._h2
+        site = self.site
+        delay = site.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        status, body, response_headers = site.respond(headers[':path'], headers.get('accept-encoding'), 'h2')
+        try:
+            connection.send_headers(stream_id, [(':status', str(status)), ('content-type', 'text/html; charset=utf-8'),
+                                                ('content-length', str(len(body)))] +
+                                    [(name.lower(), value) for name, value in response_headers.items()],
+                                    end_stream=not body)
+            writer.write(connection.data_to_send())
+            while body:
+                size = min(connection.local_flow_control_window(stream_id), connection.max_outbound_frame_size,
+                           len(body))
+                if size <= 0:
+                    window = windows[stream_id] = asyncio.Event()
+                    await window.wait()
+                    del windows[stream_id]
+                    continue
+                chunk, body = body[:size], body[size:]
+                connection.send_data(stream_id, chunk, end_stream=not body)
+                writer.write(connection.data_to_send())
+        except h2.exceptions.H2Error:
+            # The client reset the stream, it doesn't want the rest
+            pass
+
+
+def add_site_arguments(parser):
+    parser.add_argument('--pages', type=int, default=1000, help='pages of the site')
+    parser.add_argument('--fanout', type=int, default=10, help='links per page')
+    parser.add_argument('--depth', type=int, default=5, help='levels of pages below the root')
+    parser.add_argument('--redirect-rate', type=float, default=0.05, help='share of links going through redirects')
+    parser.add_argument('--redirect-chain', type=int, default=2, help='redirects in a chain')
+    parser.add_argument('--error-rate', type=float, default=0.01, help='share of pages answering 500')
+    parser.add_argument('--corrupt-rate', type=float, default=0.01,
+                        help='share of pages answering a corrupted brotli body')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='mean (median for lognormal) response delay')
+    parser.add_argument('--latency-distribution', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--page-size', type=int, default=16 * 1024, help='bytes per page')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--hosts', type=int, default=1, help='hosts the pages are split over, on consecutive ports')
+    parser.add_argument('--no-compress', action='store_true', default=False,
+                        help="don't gzip pages, even for clients that accept it")
+
+
+def site_from_arguments(args):
+    return SyntheticSite(pages=args.pages, fanout=args.fanout, depth=args.depth, redirect_rate=args.redirect_rate,
+                         redirect_chain=args.redirect_chain, error_rate=args.error_rate, latency_ms=args.latency_ms,
+                         latency_distribution=args.latency_distribution, page_size=args.page_size, seed=args.seed,
+                         compress=not args.no_compress, corrupt_rate=args.corrupt_rate, hosts=args.hosts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a synthetic website')
+    add_site_arguments(parser)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--http2-port', type=int, default=None, help='also serve the site over h2c on this port')
+    args = parser.parse_args()
+    site = site_from_arguments(args)
+    print('Serving', site.start(port=args.port))
+    if args.http2_port is not None:
+        print('Serving HTTP/2', site.start_http2(port=args.http2_port))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        site.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+from pysitemap.cli import main
+
+
+# Parse processes import this module again, only the main process crawls
+if __name__ == '__main__':
+    main(prog='python -m pysitemap')
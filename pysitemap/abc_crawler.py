@@ -1,8 +1,21 @@
-import re
+import hashlib
+import logging
 import socket
+import time
 from abc import ABC, abstractmethod
-from urllib.parse import urlsplit, urlunsplit
-from tldextract import tldextract
+from array import array
+from datetime import datetime, timezone
+from itertools import chain, repeat
+from pysitemap.fetch_backend import ACCEPT_ENCODING
+from pysitemap.frontier import IdSet, PageSet, SpillQueue
+from pysitemap.link_extractor import extract_links, is_html
+from pysitemap.metrics import CrawlMetrics
+from pysitemap.page_cache import PageCache, CachedPage, changefreq_from_lastmod, lastmod_from_header, lastmod_now
+from pysitemap.public_suffix import default_suffix_list
+from pysitemap.throttled_log import ThrottledLogger
+from pysitemap.url_filter import UrlFilter
+from pysitemap.url_index import UrlIndex, DiskUrlIndex
+from pysitemap.url_normalizer import UrlNormalizer, is_internal
 
 
 # https://github.com/Guiorgy/PySitemap
@@ -10,67 +23,240 @@ from tldextract import tldextract
 # https://github.com/Cartman720/PySitemap
 
 
+_logger = logging.getLogger('pysitemap')
+
+
 class _Crawler(ABC):
     DEFAULT_TIMEOUT = socket._GLOBAL_DEFAULT_TIMEOUT
+    NORMALIZE_CACHE_SIZE = UrlNormalizer.DEFAULT_CACHE_SIZE
+    DEFAULT_CHECKPOINT_INTERVAL = 60
+    DEFAULT_BLOOM_ERROR_RATE = DiskUrlIndex.DEFAULT_ERROR_RATE
+    EXCLUDE_CACHE_SIZE = UrlFilter.DEFAULT_CACHE_SIZE
+    # Rough memory use of a url kept in the url cache and of a url waiting in the frontier, used to split
+    # max_memory between them
+    URL_CACHE_ENTRY_BYTES = 300
+    FRONTIER_ENTRY_BYTES = 100
+    # Name the robots.txt user-agent groups are matched against
+    ROBOTS_USER_AGENT = 'pysitemap'
+    DEFAULT_METRICS_INTERVAL = CrawlMetrics.DEFAULT_INTERVAL
+    # Html bodies are read up to this many bytes, links past it are lost
+    DEFAULT_MAX_BODY_BYTES = 10 * 1024 * 1024
+    # Messages of the same kind logged per second at most, the rest are counted and reported with the next one
+    LOG_RATE = 10
 
     _request_headers = {
         'Accept-Language': 'en-US,en;q=0.5',
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; WOW64; rv:50.0) Gecko/20100101 Firefox/50.0',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Encoding': ACCEPT_ENCODING,
         'Referer': 'http://thewebsite.com',
         'Connection': 'keep-alive'
     }
 
     def __init__(self, url, exclude=None, domain=None, no_verbose=False, request_header=None, timeout=DEFAULT_TIMEOUT,
                  retry_times=1, build_graph=False, verify_ssl=False, max_redirects=10, max_path_depth=None,
-                 max_steps_depth=0):
+                 max_steps_depth=0, compact_graph=False, sitemap_writer=None, checkpoint=None,
+                 checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, cache=None, robots=True, sitemaps=None,
+                 seed_sitemaps=True, max_memory=None, spill_dir=None, bloom_error_rate=DEFAULT_BLOOM_ERROR_RATE,
+                 strip_params=None, sort_params=False, dedup=None, honor_canonical=True, metrics_sinks=None,
+                 metrics_interval=DEFAULT_METRICS_INTERVAL, max_body_bytes=DEFAULT_MAX_BODY_BYTES):
 
-        self._url = self._normalize(url)
-        self._host = urlsplit(self._url).netloc
-        self._domain = domain if domain is not None else self._get_domain(self._url)
-        self._exclude = exclude.split() if exclude else None
+        self._suffix_list = default_suffix_list()
+        self._strip_params = list(strip_params) if strip_params else None
+        self._sort_params = sort_params
+        self._normalizer = UrlNormalizer(get_domain=self._get_domain, cache_size=self.NORMALIZE_CACHE_SIZE,
+                                         strip_params=self._strip_params, sort_params=sort_params)
+        root = self._normalizer.normalize(url) if url else None
+        self._url = root.url if root else None
+        self._host = root.host if root else None
+        self._domain = domain if domain is not None else root.domain if root else None
         self._no_verbose = no_verbose
-        self._error_links = []
+        self._log = ThrottledLogger(_logger, rate=self.LOG_RATE)
+        # Sent to the sinks every metrics_interval seconds and when the crawl ends
+        self._metrics = CrawlMetrics(metrics_sinks, metrics_interval)
+        # Every url is interned once, the stores below only hold the integer ids
+        self._urls = UrlIndex()
+        # With max_memory (in MB) the urls are kept on disk behind a cache and a Bloom filter, the frontier
+        # keeps a window of urls in memory and spills the rest to disk, and crawled pages are kept in a bitmap
+        # when no graph is built
+        self._frontier_window = None
+        if max_memory and max_memory > 0:
+            budget = max_memory * 1024 * 1024
+            self._urls = DiskUrlIndex(spill_dir, cache_size=max(1000, budget // 2 // self.URL_CACHE_ENTRY_BYTES),
+                                      error_rate=bloom_error_rate)
+            self._frontier_window = max(1000, budget // 4 // self.FRONTIER_ENTRY_BYTES)
+        self._spill_dir = spill_dir
+        self._spill = None
+        self._spilled = IdSet()
+        self._error_links = set()
         if request_header:
             self._request_headers = request_header
         if request_header == {}:
             self._request_header = None
         self._timeout = timeout if timeout else self.DEFAULT_TIMEOUT
+        # None reads html bodies whatever their size
+        self._max_body_bytes = max_body_bytes if max_body_bytes and max_body_bytes > 0 else None
         self._retry_times = retry_times
         self._build_graph = build_graph
-        self._graph = {}
+        # Edges are kept in int32 arrays instead of sets when a compact graph is requested
+        self._compact_graph = compact_graph
+        self._graph = {} if build_graph or self._frontier_window is None else PageSet()
+        # Crawled pages left out of the sitemap, copies of another page (with dedup 'exact' or 'near')
+        # or pages whose <link rel=canonical> names another url
+        self._unlisted = IdSet()
+        self._duplicates = None
+        if dedup:
+            # Imported here like the other modules of optional features, a crawl loads only the ones it uses
+            from pysitemap.dedup import DuplicateDetector
+            self._duplicates = DuplicateDetector(near=dedup == 'near')
+        # Canonical url ids named by the pages that aren't canonical themselves, when looking for duplicates
+        self._canonicals = {}
+        self._honor_canonical = honor_canonical
+        # Pages are streamed to the writer as soon as they are found
+        self._sitemap_writer = sitemap_writer
+        # <lastmod> of the pages it is known for
+        self._lastmod = {}
+        # With a page cache, pages unchanged since the previous crawl are answered with 304 and not parsed again
+        self._cache = PageCache(cache) if cache else None
         self._verify_ssl = verify_ssl if verify_ssl is not None else False
         self._max_path_depth = max_path_depth + 2 if max_path_depth and max_path_depth > 0 else None
+        self._filter = UrlFilter(exclude.split() if exclude else None, self._max_path_depth,
+                                 cache_size=self.EXCLUDE_CACHE_SIZE)
         self._stop = False
         self._max_redirects = max_redirects if max_redirects and max_redirects >= 0 else 10
         self._max_steps_depth = max_steps_depth if max_steps_depth and max_steps_depth >= 0 else 0
+        # robots.txt rules of every host seen, fetched before the first request to it
+        self._robots = {} if robots else None
+        # Pages listed in the sitemaps given, the root host's /sitemap.xml and the ones robots.txt lists
+        # are added to the frontier before the crawl starts
+        self._sitemaps = list(sitemaps) if sitemaps else []
+        self._seed_sitemaps = seed_sitemaps
+        self._seen_sitemaps = set()
+        self._resumed = False
+        # Steps from the root url of the urls waiting to be crawled
+        self._steps = {}
+        # The crawl state is saved to the checkpoint file every checkpoint_interval seconds
+        self._checkpoint_path = checkpoint
+        self._checkpoint_interval = checkpoint_interval if checkpoint_interval and checkpoint_interval > 0 \
+            else self.DEFAULT_CHECKPOINT_INTERVAL
+        self._state = None
+        self._resume_frontier = None
+        self._unsaved_pages = []
+        self._unsaved_edges = []
+        self._next_checkpoint = 0
 
-    def start(self):
+    def start(self, resume=None):
+        # With resume, the crawl continues from the state saved in that checkpoint file and keeps saving to it
         if not self._url:
             return None
-        self._crawl(self._normalize(self._url))
+        if resume:
+            self._resume(resume)
+        elif self._checkpoint_path and self._state is None:
+            from pysitemap.crawl_state import CrawlState
+            self._state = CrawlState(self._checkpoint_path)
+            self._state.reset()
+        self._next_checkpoint = time.monotonic() + self._checkpoint_interval
+        self._metrics.start()
+        try:
+            self._crawl(self._url)
+        finally:
+            # Whatever was left to crawl when stopped or interrupted is saved with the rest of the state
+            if self._state is not None:
+                self._checkpoint()
+            if self._cache is not None:
+                self._cache.flush()
+            self._emit_metrics()
         if not self._no_verbose and self._error_links:
-            print('Failed to parse: ', self._error_links)
-        return self._graph.keys()
+            self._log.warning('Failed to parse: %s', self._urls.urls(self._error_links))
+        return self._urls.urls(self._graph.keys())
+
+    @property
+    def metrics(self):
+        # Counters and timings of the crawl, see CrawlMetrics
+        return self._metrics
 
     def close(self):
-        del self._error_links, self._graph
-
-    def generate_sitemap(self):
-        sitemap = '''<?xml version="1.0" encoding="UTF-8"?>
-            <urlset xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
-                xsi:schemaLocation="http://www.sitemaps.org/schemas/sitemap/0.9
-                http://www.sitemaps.org/schemas/sitemap/0.9/sitemap.xsd"
-                xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'''
-        for url in self._graph.keys():
-            sitemap += "\n\t<url>\n\t\t<loc>{0}</loc>\n\t</url>".format(url)
-        sitemap += '\n</urlset>'
-        return sitemap
+        if self._state is not None:
+            self._state.close()
+            self._state = None
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        self._urls.close()
+        self._metrics.close()
+        del self._error_links, self._graph, self._urls, self._lastmod
+
+    def generate_sitemap(self, priority=False, changefreq=False):
+        # With priority, <priority> is set from the PageRank of the pages (needs build_graph, numpy and scipy),
+        # with changefreq, <changefreq> from how long ago they last changed
+        from pysitemap.sitemap_writer import URLSET_HEADER, URLSET_FOOTER, url_entry
+        sitemap = [URLSET_HEADER]
+        sitemap.extend(url_entry(*entry) for entry in self._sitemap_entries(priority, changefreq))
+        sitemap.append(URLSET_FOOTER)
+        return ''.join(sitemap)
+
+    def write_sitemap(self, path, base_url=None, compress=False, priority=False, changefreq=False):
+        # Writes the found pages to path, split into several files and an index on large sites
+        from pysitemap.sitemap_writer import SitemapWriter
+        writer = SitemapWriter(path, base_url=base_url or (self._url or '') + '/', compress=compress)
+        for entry in self._sitemap_entries(priority, changefreq):
+            writer.add(*entry)
+        return writer.close()
+
+    def link_analysis(self):
+        # PageRank and in-degree of the crawled pages, see LinkAnalysis
+        if not self._build_graph:
+            return None
+        # numpy and scipy are only imported when ranking
+        from pysitemap.link_analysis import LinkAnalysis
+        return LinkAnalysis(self._graph)
+
+    def page_ranks(self):
+        # {url: (PageRank, in-degree)} of the crawled pages
+        analysis = self.link_analysis()
+        if analysis is None:
+            return None
+        urls = self._urls
+        return {urls[url_id]: (rank, in_degree) for url_id, rank, in_degree in
+                zip(analysis.pages.tolist(), analysis.rank.tolist(), analysis.in_degree.tolist())}
 
     def generate_graph(self):
         if not self._build_graph:
             return None
-        return self._graph
+        urls = self._urls
+        return {urls[source]: set(urls.urls(edges)) for source, edges in self._graph.items()}
+
+    def save_graph(self, path):
+        # Streams the graph to path in the compact format of graph_store, without building the {url: urls}
+        # dict of generate_graph. Returns the number of edges written, read it back with GraphFile.
+        if not self._build_graph:
+            return None
+        from pysitemap.graph_store import write_graph
+        graph = self._graph
+        return write_graph(path, self._urls, ((source, graph[source]) for source in sorted(graph.keys())))
+
+    def _sitemap_entries(self, priority, changefreq):
+        # (url, lastmod, changefreq, priority) of the pages listed in the sitemap
+        urls = self._urls
+        lastmod = self._lastmod
+        unlisted = self._unlisted
+        priorities = repeat(None)
+        if priority:
+            if self._build_graph:
+                # Ranked in the order of the graph's keys, the order pages are listed in
+                priorities = self.link_analysis().priorities().tolist()
+            elif not self._no_verbose:
+                self._log.warning('Priorities need the link graph, build_graph is off')
+        now = datetime.now(timezone.utc)
+        for url_id, page_priority in zip(self._graph.keys(), priorities):
+            if url_id in unlisted:
+                continue
+            page_lastmod = lastmod.get(url_id)
+            yield urls[url_id], page_lastmod, changefreq_from_lastmod(page_lastmod, now) if changefreq else None, \
+                page_priority
 
     @abstractmethod
     def _crawl(self, root_url):
@@ -80,87 +266,367 @@ class _Crawler(ABC):
     def _request(self, url):
         pass
 
-    _pattern = '<a [^>]*href=[\'|"](.*?)[\'"].*?>'
+    @abstractmethod
+    def _enqueue(self, links, step):
+        # Adds the url ids in links that weren't seen yet to the frontier, step requests away from the root url
+        pass
+
+    def _refill_frontier(self):
+        # Called once nothing is queued or in flight, before the crawl ends. It may _enqueue more url ids and
+        # returns whether it did, the crawl goes on if so.
+        return False
+
+    def _frontier_ids(self):
+        # Ids of the urls queued or being fetched, saved in checkpoints
+        return ()
 
-    def _extract_urls(self, html):
-        return re.findall(self._pattern, html)
+    def _frontier_size(self):
+        return len(self._frontier_ids()) + (len(self._spill) if self._spill else 0)
+
+    def _initial_frontier(self, root_url):
+        # Url ids to crawl first and their steps, either the root url or what was left in the resumed checkpoint
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        self._spilled = IdSet()
+        frontier, self._resume_frontier = self._resume_frontier, None
+        self._resumed = frontier is not None
+        if frontier is None:
+            frontier = {self._urls.intern(root_url): 0}
+        return frontier
+
+    def _resume(self, path):
+        if self._state is not None:
+            self._state.close()
+        # sqlite3 is only imported by the crawls that use a checkpoint, cache or max_memory
+        from pysitemap.crawl_state import CrawlState
+        state = CrawlState(path)
+        url = state.meta().get('url')
+        if url and url != self._url:
+            state.close()
+            raise ValueError('Checkpoint ' + path + ' was saved for ' + url + ', not ' + self._url)
+
+        # Url ids are assigned in order, so interning the saved urls again gives every url its saved id
+        for url in state.urls():
+            self._urls.intern(url)
+        for page, lastmod, listed in state.pages():
+            if page not in self._graph:
+                self._add_node(page, lastmod, listed)
+        if self._build_graph:
+            for source, target in state.edges():
+                self._add_graph(source, target)
+        self._error_links.update(state.errors())
+        self._resume_frontier = dict(state.frontier())
+        self._state = state
+        if not self._no_verbose:
+            self._log.info('Resuming: %d found, %d left to crawl', len(self._graph.keys()), len(self._resume_frontier))
+
+    def _checkpoint_if_due(self):
+        if self._state is not None and time.monotonic() >= self._next_checkpoint:
+            self._checkpoint()
+
+    def _emit_metrics_if_due(self):
+        if self._metrics.emit_due():
+            self._emit_metrics()
+
+    def _emit_metrics(self):
+        metrics = self._metrics
+        metrics.found = len(self._graph.keys())
+        metrics.frontier = self._frontier_size()
+        metrics.emit()
+
+    def _checkpoint(self):
+        steps = self._steps
+        frontier = [(url_id, steps.get(url_id, 0)) for url_id in self._frontier_ids()]
+        if self._spill:
+            frontier = chain(frontier, self._spill.items())
+        self._state.save(self._urls, self._unsaved_pages, self._unsaved_edges, self._error_links, frontier,
+                         {'url': self._url})
+        self._unsaved_pages = []
+        self._unsaved_edges = []
+        self._next_checkpoint = time.monotonic() + self._checkpoint_interval
+
+    def _frontier_full(self, size):
+        # Whether a url found now has to wait on disk. It does once size urls, the ones waiting in memory,
+        # fill the window, and for as long as urls spilled before it are left.
+        return self._frontier_window is not None and (bool(self._spill) or size >= self._frontier_window)
+
+    def _spill_url(self, url_id, step):
+        if self._spill is None:
+            self._spill = SpillQueue(self._spill_dir)
+        self._spill.push(url_id, step)
+        self._spilled.add(url_id)
+
+    def _unspill(self, size):
+        # (url id, step) pairs to move back to memory, once the size urls waiting there are down to half the window
+        if not self._spill or size > self._frontier_window // 2:
+            return []
+        pairs = self._spill.pop(self._frontier_window - size)
+        for url_id, step in pairs:
+            self._spilled.discard(url_id)
+        return pairs
+
+    def _extract_urls(self, html, base_url=None, content_type=None):
+        # html is the raw response body, links are resolved against base_url or the page's <base href>
+        extractor = extract_links(html, base_url=base_url, content_type=content_type)
+        return [extractor.resolve(link) for link in extractor.links]
 
     def _url_excluded(self, url):
-        excluded = False
+        if self._filter.excluded(url):
+            return True
+        # robots.txt rules of a host can be fetched later on, so they aren't part of the remembered decision
+        return bool(self._robots) and self._robots_excluded(url)
 
-        if self._exclude:
-            for pattern in self._exclude:
-                excluded |= (re.search(pattern, url) is not None)
+    def _robots_excluded(self, url):
+        # Urls of hosts whose robots.txt isn't known yet pass, they are checked again before being requested
+        link = self._normalizer.normalize(url)
+        rules = self._robots.get(link.host) if link else None
+        if rules is None:
+            return False
+        return not rules.allowed(link.url[len(link.scheme) + 3 + len(link.host):])
 
-        if self._max_path_depth:
-            excluded |= url.count('/') > self._max_path_depth
+    def _robots_host(self, url):
+        # The host whose robots.txt has to be fetched before url can be requested, if any
+        if self._robots is None:
+            return None
+        link = self._normalizer.normalize(url)
+        if link is None or link.host in self._robots:
+            return None
+        return link.host
+
+    def _robots_url(self, host):
+        return 'http://' + host + '/robots.txt'
+
+    def _set_robots(self, host, text):
+        # Returns the sitemaps listed in robots.txt that weren't seen yet
+        from pysitemap.robots import RobotsRules
+        rules = self._robots[host] = RobotsRules(text, self.ROBOTS_USER_AGENT)
+        if rules.crawl_delay:
+            self._set_crawl_delay(host, rules.crawl_delay)
+        return self._new_sitemaps(rules.sitemaps) if self._seed_sitemaps else []
+
+    def _set_crawl_delay(self, host, delay):
+        pass
 
-        return excluded
+    def _new_sitemaps(self, urls):
+        sitemaps = [url for url in urls if url not in self._seen_sitemaps]
+        self._seen_sitemaps.update(sitemaps)
+        return sitemaps
 
-    def _add_url(self, url, url_list):
-        url = self._normalize(url)
-        if url and url not in url_list and not self._url_excluded(url):
-            url_list.append(url)
+    def _initial_sitemaps(self, root_url):
+        # A resumed crawl was already seeded
+        if self._resumed:
+            return []
+        sitemaps = list(self._sitemaps)
+        root = self._normalizer.normalize(root_url)
+        if self._seed_sitemaps and root:
+            sitemaps.append(root.scheme + '://' + root.host + '/sitemap.xml')
+        return self._new_sitemaps(sitemaps)
+
+    def _add_sitemap_locs(self, locs, index):
+        # Pages of a sitemap are queued as if linked from the root url, returns the sitemaps of a sitemap index
+        if index:
+            return self._new_sitemaps(locs)
+        self._enqueue(self._internal_links(locs), 1)
+        return []
+
+    def _add_url(self, link, url_ids):
+        if not self._url_excluded(link.url):
+            url_ids.add(self._urls.intern(link.url))
+
+    def _extract_links(self, url, html, content_type=None):
+        # Returns the ids of the internal links found in html and its canonical url
+        started = time.perf_counter()
+        extractor = extract_links(html, base_url=url, content_type=content_type)
+        extracted = time.perf_counter()
+        links = self._internal_links(extractor.links, extractor.base)
+        self._metrics.extract_seconds.observe(extracted - started)
+        self._metrics.normalize_seconds.observe(time.perf_counter() - extracted)
+        return links, extractor.canonical
+
+    def _internal_links(self, hrefs, base=None):
+        links = set()
+        normalize = self._normalizer.normalize
+
+        for href in hrefs:
+            link = normalize(href, base)
+            if link and self._is_internal(link):
+                self._add_url(link, links)
+
+        return links
+
+    def _parsed_links(self, urls):
+        # Links a parse process already normalized and filtered, only the robots.txt rules are left to check
+        links = set()
+        for url in urls:
+            if not (self._robots and self._robots_excluded(url)):
+                links.add(self._urls.intern(url))
+        return links
+
+    def _body_limit(self, headers):
+        # Bytes of a response body worth reading. Resources that aren't html, like images, videos or archives,
+        # are listed in the sitemap without downloading them, html is read up to max_body_bytes.
+        if not is_html(headers.get('Content-Type')):
+            self._metrics.skipped_body()
+            return 0
+        return self._max_body_bytes
+
+    def _conditional_headers(self, url):
+        # Validators saved by the previous crawl, so the server can answer 304 if the page didn't change
+        page = self._cache.get(url) if self._cache is not None else None
+        if page is None:
+            return None
+        headers = {}
+        if page.etag:
+            headers['If-None-Match'] = page.etag
+        if page.last_modified:
+            headers['If-Modified-Since'] = page.last_modified
+        return headers or None
+
+    def _read_page(self, requested_url, url_id, status, headers, body, parsed=None):
+        # Returns the ids of the internal links of the page, its lastmod and whether it belongs in the sitemap.
+        # A 304 reuses what the cache remembers, an unchanged body keeps the lastmod of the previous crawl.
+        # A body that wasn't read, like the one of an image, is unchanged only if its ETag is.
+        # parsed holds the links and canonical url of the body when a parse process already extracted them.
+        url = self._urls[url_id]
+        cache = self._cache
+        if cache is not None and status == 304:
+            # The validators were sent for the requested url, which may have redirected here
+            page = cache.get(requested_url)
+            if page is not None:
+                original = self._original(url_id, page.content_hash)
+                if original is not None:
+                    return set(), page.lastmod, self._canonicals.get(original) == url_id
+                self._cache_page(requested_url, url, page)
+                return self._internal_links(page.links), page.lastmod, self._listed(url_id, page.canonical)
+
+        last_modified = headers.get('Last-Modified')
+        content_hash = hashlib.sha1(body).hexdigest() if body and (cache is not None or self._duplicates is not None) \
+            else None
+        original = self._original(url_id, content_hash, body)
+        if original is not None:
+            # Its links were followed on the page it copies. It is listed only if it is the canonical url
+            # that page named. Not cached either, the next crawl judges it again.
+            return set(), lastmod_from_header(last_modified), self._canonicals.get(original) == url_id
+
+        if parsed is not None:
+            urls, canonical = parsed
+            links = self._parsed_links(urls)
+        elif body:
+            links, canonical = self._extract_links(url, body, headers.get('Content-Type'))
+        else:
+            links, canonical = set(), None
+        listed = self._listed(url_id, canonical)
+        if cache is None:
+            return links, lastmod_from_header(last_modified), listed
+
+        cached = cache.get(url)
+        etag = headers.get('ETag')
+        if content_hash is not None:
+            unchanged = cached is not None and cached.content_hash == content_hash
+        else:
+            unchanged = cached is not None and cached.content_hash is None and etag is not None and cached.etag == etag
+        if unchanged and cached.lastmod:
+            lastmod = cached.lastmod
+        else:
+            # With neither a body nor an ETag to compare there is no telling when it changed, so no made up date
+            lastmod = lastmod_from_header(last_modified) or (lastmod_now() if content_hash or etag else None)
+        self._cache_page(requested_url, url, CachedPage(etag, last_modified, content_hash, lastmod,
+                                                        self._urls.urls(links), canonical))
+        return links, lastmod, listed
+
+    def _original(self, url_id, content_hash, body=None):
+        # The id of the page crawled before whose content url_id repeats, if any
+        if self._duplicates is None or not content_hash:
+            return None
+        original = self._duplicates.check(url_id, content_hash, body)
+        if original is None or original == url_id:
+            return None
+        if not self._no_verbose:
+            self._log.info('Duplicate of %s: %s', self._urls[original], self._urls[url_id])
+        return original
+
+    def _listed(self, url_id, canonical):
+        # A page names its canonical url with <link rel=canonical>, only that url belongs in the sitemap.
+        # Canonical urls off the site or excluded from the crawl are ignored.
+        if not canonical or not self._honor_canonical:
+            return True
+        link = self._normalizer.normalize(canonical)
+        if link is None or not self._is_internal(link) or self._url_excluded(link.url):
+            return True
+        canonical_id = self._urls.intern(link.url)
+        if canonical_id == url_id:
+            return True
+        if self._duplicates is not None:
+            self._canonicals[url_id] = canonical_id
+        return False
+
+    def _cache_page(self, requested_url, url, page):
+        # Saved for the page and for the url that redirected to it, so both send validators on the next crawl
+        self._cache.put(url, page)
+        if requested_url != url:
+            self._cache.put(requested_url, page)
+
+    def _new_edges(self):
+        return array('i') if self._compact_graph else set()
+
+    def _add_node(self, source, lastmod=None, listed=True):
+        self._graph[source] = self._new_edges() if self._build_graph else None
+        if lastmod:
+            self._lastmod[source] = lastmod
+        if not listed:
+            self._unlisted.add(source)
+        elif self._sitemap_writer is not None:
+            self._sitemap_writer.add(self._urls[source], lastmod)
+        if self._state is not None:
+            self._unsaved_pages.append((source, lastmod, listed))
 
     def _add_graph(self, source, url):
         if source not in self._graph:
-            self._graph[source] = set() if self._build_graph else None
+            self._add_node(source)
         if not self._build_graph or url is None:
             return
-        self._graph[source].add(url)
+        edges = self._graph[source]
+        if url in edges:
+            return
+        if not self._compact_graph:
+            edges.add(url)
+        else:
+            edges.append(url)
+        if self._state is not None:
+            self._unsaved_edges.append((source, url))
 
     def _add_all_graph(self, source, urls):
         if source not in self._graph:
-            self._graph[source] = set() if self._build_graph else None
-        self._graph[source].update(urls)
+            self._add_node(source)
+        edges = self._graph[source]
+        known = set(edges) if self._compact_graph else edges
+        if self._state is not None:
+            self._unsaved_edges.extend((source, url) for url in urls if url not in known)
+        if not self._compact_graph:
+            edges.update(urls)
+        elif edges:
+            edges.extend(url for url in urls if url not in known)
+        else:
+            edges.extend(sorted(urls))
 
     def _normalize(self, url):
-        try:
-            from url_normalize import url_normalize
-            url = url_normalize(url, default_scheme='http')
-        except ModuleNotFoundError:
-            pass
-        if url.endswith('/'):
-            url = url[:-1]
-        scheme, netloc, path, qs, anchor = urlsplit(url)
-        # print(url, ' ', scheme, ' ', netloc, ' ', path, ' ', qs, ' ', anchor)
-        anchor = ''
-        if scheme == 'https' or scheme == '':
-            scheme = 'http'
-        if not netloc.startswith('www.'):
-            netloc = 'www.' + netloc
-        return urlunsplit((scheme, netloc, path, qs, anchor))
-
-    def _is_internal(self, url):
-        host = urlsplit(url).netloc
-        if self._domain:
-            return self._domain in host
-        return host == self._host
-
-    def _is_relative(self, url):
-        host = urlsplit(url).netloc
-        return host == ''
-
-    def _same_domain(self, url):
-        domain = self._get_domain(url)
-        if domain and domain == self._domain:
+        link = self._normalizer.normalize(url)
+        return link.url if link else None
+
+    def _is_internal(self, link):
+        return is_internal(link, self._host, self._domain)
+
+    def _same_domain(self, link):
+        if link.domain and link.domain == self._domain:
             return True
-        elif urlsplit(url).netloc == self._host:
+        elif link.host == self._host:
             return True
         return False
 
-    def _is_url(self, url):
-        scheme, netloc, path, qs, anchor = urlsplit(url)
-        if url != '' and scheme in ['http', 'https', '']:
-            return True
-        else:
-            return False
-
     def _get_domain(self, url):
-        sub, domain, suffix = tldextract.extract(url)
-        if domain and suffix:
-            return domain + '.' + suffix
-        return None
+        # Offline public suffix trie lookup, memoized per host
+        return self._suffix_list.registered_domain(url)
 
     def stop(self, stop_crawling=True):
         self._stop = stop_crawling
@@ -0,0 +1,97 @@
+import asyncio
+import zlib
+from urllib.error import HTTPError, URLError
+from aiohttp import ClientError, ClientSession, TCPConnector
+from pysitemap.fetch_backend import AsyncFetchBackend, FetchResponse, BodyDecoder, BODY_CHUNK_SIZE, DRAIN_BYTES, \
+    read_limit, redirect_url
+
+
+class AiohttpBackend(AsyncFetchBackend):
+    # HTTP/1.1 backend of the asynchronous crawler. One session, connector and keep-alive pool is shared by
+    # every request. Bodies are decompressed here rather than by aiohttp, so the size limit applies to the
+    # decoded bytes and the bytes received can be counted.
+    AF_INET = 2
+    BODY_CHUNK_SIZE = BODY_CHUNK_SIZE
+    DRAIN_BYTES = DRAIN_BYTES
+
+    def __init__(self, headers=None, timeout=None, verify_ssl=False, limit=100, limit_per_host=0, dns_cache_ttl=10,
+                 keepalive_timeout=15):
+        self._headers = headers
+        self._timeout = timeout
+        self._verify_ssl = verify_ssl
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        # None caches DNS entries for the whole crawl, 0 disables the cache
+        self._dns_cache_ttl = dns_cache_ttl
+        self._keepalive_timeout = keepalive_timeout
+        self._session = None
+
+    def _get_session(self):
+        # Created on the first request, inside the event loop the session is bound to
+        if self._session is None or self._session.closed:
+            connector = TCPConnector(ssl=None if self._verify_ssl else False,
+                                     limit=self._limit,
+                                     limit_per_host=self._limit_per_host,
+                                     use_dns_cache=self._dns_cache_ttl != 0,
+                                     ttl_dns_cache=self._dns_cache_ttl or None,
+                                     keepalive_timeout=self._keepalive_timeout,
+                                     family=self.AF_INET)
+            self._session = ClientSession(timeout=self._timeout, headers=self._headers, connector=connector,
+                                          auto_decompress=False)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def send(self, url, headers=None, body_limit=None):
+        try:
+            async with self._get_session().get(url, headers=headers, allow_redirects=False) as response:
+                body, transferred, truncated = await self._read(
+                    response, read_limit(response.status, response.headers, body_limit))
+                return FetchResponse(url, response.status, response.headers, body, transferred, truncated,
+                                     response.reason)
+        except (ClientError, asyncio.TimeoutError, OSError, ValueError, zlib.error) as e:
+            raise URLError(e)
+
+    async def _read(self, response, limit):
+        # Read in chunks and no further than the limit, the connection is closed if the rest is left unread
+        if limit == 0:
+            if response.content_length is not None and response.content_length <= self.DRAIN_BYTES:
+                return b'', len(await response.read()), False
+            return b'', 0, False
+        decoder = BodyDecoder(response.headers.get('Content-Encoding'))
+        body = bytearray()
+        transferred = 0
+        async for chunk in response.content.iter_chunked(self.BODY_CHUNK_SIZE):
+            transferred += len(chunk)
+            body += decoder.decode(chunk)
+            # A body of exactly limit bytes is read to its end and isn't truncated
+            if limit is not None and len(body) > limit:
+                return bytes(body[:limit]), transferred, True
+        body += decoder.flush()
+        truncated = limit is not None and len(body) > limit
+        return bytes(body[:limit]) if limit is not None else bytes(body), transferred, truncated
+
+    async def chunks(self, url, headers=None, max_redirects=10):
+        redirects = 0
+        session = self._get_session()
+        while True:
+            try:
+                async with session.get(url, headers=headers, allow_redirects=False) as response:
+                    next_url = redirect_url(url, response.status, response.headers, redirects, max_redirects)
+                    if next_url is None:
+                        if response.status >= 400:
+                            raise HTTPError(url, response.status, response.reason, response.headers, None)
+                        decoder = BodyDecoder(response.headers.get('Content-Encoding'))
+                        async for chunk in response.content.iter_chunked(self.BODY_CHUNK_SIZE):
+                            yield decoder.decode(chunk)
+                        yield decoder.flush()
+                        return
+            except (ClientError, asyncio.TimeoutError, OSError, ValueError, zlib.error) as e:
+                if isinstance(e, HTTPError):
+                    raise
+                raise URLError(e)
+            redirects += 1
+            url = next_url
@@ -1,11 +1,13 @@
 import asyncio
-import re
-from urllib.parse import urljoin
-from aiohttp import ClientResponseError, ClientError, ClientConnectionError, ClientOSError, ServerConnectionError
-from aiohttp import TCPConnector, ClientSession
+import time
+import zlib
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
 from aiohttp.client import ClientTimeout
-from aiohttp.client_exceptions import TooManyRedirects
 from pysitemap.abc_crawler import _Crawler
+from pysitemap.aiohttp_backend import AiohttpBackend
+from pysitemap.fetch_backend import REDIRECT_CODES
+from pysitemap.host_scheduler import HostScheduler, RETRY_CODES, THROTTLE_CODES, retry_after_seconds
 
 
 # https://github.com/Guiorgy/PySitemap
@@ -15,148 +17,360 @@ from pysitemap.abc_crawler import _Crawler
 
 class Crawler(_Crawler):
     DEFAULT_TIMEOUT = ClientTimeout(total=5*60)
-    AF_INET = 2
+    DEFAULT_DNS_CACHE_TTL = 10
+    DEFAULT_KEEPALIVE_TIMEOUT = 15
+    # Smaller pages are parsed in the event loop, sending them to a process would cost more than parsing them
+    PARSE_POOL_MIN_BYTES = 8 * 1024
 
     def __init__(self, url, exclude=None, domain=None, no_verbose=False, request_header=None, timeout=DEFAULT_TIMEOUT,
                  retry_times=1, max_requests=100, build_graph=False, verify_ssl=False, max_redirects=10,
-                 max_path_depth=None, max_steps_depth=0):
+                 max_path_depth=None, max_steps_depth=0, limit_per_host=0, dns_cache_ttl=DEFAULT_DNS_CACHE_TTL,
+                 keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT, compact_graph=False, sitemap_writer=None, checkpoint=None,
+                 checkpoint_interval=_Crawler.DEFAULT_CHECKPOINT_INTERVAL, cache=None, max_rate_per_host=None,
+                 backoff_base=HostScheduler.DEFAULT_BACKOFF_BASE, backoff_max=HostScheduler.DEFAULT_BACKOFF_MAX,
+                 robots=True, sitemaps=None, seed_sitemaps=True, parse_processes=0, max_memory=None, spill_dir=None,
+                 bloom_error_rate=_Crawler.DEFAULT_BLOOM_ERROR_RATE, strip_params=None, sort_params=False,
+                 dedup=None, honor_canonical=True, metrics_sinks=None,
+                 metrics_interval=_Crawler.DEFAULT_METRICS_INTERVAL, max_body_bytes=_Crawler.DEFAULT_MAX_BODY_BYTES,
+                 http2=False, backend=None):
         _Crawler.__init__(self, url, exclude=exclude, domain=domain, no_verbose=no_verbose,
                           request_header=request_header, timeout=timeout, retry_times=retry_times,
                           build_graph=build_graph, verify_ssl=verify_ssl, max_redirects=max_redirects,
-                          max_path_depth=max_path_depth, max_steps_depth=max_steps_depth)
+                          max_path_depth=max_path_depth, max_steps_depth=max_steps_depth,
+                          compact_graph=compact_graph, sitemap_writer=sitemap_writer, checkpoint=checkpoint,
+                          checkpoint_interval=checkpoint_interval, cache=cache, robots=robots, sitemaps=sitemaps,
+                          seed_sitemaps=seed_sitemaps, max_memory=max_memory, spill_dir=spill_dir,
+                          bloom_error_rate=bloom_error_rate, strip_params=strip_params, sort_params=sort_params,
+                          dedup=dedup, honor_canonical=honor_canonical, metrics_sinks=metrics_sinks,
+                          metrics_interval=metrics_interval, max_body_bytes=max_body_bytes)
 
+        if not isinstance(self._timeout, ClientTimeout):
+            self._timeout = ClientTimeout(total=float(self._timeout))
         self._max_requests = max_requests + 1 if max_requests and max_requests > 0 else 100
+        self._limit_per_host = limit_per_host if limit_per_host and limit_per_host > 0 else 0
+        # None caches DNS entries for the whole crawl, 0 disables the cache
+        self._dns_cache_ttl = dns_cache_ttl if dns_cache_ttl is None or dns_cache_ttl >= 0 \
+            else self.DEFAULT_DNS_CACHE_TTL
+        self._keepalive_timeout = keepalive_timeout if keepalive_timeout and keepalive_timeout > 0 \
+            else self.DEFAULT_KEEPALIVE_TIMEOUT
+        # Requests per host are paced by a token bucket and an adaptive concurrency limit, up to limit_per_host
+        # or max_requests, so the crawl settles at the highest rate the site sustains
+        self._scheduler = HostScheduler(self._limit_per_host or self._max_requests, max_rate=max_rate_per_host,
+                                        backoff_base=backoff_base, backoff_max=backoff_max)
+        self._loop = None
+        # Requests go through the backend given, an AsyncFetchBackend, or through aiohttp. With http2, hosts
+        # that speak HTTP/2 get one multiplexed connection each, 'h2c' also speaks it to plain http hosts
+        # without asking (needs the h2 package).
+        self._backend = backend
+        self._http2 = http2
+        self._queued = set()
+        self._queue = None
+        # Fetches of robots.txt in progress, shared by the workers waiting for the same host
+        self._robots_loading = {}
+        # With parse_processes, the links of large pages are extracted in a pool of processes
+        # while the event loop keeps fetching
+        self._parse_processes = parse_processes if parse_processes and parse_processes > 0 else 0
+        self._parse_pool = None
+
+    def close(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.run_until_complete(self._close_backend())
+            self._loop.close()
+        self._loop = None
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(cancel_futures=True)
+            self._parse_pool = None
+        _Crawler.close(self)
+
+    def stop(self, stop_crawling=True):
+        _Crawler.stop(self, stop_crawling)
+        # While a crawl is running the workers drain and the connections are closed once they are done
+        if stop_crawling and self._loop is not None and not self._loop.is_closed() and not self._loop.is_running():
+            self._loop.run_until_complete(self._close_backend())
+
+    def _get_backend(self):
+        # One backend and keep-alive pool is shared by every request of the crawl
+        if self._backend is None:
+            self._backend = AiohttpBackend(headers=self._request_headers, timeout=self._timeout,
+                                           verify_ssl=self._verify_ssl, limit=self._max_requests,
+                                           limit_per_host=self._limit_per_host, dns_cache_ttl=self._dns_cache_ttl,
+                                           keepalive_timeout=self._keepalive_timeout)
+            if self._http2:
+                from pysitemap.http2_backend import Http2Backend
+                self._backend = Http2Backend(self._backend, headers=self._request_headers,
+                                             timeout=self._timeout.total, verify_ssl=self._verify_ssl,
+                                             cleartext=self._http2 == 'h2c')
+        return self._backend
+
+    async def _close_backend(self):
+        if self._backend is not None:
+            await self._backend.close()
 
     def _crawl(self, root_url):
-        urls_to_request = {root_url}
-        steps = {}
-        if self._max_steps_depth:
-            steps[root_url] = 0
+        # The loop outlives a single start() so that the backend bound to it can be reused until close()
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._crawl_async(root_url))
 
-        while urls_to_request:
+    def _get_parse_pool(self):
+        # Started on the first crawl and kept until close(), the processes pay for their start-up only once
+        if self._parse_pool is None and self._parse_processes:
+            from pysitemap.parse_pool import ParseConfig, create_parse_pool
+            config = ParseConfig(self._host, self._domain, self._filter.patterns, self._filter.max_path_depth,
+                                 self._strip_params, self._sort_params)
+            self._parse_pool = create_parse_pool(self._parse_processes, config)
+        return self._parse_pool
+
+    async def _crawl_async(self, root_url):
+        frontier = self._initial_frontier(root_url)
+        # Ids of urls waiting in the queue or currently being fetched by a worker
+        self._queued = set()
+        self._steps = {}
+        queue = self._queue = asyncio.Queue()
+        self._add_frontier(frontier.items())
+
+        backend = self._get_backend()
+        self._get_parse_pool()
+        host = self._robots_host(root_url)
+        if host:
+            await self._load_robots(backend, host)
+        await self._load_sitemaps(backend, self._initial_sitemaps(root_url))
+
+        workers = [asyncio.ensure_future(self._worker(backend, queue)) for _ in range(self._max_requests)]
+        join = asyncio.ensure_future(queue.join())
+        try:
+            while True:
+                done, _ = await asyncio.wait([join] + workers, return_when=asyncio.FIRST_COMPLETED)
+                # The workers are all idle once the queue is drained, so the hook may block the loop
+                if join not in done or self._stop or not self._refill_frontier():
+                    break
+                self._fill_queue()
+                join = asyncio.ensure_future(queue.join())
+        finally:
+            for task in workers + [join]:
+                task.cancel()
+            await asyncio.gather(join, *workers, return_exceptions=True)
+            for loading in self._robots_loading.values():
+                loading.cancel()
+            self._robots_loading = {}
             if self._stop:
-                return
+                await self._close_backend()
+        # Workers only finish on their own if they raised, so surface that error
+        for task in done:
+            if task is not join:
+                task.result()
 
-            urls = []
+    async def _worker(self, backend, queue):
+        # Each worker keeps one request in flight and handles the response as soon as it lands,
+        # so a slow page only holds up its own worker instead of the whole batch
+        while True:
+            url_id = await queue.get()
             try:
-                while len(urls) < self._max_requests:
-                    url = urls_to_request.pop()
-                    if not self._max_steps_depth or steps[url] <= self._max_steps_depth:
-                        urls.append(url)
-                    else:
-                        try:
-                            del steps[url]
-                        except KeyError:
-                            pass
-            except KeyError:
-                # There were less than self._max_requests urls in urls_to_request set
-                pass
+                # Urls are only dropped from _queued once handled, what is left is saved in the checkpoint
+                if self._stop:
+                    continue
+                if url_id in self._graph:
+                    self._queued.discard(url_id)
+                    continue
+                if self._max_steps_depth and self._steps.get(url_id, 0) > self._max_steps_depth:
+                    self._steps.pop(url_id, None)
+                    self._queued.discard(url_id)
+                    continue
+
+                url = self._urls[url_id]
+                host = self._robots_host(url)
+                if host:
+                    await self._load_robots(backend, host)
+                if self._robots and self._robots_excluded(url):
+                    self._steps.pop(url_id, None)
+                    self._queued.discard(url_id)
+                    continue
+
+                if not self._no_verbose:
+                    self._log.info('Found: %d Parsing: %s', len(self._graph.keys()), url)
+
+                requested_url, response_url, status, headers, body = \
+                    await self._request(backend, url, self._conditional_headers(url))
+                parsed = None
+                if not self._stop and self._parse_pool is not None and status != 304 and body \
+                        and len(body) >= self.PARSE_POOL_MIN_BYTES:
+                    base_url = self._normalize(response_url)
+                    if base_url:
+                        from pysitemap.parse_pool import parse_page
+                        # Timed as extraction, waiting for a free process included
+                        started = time.perf_counter()
+                        parsed = await asyncio.get_running_loop().run_in_executor(
+                            self._parse_pool, parse_page, base_url, body, headers.get('Content-Type'))
+                        self._metrics.extract_seconds.observe(time.perf_counter() - started)
+                if not self._stop:
+                    self._handle_response(url_id, response_url, status, headers, body, parsed)
+                    self._queued.discard(url_id)
+                    self._checkpoint_if_due()
+                    self._emit_metrics_if_due()
+            finally:
+                # Spilled urls are brought back before the queue can look drained
+                if not self._stop:
+                    self._fill_queue()
+                queue.task_done()
+
+    def _frontier_ids(self):
+        return self._queued
+
+    def _handle_response(self, requested_id, url, status, headers, body, parsed=None):
+        if not url:
+            self._error_links.add(requested_id)
+            return
+
+        link = self._normalizer.normalize(url)
+        if not link:
+            return
+        url = link.url
+        url_id = self._urls.intern(url)
+        step = 0
+        if self._max_steps_depth and requested_id in self._steps:
+            step = self._steps.pop(requested_id) + 1
+
+        # Handle redirects
+        if requested_id != url_id:
+            if not self._same_domain(link) or self._url_excluded(url):
+                return
+            self._add_graph(requested_id, url_id)
+            if url_id in self._steps:
+                step = min(step, self._steps.pop(url_id) + 1)
+            if url_id in self._graph:
+                return
+        elif url_id in self._graph:
+            # Already reached through a redirect that was answered first
+            return
 
+        started = time.perf_counter()
+        links, lastmod, listed = self._read_page(self._urls[requested_id], url_id, status, headers, body, parsed)
+        self._metrics.parsed(time.perf_counter() - started)
+        self._add_node(url_id, lastmod, listed)
+
+        if self._build_graph:
+            self._add_all_graph(url_id, links)
+
+        self._enqueue(links, step)
+
+    def _enqueue(self, links, step):
+        links = [link for link in links
+                 if link not in self._graph
+                 and link not in self._error_links
+                 and link not in self._queued
+                 and link not in self._spilled]
+        self._add_frontier((link, step) for link in links)
+
+    def _add_frontier(self, pairs):
+        for url_id, step in pairs:
+            if self._frontier_full(self._queue.qsize()):
+                self._spill_url(url_id, step)
+            else:
+                self._push(url_id, step)
+
+    def _fill_queue(self):
+        for url_id, step in self._unspill(self._queue.qsize()):
+            self._push(url_id, step)
+
+    def _push(self, url_id, step):
+        self._queued.add(url_id)
+        if self._max_steps_depth:
+            self._steps[url_id] = step
+        self._queue.put_nowait(url_id)
+
+    async def _load_robots(self, backend, host):
+        loading = self._robots_loading.get(host)
+        if loading is None:
+            loading = self._robots_loading[host] = asyncio.ensure_future(self._fetch_robots(backend, host))
+        # Shielded, a worker being cancelled mustn't cancel the fetch the other workers wait for
+        await asyncio.shield(loading)
+
+    async def _fetch_robots(self, backend, host):
+        # Fetched once per host, a missing or unreachable robots.txt allows everything
+        body = await self._fetch(backend, self._robots_url(host))
+        await self._load_sitemaps(backend, self._set_robots(host, body.decode('utf-8', 'replace') if body else ''))
+
+    async def _load_sitemaps(self, backend, sitemaps):
+        # The sitemaps of an index are fetched all at once
+        while sitemaps:
+            nested = await asyncio.gather(*(self._fetch_sitemap(backend, url) for url in sitemaps))
+            sitemaps = [url for urls in nested for url in urls]
+
+    async def _fetch_sitemap(self, backend, url):
+        # Pages are queued while the sitemap is still downloading, returns the sitemaps of a sitemap index.
+        # xml.etree is only imported by crawls seeded from sitemaps.
+        from xml.etree.ElementTree import ParseError
+        from pysitemap.sitemap_reader import SitemapParser
+        parser = SitemapParser()
+        nested = []
+        try:
+            async for chunk in backend.chunks(url, max_redirects=self._max_redirects):
+                nested += self._add_sitemap_locs(parser.feed(chunk), parser.index)
+            nested += self._add_sitemap_locs(parser.close(), parser.index)
+        except (HTTPError, ParseError, zlib.error):
+            pass
+        except (AssertionError, Exception) as e:
             if not self._no_verbose:
-                print('Found:', len(self._graph.keys()), 'Parsing:', urls)
-
-            responses = self._request(urls)
-            if responses:
-                for (requested_url, url, html) in responses:
-                    if self._stop:
-                        return
-
-                    if url:
-                        url = self._normalize(url)
-                        step = 0
-                        if self._max_steps_depth and requested_url in steps:
-                            step = steps[requested_url] + 1
-                            del steps[requested_url]
-
-                        # Handle redirects
-                        if requested_url != url:
-                            if not self._same_domain(url) or self._url_excluded(url):
-                                continue
-                            self._add_graph(requested_url, url)
-                            urls_to_request.discard(url)
-                            if url in steps:
-                                step = min(step, steps[url] + 1)
-                                del steps[url]
-                            if url in self._graph:
-                                continue
-
-                        # TODO Handle last modified
-                        # last_modified = response.info()['Last-Modified']
-                        # Fri, 19 Oct 2018 18:49:51 GMT
-                        # if last_modified:
-                        #     dateTimeObject = datetime.strptime(last_modified, '%a, %d %b %Y %H:%M:%S %Z')
-                        #     print('Last Modified:', dateTimeObject)
-
-                        # TODO Handle priority
-
-                        self._add_graph(url, None)
-
-                        if not html:
-                            continue
-
-                        links = []
-
-                        for match in self._extract_urls(str(html)):
-                            for link in match.split():
-                                is_url = self._is_url(link)
-                                link = self._normalize(link)
-                                if is_url:
-                                    if self._is_internal(link):
-                                        self._add_url(link, links)
-                                    elif self._is_relative(link):
-                                        link = urljoin(url, link)
-                                        self._add_url(link, links)
-
-                        if self._build_graph:
-                            self._add_all_graph(url, links)
-
-                        links = [link for link in links
-                                 if link not in self._graph
-                                 and link not in self._error_links
-                                 and link not in urls
-                                 and link not in urls_to_request]
-
-                        urls_to_request.update(links)
-
-                        if self._max_steps_depth:
-                            for link in links:
-                                steps[link] = step
-
-    # def _chunks(self, l, n):
-    #     for i in range(0, len(l), n):
-    #         yield l[i:i + n]
-
-    def _request(self, urls):
-        async def __fetch(session, url):
-            for i in range(0, self._retry_times):
-                try:
-                    async with session.get(url, max_redirects=self._max_redirects) as response:
-                        response.raise_for_status()
-                        return url, response.url.human_repr(), await response.read()
-                except TooManyRedirects as e:
-                    if not self._no_verbose:
-                        print("Couldn't get", url, 'there were too many redirection. Error=', e)
-                except (ClientResponseError, ClientError, ClientConnectionError, ClientOSError,
-                        ServerConnectionError) as e:
-                    if not self._no_verbose:
-                        print('HTTP Error code=', e, ' ', url)
-                except (AssertionError, Exception) as e:
+                self._log.warning('Error raised while requesting "%s": %s', url, e)
+        return nested
+
+    async def _fetch(self, backend, url):
+        try:
+            response = await backend.request(url, max_redirects=self._max_redirects)
+            return response.read()
+        except (AssertionError, Exception):
+            return None
+
+    def _set_crawl_delay(self, host, delay):
+        self._scheduler.host(host).set_delay(delay)
+
+    async def _request(self, backend, url, headers=None):
+        host = self._scheduler.host(urlsplit(url).netloc)
+        retry_after = None
+        for i in range(0, self._retry_times):
+            if i:
+                self._metrics.retried()
+                # Exponential backoff with jitter, or as long as the server asked for
+                await asyncio.sleep(max(self._scheduler.backoff(i), retry_after or 0))
+            retry_after = None
+            await host.acquire()
+            started = time.monotonic()
+            latency = None
+            throttled = failed = False
+            try:
+                response = await backend.request(url, headers=headers, max_redirects=self._max_redirects,
+                                                 body_limit=self._body_limit)
+                latency = time.monotonic() - started
+                self._metrics.fetched(latency, response.transferred)
+                if response.truncated:
+                    self._metrics.truncated_body()
+                return url, response.geturl(), response.getcode(), response.info(), response.read()
+            except HTTPError as e:
+                self._metrics.error('HTTP ' + str(e.code))
+                if e.code in REDIRECT_CODES:
                     if not self._no_verbose:
-                        print('Error raised while requesting "', url, '": ', e)
-            self._add_url(url, self._error_links)
-            return url, None, None
-
-        async def __fetch_all():
-            if self._timeout:
-                async with ClientSession(timeout=self._timeout,
-                                         headers=self._request_headers,
-                                         connector=TCPConnector(verify_ssl=self._verify_ssl,
-                                                                use_dns_cache=False,
-                                                                family=self.AF_INET)) as session:
-                    return await asyncio.gather(*[asyncio.create_task(__fetch(session, url)) for url in urls])
-
-        loop = asyncio.get_event_loop()
-        return loop.run_until_complete(__fetch_all())
+                        self._log.warning("Couldn't get %s there were too many redirection. Error=%s", url, e)
+                    break
+                if not self._no_verbose:
+                    self._log.warning('HTTP Error code=%s %s', e, url)
+                if e.code not in RETRY_CODES:
+                    break
+                throttled = e.code in THROTTLE_CODES
+                failed = not throttled
+                retry_after = retry_after_seconds(e.headers.get('Retry-After'))
+                host.pause(retry_after)
+            except URLError as e:
+                failed = True
+                self._metrics.error(type(e.reason).__name__)
+                if not self._no_verbose:
+                    self._log.warning('HTTP Error code=%s %s', e.reason, url)
+            except (AssertionError, Exception) as e:
+                self._metrics.error(type(e).__name__)
+                if not self._no_verbose:
+                    self._log.warning('Error raised while requesting "%s": %s', url, e)
+            finally:
+                host.release(latency, throttled=throttled, failed=failed)
+        return url, None, None, None, None
 
 # TODO: Implement a stop function to stop crawling with current data
 # TODO: Javascript! For example: https://c4assets.com/ is loaded dynamically, so this crawler finds no links in it!
@@ -0,0 +1,60 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    # Set membership in a fixed bit array. Never wrong about a key that was added, wrong about one that
+    # wasn't with probability error_rate once capacity keys were added.
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.count = 0
+        self._size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self._hashes = max(1, int(round(self._size / capacity * math.log(2))))
+        self._bits = bytearray((self._size + 7) // 8)
+
+    def __contains__(self, key):
+        bits = self._bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        bits = self._bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def _positions(self, key):
+        # Double hashing, the k positions are derived from the two halves of a single digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        size = self._size
+        return [(first + i * second) % size for i in range(self._hashes)]
+
+
+class ScalableBloomFilter:
+    # Bloom filters of growing capacity, one more is added each time the last one is full. Each one gets a
+    # tighter error rate than the previous, so the overall rate stays under error_rate however many keys
+    # are added (Almeida et al., Scalable Bloom Filters).
+    GROWTH = 2
+    TIGHTENING = 0.5
+
+    def __init__(self, capacity, error_rate):
+        self._filters = [BloomFilter(capacity, error_rate * (1 - self.TIGHTENING))]
+
+    def __contains__(self, key):
+        for bloom_filter in reversed(self._filters):
+            if key in bloom_filter:
+                return True
+        return False
+
+    def add(self, key):
+        last = self._filters[-1]
+        if last.count >= last.capacity:
+            last = BloomFilter(last.capacity * self.GROWTH, last.error_rate * self.TIGHTENING)
+            self._filters.append(last)
+        last.add(key)
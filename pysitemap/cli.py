@@ -0,0 +1,249 @@
+import argparse
+import logging
+import ssl
+from pysitemap.abc_crawler import _Crawler
+from pysitemap.metrics import JsonLinesSink, PrometheusTextfileSink
+from pysitemap.url_normalizer import TRACKING_PARAMS
+
+
+# https://github.com/Guiorgy/PySitemap
+# Fork of
+# https://github.com/Cartman720/PySitemap
+
+# Command line of the crawler, run as python -m pysitemap or python sitemap.py. Only the modules of the chosen
+# mode are imported: aiohttp with --asynchronous, numpy and scipy with --priority, h2 with --http2, the
+# distributed crawl with --shards, --listen or --join.
+
+
+def _parser(prog=None):
+    # initializing parameters
+    parser = argparse.ArgumentParser(prog=prog, description='Sitemap generator')
+    parser.add_argument('--url', action='store', default='', help='For example https://www.finstead.com')
+    parser.add_argument('--exclude', action='store', default='',
+                        help="regex patterns to exclude, separated by white spaces. For example 'symbol/info questions' will exclude https://www.finstead.com/symbol/info/ORCL and https://www.finstead.com/questions")
+    parser.add_argument('--no-verbose', action='store_true', default='', help="don't print verbose output")
+    parser.add_argument('--output', action='store', default='sitemap.xml',
+                        help='File path for output, if file exists it will be overwritten. Sites with more than 50000 urls '
+                             'are split into numbered files next to it and listed in a <name>_index.xml sitemap index')
+    parser.add_argument('--gzip', action='store_true', default=False, help='write gzip compressed sitemaps (.xml.gz)')
+    parser.add_argument('--sitemap-url', action='store', default='',
+                        help='url the sitemap files will be published under, used in the sitemap index (defaults to --url)')
+    parser.add_argument('--domain', action='store', default='', help='include subdomains of domain in search')
+    parser.add_argument('--asynchronous', action='store_true', default='', help='get requests will be sent asynchronously by a pool of concurrent workers')
+    parser.add_argument('--timeout', action='store', type=float, default=300, help='timeout in seconds')
+    parser.add_argument('--retry', action='store', type=int, default=0,
+                        help='times to retry url that returned an error')
+    parser.add_argument('--max-requests', action='store', type=int, default=100,
+                        help='maximum simultaneous get requests allowed')
+    parser.add_argument('--workers', action='store', type=int, default=1,
+                        help='number of threads fetching pages over keep-alive connections (only in synchronous mode)')
+    parser.add_argument('--limit-per-host', action='store', type=int, default=0,
+                        help='maximum simultaneous connections to the same host, 0 for no limit (only in asynchronous '
+                             'mode)')
+    parser.add_argument('--max-rate-per-host', action='store', type=float, default=None,
+                        help='maximum requests per second to the same host, unlimited by default (only in asynchronous '
+                             'mode, concurrency per host adapts to the latency and errors of the site)')
+    parser.add_argument('--dns-cache-ttl', action='store', type=int, default=None,
+                        help='seconds to cache resolved host names, 0 to disable the cache (only in asynchronous mode)')
+    parser.add_argument('--keepalive-timeout', action='store', type=float, default=None,
+                        help='seconds to keep idle connections open for reuse (only in asynchronous mode)')
+    parser.add_argument('--http2', action='store_true', default=False,
+                        help='send the requests to each host that supports HTTP/2 over one multiplexed connection '
+                             '(only in asynchronous mode, needs the h2 package)')
+    parser.add_argument('--verify-ssl', action='store_true', default='', help='skip certificate verification')
+    parser.add_argument('--max-redirects', action='store', type=int, default=10, help='maximum total number of redirections allowed')
+    parser.add_argument('--max-path-depth', action='store', type=int, default=None, help="maximum path depth (the amount of slashes ('/') after the domain)")
+    parser.add_argument('--checkpoint', action='store', default='',
+                        help='file the crawl state is saved to periodically, so an interrupted crawl can be resumed')
+    parser.add_argument('--checkpoint-interval', action='store', type=float,
+                        default=_Crawler.DEFAULT_CHECKPOINT_INTERVAL,
+                        help='seconds between checkpoints')
+    parser.add_argument('--resume', action='store', default='',
+                        help='checkpoint file of an interrupted crawl to continue from, the crawl keeps saving to it')
+    parser.add_argument('--ignore-robots', action='store_true', default=False,
+                        help="don't read robots.txt, by default its rules and Crawl-delay are honored and the "
+                             'sitemaps it lists are used to find pages')
+    parser.add_argument('--sitemap', action='append', default=[],
+                        help='sitemap or sitemap index (gzip compressed or not) whose pages are crawled from the '
+                             'start, can be given several times')
+    parser.add_argument('--no-sitemap-seed', action='store_true', default=False,
+                        help="don't read /sitemap.xml and the sitemaps robots.txt lists before crawling")
+    parser.add_argument('--cache', action='store', default='',
+                        help='file the validators, content hash and links of every page are kept in between crawls, '
+                             'unchanged pages are then answered with 304 Not Modified and not parsed again')
+    parser.add_argument('--parse-processes', action='store', type=int, default=0,
+                        help='processes extracting the links of large pages while pages keep downloading, 0 to parse '
+                             'them in the crawling process (only in asynchronous mode)')
+    parser.add_argument('--strip-params', action='store', default='',
+                        help="query parameters to remove from urls, separated by white spaces, * matches any "
+                             "characters. For example 'utm_* sessionid'")
+    parser.add_argument('--strip-tracking-params', action='store_true', default=False,
+                        help='remove common tracking and session parameters (utm_*, gclid, fbclid, jsessionid, ...)')
+    parser.add_argument('--sort-params', action='store_true', default=False,
+                        help='sort query parameters by name, so the same parameters in another order give the same url')
+    parser.add_argument('--dedup', action='store', choices=('exact', 'near'), default=None,
+                        help="leave pages with the same content as a page already crawled out of the sitemap and don't "
+                             "follow their links again. 'near' also catches pages differing in only a few words")
+    parser.add_argument('--ignore-canonical', action='store_true', default=False,
+                        help='list pages in the sitemap even if their <link rel=canonical> names another url')
+    parser.add_argument('--max-body-bytes', action='store', type=int, default=_Crawler.DEFAULT_MAX_BODY_BYTES,
+                        help='html pages are read up to this many bytes, 0 for no limit. Pages that aren\'t html '
+                             '(images, videos, archives, ...) are listed in the sitemap without downloading them')
+    parser.add_argument('--max-memory', action='store', type=int, default=None,
+                        help='approximate memory cap in MB for very large sites. Urls are kept on disk behind a cache '
+                             'and a Bloom filter, and the frontier spills to disk past a window')
+    parser.add_argument('--spill-dir', action='store', default=None,
+                        help='directory of the temporary files used with --max-memory (defaults to the system one)')
+    parser.add_argument('--bloom-error-rate', action='store', type=float, default=_Crawler.DEFAULT_BLOOM_ERROR_RATE,
+                        help='false positive rate of the Bloom filter used with --max-memory, each false positive '
+                             'costs a disk lookup')
+    parser.add_argument('--shards', action='store', type=int, default=1,
+                        help='split the crawl by host over this many worker processes, for sites spread over many '
+                             'subdomains (see --domain)')
+    parser.add_argument('--listen', action='store', default='',
+                        help='host:port or Unix socket path to wait on for --shards workers started with --join on '
+                             'other nodes, instead of starting them as local processes')
+    parser.add_argument('--join', action='store', default='',
+                        help='host:port or Unix socket path of a coordinator started with --listen, run as one of its '
+                             'workers')
+    parser.add_argument('--authkey', action='store', default='',
+                        help='shared secret of the coordinator and workers of a --listen/--join crawl')
+    parser.add_argument('--metrics-jsonl', action='store', default='',
+                        help='file crawl metrics (requests, bytes, pages per second, frontier size, fetch and parse '
+                             'timings, errors) are appended to as JSON lines')
+    parser.add_argument('--metrics-prometheus', action='store', default='',
+                        help='file the latest crawl metrics are written to in the Prometheus text format, for the node '
+                             'exporter textfile collector')
+    parser.add_argument('--metrics-interval', action='store', type=float, default=_Crawler.DEFAULT_METRICS_INTERVAL,
+                        help='seconds between metrics snapshots, one more is written when the crawl ends')
+    parser.add_argument('--priority', action='store_true', default=False,
+                        help='set <priority> from the PageRank of the pages in the link graph (needs numpy and scipy). '
+                             'The sitemap is then written when the crawl ends instead of while crawling')
+    parser.add_argument('--changefreq', action='store_true', default=False,
+                        help='set <changefreq> from how long ago pages last changed, best with --cache so unchanged '
+                             'pages keep their lastmod between crawls. The sitemap is then written when the crawl ends')
+    parser.add_argument('--max-steps-depth', action='store', type=int, default=0, help='maximum requests from the given url to crawl')
+    return parser
+
+
+def main(argv=None, prog=None):
+    # parsing parameters
+    parser = _parser(prog)
+    args = parser.parse_args(argv)
+    url = args.url
+    if (args.listen or args.join) and not args.authkey:
+        parser.error('--listen and --join need an --authkey')
+    if (args.shards > 1 or args.listen) and (args.metrics_jsonl or args.metrics_prometheus):
+        parser.error('metrics are only collected by a single crawler, not with --shards or --listen')
+    if (args.shards > 1 or args.listen) and (args.priority or args.changefreq):
+        parser.error('--priority and --changefreq need a single crawler, not --shards or --listen')
+    if (args.shards > 1 or args.listen) and (args.checkpoint or args.resume or
+                                             args.checkpoint_interval != _Crawler.DEFAULT_CHECKPOINT_INTERVAL):
+        parser.error('--checkpoint, --checkpoint-interval and --resume need a single crawler, not --shards or '
+                     '--listen')
+    if args.priority:
+        from pysitemap import link_analysis
+        if not link_analysis.available():
+            parser.error('--priority needs numpy and scipy')
+    if args.http2 and not args.asynchronous:
+        parser.error('--http2 needs --asynchronous')
+    if args.http2:
+        from pysitemap import http2_backend
+        if not http2_backend.available():
+            parser.error('--http2 needs the h2 package')
+    logging.basicConfig(format='%(message)s', level=logging.INFO)
+
+    # monkey patch ssl
+    # ssl.match_hostname = lambda cert, hostname: hostname == cert['subjectAltName'][0][1]
+    ssl.match_hostname = lambda cert, hostname: True
+
+    if args.join:
+        from pysitemap.distributed import parse_address, run_worker
+        # The coordinator sends the url and options of the crawl
+        run_worker(parse_address(args.join), args.authkey.encode())
+        return
+
+    found_links = []
+
+    # pages are written to the sitemap as they are found, unless their priority or changefreq is needed first
+    ranked = args.priority or args.changefreq
+    from pysitemap.sitemap_writer import SitemapWriter
+    writer = None if ranked else SitemapWriter(args.output, base_url=args.sitemap_url or url, compress=args.gzip)
+
+    # initializing crawler
+    crawler = None
+    distributed = args.shards > 1 or args.listen
+    strip_params = args.strip_params.split() + list(TRACKING_PARAMS if args.strip_tracking_params else ())
+    metrics_sinks = []
+    if args.metrics_jsonl:
+        metrics_sinks.append(JsonLinesSink(args.metrics_jsonl))
+    if args.metrics_prometheus:
+        metrics_sinks.append(PrometheusTextfileSink(args.metrics_prometheus))
+    # Left to the defaults of the asynchronous crawler unless given
+    connection_options = {name: value for name, value in (('dns_cache_ttl', args.dns_cache_ttl),
+                                                          ('keepalive_timeout', args.keepalive_timeout))
+                          if value is not None}
+    # Only the crawler that runs is imported, the asynchronous one brings aiohttp in
+    if distributed:
+        from pysitemap.distributed import Coordinator, parse_address
+        options = dict(exclude=args.exclude, domain=args.domain, timeout=args.timeout, retry_times=args.retry + 1,
+                       verify_ssl=args.verify_ssl, max_redirects=args.max_redirects,
+                       max_path_depth=args.max_path_depth, max_steps_depth=args.max_steps_depth,
+                       robots=not args.ignore_robots, sitemaps=args.sitemap, seed_sitemaps=not args.no_sitemap_seed,
+                       cache=args.cache, max_memory=args.max_memory, spill_dir=args.spill_dir,
+                       bloom_error_rate=args.bloom_error_rate, strip_params=strip_params,
+                       sort_params=args.sort_params, dedup=args.dedup, honor_canonical=not args.ignore_canonical,
+                       max_body_bytes=args.max_body_bytes)
+        if args.asynchronous:
+            options.update(max_requests=args.max_requests, limit_per_host=args.limit_per_host,
+                           max_rate_per_host=args.max_rate_per_host, parse_processes=args.parse_processes,
+                           http2=args.http2, **connection_options)
+        else:
+            options.update(workers=args.workers)
+        crawler = Coordinator(url, shards=args.shards, address=parse_address(args.listen) if args.listen else None,
+                              authkey=args.authkey.encode() or None, local_workers=not args.listen,
+                              asynchronous=args.asynchronous, no_verbose=args.no_verbose, sitemap_writer=writer,
+                              **options)
+    elif args.asynchronous:
+        from pysitemap.async_crawler import Crawler as AsyncCrawler
+        crawler = AsyncCrawler(url, exclude=args.exclude, domain=args.domain, no_verbose=args.no_verbose,
+                               timeout=args.timeout, retry_times=args.retry + 1, max_requests=args.max_requests,
+                               verify_ssl=args.verify_ssl, max_redirects=args.max_redirects,
+                               max_path_depth=args.max_path_depth, max_steps_depth=args.max_steps_depth,
+                               limit_per_host=args.limit_per_host, max_rate_per_host=args.max_rate_per_host,
+                               sitemap_writer=writer, robots=not args.ignore_robots, sitemaps=args.sitemap,
+                               seed_sitemaps=not args.no_sitemap_seed, parse_processes=args.parse_processes,
+                               checkpoint=args.checkpoint, checkpoint_interval=args.checkpoint_interval,
+                               cache=args.cache, max_memory=args.max_memory, spill_dir=args.spill_dir,
+                               bloom_error_rate=args.bloom_error_rate, strip_params=strip_params,
+                               sort_params=args.sort_params, dedup=args.dedup,
+                               honor_canonical=not args.ignore_canonical, metrics_sinks=metrics_sinks,
+                               metrics_interval=args.metrics_interval, max_body_bytes=args.max_body_bytes,
+                               build_graph=args.priority, compact_graph=args.priority, http2=args.http2,
+                               **connection_options)
+    else:
+        from pysitemap.crawler import Crawler
+        crawler = Crawler(url, exclude=args.exclude, domain=args.domain, no_verbose=args.no_verbose,
+                          timeout=args.timeout, retry_times=args.retry + 1, verify_ssl=args.verify_ssl,
+                          max_redirects=args.max_redirects, max_path_depth=args.max_path_depth,
+                          max_steps_depth=args.max_steps_depth, workers=args.workers, sitemap_writer=writer,
+                          robots=not args.ignore_robots, sitemaps=args.sitemap,
+                          seed_sitemaps=not args.no_sitemap_seed,
+                          checkpoint=args.checkpoint, checkpoint_interval=args.checkpoint_interval, cache=args.cache,
+                          max_memory=args.max_memory, spill_dir=args.spill_dir,
+                          bloom_error_rate=args.bloom_error_rate, strip_params=strip_params,
+                          sort_params=args.sort_params, dedup=args.dedup, honor_canonical=not args.ignore_canonical,
+                          metrics_sinks=metrics_sinks, metrics_interval=args.metrics_interval,
+                          max_body_bytes=args.max_body_bytes, build_graph=args.priority,
+                          compact_graph=args.priority)
+
+    try:
+        # fetch links
+        links = crawler.start() if distributed else crawler.start(resume=args.resume)
+    finally:
+        if ranked:
+            crawler.write_sitemap(args.output, base_url=args.sitemap_url or url, compress=args.gzip,
+                                  priority=args.priority, changefreq=args.changefreq)
+        else:
+            writer.close()
+        crawler.close()
@@ -0,0 +1,114 @@
+import http.client
+import threading
+import zlib
+from urllib.error import URLError
+from urllib.parse import urlsplit, quote
+from pysitemap.fetch_backend import FetchBackend, FetchResponse, BodyDecoder, BODY_CHUNK_SIZE, DRAIN_BYTES, \
+    read_limit
+
+
+class ConnectionPool(FetchBackend):
+    # HTTP/1.1 backend of the synchronous crawler, over persistent keep-alive connections
+    BODY_CHUNK_SIZE = BODY_CHUNK_SIZE
+    DRAIN_BYTES = DRAIN_BYTES
+
+    _safe_path_chars = "/%:@!$&'()*+,;=-._~"
+    _safe_query_chars = _safe_path_chars + '?'
+
+    def __init__(self, timeout=None, context=None, max_connections_per_host=1):
+        self._timeout = timeout
+        self._context = context
+        self._max_connections_per_host = max_connections_per_host if max_connections_per_host > 0 else 1
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def send(self, url, headers=None, body_limit=None):
+        scheme, netloc, path, qs, anchor = urlsplit(url)
+        if scheme not in ('http', 'https') or not netloc:
+            raise ValueError('unknown url type: ' + repr(url))
+        target = quote(path, safe=self._safe_path_chars) or '/'
+        if qs:
+            target += '?' + quote(qs, safe=self._safe_query_chars)
+        key = (scheme, netloc)
+
+        connection, reused = self._acquire(key)
+        try:
+            try:
+                connection.request('GET', target, headers=headers or {})
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server dropped an idle keep-alive connection, try once more on a fresh one
+                if not reused:
+                    raise
+                connection.close()
+                connection = self._connect(key)
+                connection.request('GET', target, headers=headers or {})
+                response = connection.getresponse()
+            body, complete, transferred, truncated = self._read(
+                response, read_limit(response.status, response.headers, body_limit))
+        except (http.client.HTTPException, OSError, ValueError, zlib.error) as e:
+            # ValueError of an unknown Content-Encoding or a corrupted brotli body, zlib.error of other corrupted ones
+            connection.close()
+            raise URLError(e)
+        if response.will_close or not complete:
+            connection.close()
+        else:
+            self._release(key, connection)
+        return FetchResponse(url, response.status, response.headers, body, transferred, truncated,
+                             response.reason)
+
+    def _read(self, response, limit):
+        # Returns the body, decoded and up to limit bytes, whether all of it was read, the bytes received and
+        # whether it was cut at the limit
+        if limit == 0:
+            if response.length is not None and response.length <= self.DRAIN_BYTES:
+                return b'', True, len(response.read()), False
+            return b'', False, 0, False
+        decoder = BodyDecoder(response.headers.get('Content-Encoding'))
+        if limit is None and not decoder:
+            body = response.read()
+            return body, True, len(body), False
+        body = bytearray()
+        transferred = 0
+        # Up to a byte past the limit, a body of exactly limit bytes is read to its end and isn't truncated
+        while limit is None or len(body) <= limit:
+            # Compressed bodies are read a chunk at a time, the limit applies to the decoded bytes
+            chunk = response.read(self.BODY_CHUNK_SIZE if decoder or limit is None
+                                  else min(self.BODY_CHUNK_SIZE, limit + 1 - len(body)))
+            if not chunk:
+                body += decoder.flush()
+                break
+            transferred += len(chunk)
+            body += decoder.decode(chunk)
+        # http.client closes the response once the whole body was read
+        complete = response.isclosed()
+        truncated = limit is not None and len(body) > limit
+        return bytes(body[:limit]) if limit is not None else bytes(body), complete, transferred, truncated
+
+    def _acquire(self, key):
+        with self._lock:
+            connections = self._idle.get(key)
+            if connections:
+                return connections.pop(), True
+        return self._connect(key), False
+
+    def _release(self, key, connection):
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self._max_connections_per_host:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def _connect(self, key):
+        scheme, netloc = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self._timeout, context=self._context)
+        return http.client.HTTPConnection(netloc, timeout=self._timeout)
@@ -0,0 +1,71 @@
+import sqlite3
+
+
+class CrawlState:
+    # SQLite checkpoint of a crawl. Urls, found pages, graph edges and errors only ever grow, so each checkpoint
+    # appends what is new since the previous one. The frontier is small and changes all the time, so it is
+    # replaced as a whole. Everything is written in one transaction, a checkpoint is either fully there or not.
+
+    def __init__(self, path):
+        self._path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript('''
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS urls (id INTEGER PRIMARY KEY, url TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS pages (id INTEGER PRIMARY KEY, lastmod TEXT, listed INTEGER NOT NULL DEFAULT 1);
+            CREATE TABLE IF NOT EXISTS edges (source INTEGER NOT NULL, target INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS errors (id INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS frontier (id INTEGER PRIMARY KEY, step INTEGER NOT NULL);
+        ''')
+        self._saved_urls = self._connection.execute('SELECT COUNT(*) FROM urls').fetchone()[0]
+
+    @property
+    def path(self):
+        return self._path
+
+    def close(self):
+        self._connection.close()
+
+    def reset(self):
+        with self._connection as connection:
+            for table in ('meta', 'urls', 'pages', 'edges', 'errors', 'frontier'):
+                connection.execute('DELETE FROM ' + table)
+        self._saved_urls = 0
+
+    def save(self, urls, pages, edges, errors, frontier, meta=None):
+        # urls is the crawl's UrlIndex, pages ((id, lastmod, listed) triples) and edges are the ones found since
+        # the last save
+        with self._connection as connection:
+            if len(urls) > self._saved_urls:
+                connection.executemany('INSERT OR REPLACE INTO urls (id, url) VALUES (?, ?)',
+                                       ((url_id, urls[url_id]) for url_id in range(self._saved_urls, len(urls))))
+            connection.executemany('INSERT OR IGNORE INTO pages (id, lastmod, listed) VALUES (?, ?, ?)', pages)
+            connection.executemany('INSERT INTO edges (source, target) VALUES (?, ?)', edges)
+            connection.execute('DELETE FROM errors')
+            connection.executemany('INSERT INTO errors (id) VALUES (?)', ((error,) for error in errors))
+            connection.execute('DELETE FROM frontier')
+            connection.executemany('INSERT OR REPLACE INTO frontier (id, step) VALUES (?, ?)', frontier)
+            if meta:
+                connection.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                       ((key, str(value)) for key, value in meta.items()))
+        self._saved_urls = len(urls)
+
+    def meta(self):
+        return dict(self._connection.execute('SELECT key, value FROM meta'))
+
+    def urls(self):
+        return (url for url_id, url in self._connection.execute('SELECT id, url FROM urls ORDER BY id'))
+
+    def pages(self):
+        return self._connection.execute('SELECT id, lastmod, listed FROM pages ORDER BY rowid')
+
+    def edges(self):
+        return self._connection.execute('SELECT source, target FROM edges ORDER BY rowid')
+
+    def errors(self):
+        return (error for error, in self._connection.execute('SELECT id FROM errors'))
+
+    def frontier(self):
+        return self._connection.execute('SELECT id, step FROM frontier')
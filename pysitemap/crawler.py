@@ -1,10 +1,11 @@
-import re
 import ssl
-from urllib import request
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from urllib.error import URLError, HTTPError
-from urllib.parse import urljoin
-from urllib.request import HTTPRedirectHandler
+from urllib.parse import urlsplit
 from pysitemap.abc_crawler import _Crawler
+from pysitemap.connection_pool import ConnectionPool
 
 
 # https://github.com/Guiorgy/PySitemap
@@ -19,121 +20,228 @@ class Crawler(_Crawler):
         context.verify_mode = ssl.CERT_NONE
         return context
 
-    class _HTTPRedirectHandler(HTTPRedirectHandler):
-        max_redirections = 10
-
     def __init__(self, url, exclude=None, domain=None, no_verbose=False, request_header=None,
                  timeout=_Crawler.DEFAULT_TIMEOUT, retry_times=1, build_graph=False, verify_ssl=False,
-                 max_redirects=10, max_path_depth=None, max_steps_depth=0):
+                 max_redirects=10, max_path_depth=None, max_steps_depth=0, workers=1, compact_graph=False,
+                 sitemap_writer=None, checkpoint=None, checkpoint_interval=_Crawler.DEFAULT_CHECKPOINT_INTERVAL,
+                 cache=None, robots=True, sitemaps=None, seed_sitemaps=True, max_memory=None, spill_dir=None,
+                 bloom_error_rate=_Crawler.DEFAULT_BLOOM_ERROR_RATE, strip_params=None, sort_params=False,
+                 dedup=None, honor_canonical=True, metrics_sinks=None,
+                 metrics_interval=_Crawler.DEFAULT_METRICS_INTERVAL, max_body_bytes=_Crawler.DEFAULT_MAX_BODY_BYTES,
+                 backend=None):
         _Crawler.__init__(self, url, exclude=exclude, domain=domain, no_verbose=no_verbose,
                           request_header=request_header, timeout=timeout, retry_times=retry_times,
                           build_graph=build_graph, verify_ssl=verify_ssl, max_redirects=max_redirects,
-                          max_path_depth=max_path_depth, max_steps_depth=max_steps_depth)
+                          max_path_depth=max_path_depth, max_steps_depth=max_steps_depth,
+                          compact_graph=compact_graph, sitemap_writer=sitemap_writer, checkpoint=checkpoint,
+                          checkpoint_interval=checkpoint_interval, cache=cache, robots=robots, sitemaps=sitemaps,
+                          seed_sitemaps=seed_sitemaps, max_memory=max_memory, spill_dir=spill_dir,
+                          bloom_error_rate=bloom_error_rate, strip_params=strip_params, sort_params=sort_params,
+                          dedup=dedup, honor_canonical=honor_canonical, metrics_sinks=metrics_sinks,
+                          metrics_interval=metrics_interval, max_body_bytes=max_body_bytes)
 
         self._context = None if verify_ssl else self._get_default_context()
-        if self._max_redirects != 10:
-            self._HTTPRedirectHandler.max_redirections = self._max_redirects
-            request.build_opener(self._HTTPRedirectHandler)
+        self._workers = workers if workers and workers > 0 else 1
+        # Requests go through the backend given, a FetchBackend, or over persistent HTTP/1.1 keep-alive
+        # connections, at most one idle connection per host and worker
+        self._backend = backend or ConnectionPool(timeout=self._timeout, context=self._context,
+                                                  max_connections_per_host=self._workers)
+        self._frontier = set()
+        self._in_flight = set()
+        # Crawl-delay of hosts that set one and when the next request to them may be sent
+        self._crawl_delays = {}
+        self._next_request = {}
+        self._delay_lock = threading.Lock()
+
+    def close(self):
+        self._backend.close()
+        _Crawler.close(self)
 
     def _crawl(self, root_url):
-        urls_to_request = {root_url}
-        steps = {}
-        if self._max_steps_depth:
-            steps[root_url] = 0
-
-        while urls_to_request:
-            if self._stop:
-                return
-
-            try:
-                while True:
-                    url = urls_to_request.pop()
-                    if not self._max_steps_depth or steps[url] <= self._max_steps_depth:
-                        break
-                    else:
-                        try:
-                            del steps[url]
-                        except KeyError:
-                            pass
-            except KeyError:
-                break
-
-            if not self._no_verbose:
-                print('Found:', len(self._graph.keys()), 'Parsing:', url)
-
-            response = self._request(url)
-            if response:
-                step = 0
-                if self._max_steps_depth and url in steps:
-                    step = steps[url] + 1
-                    del steps[url]
-
-                # Handle redirects
-                parsed_url = self._normalize(response.geturl())
-                if url != parsed_url:
-                    if not self._same_domain(parsed_url) or self._url_excluded(parsed_url):
-                        continue
-                    self._add_graph(url, parsed_url)
-                    urls_to_request.discard(parsed_url)
-                    if parsed_url in steps:
-                        step = min(step, steps[parsed_url] + 1)
-                        del steps[parsed_url]
-                    if parsed_url in self._graph:
+        frontier = self._initial_frontier(root_url)
+        self._frontier = set()
+        self._steps = {}
+        self._add_frontier(frontier.items())
+
+        # Responses can arrive in any order, so urls being fetched are tracked until they are handled
+        in_flight = {}
+        self._in_flight = set()
+
+        host = self._robots_host(root_url)
+        if host:
+            self._load_robots(host)
+        self._load_sitemaps(self._initial_sitemaps(root_url))
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            while True:
+                if self._stop:
+                    for future in in_flight:
+                        future.cancel()
+                    return
+
+                for url_id, step in self._unspill(len(self._frontier)):
+                    self._push(url_id, step)
+                while self._frontier and len(in_flight) < self._workers:
+                    url_id = self._frontier.pop()
+                    if self._max_steps_depth and self._steps[url_id] > self._max_steps_depth:
+                        del self._steps[url_id]
                         continue
-                    url = parsed_url
-
-                # TODO Handle last modified
-                # last_modified = response.info()['Last-Modified']
-                # Fri, 19 Oct 2018 18:49:51 GMT
-                # if last_modified:
-                #     dateTimeObject = datetime.strptime(last_modified, '%a, %d %b %Y %H:%M:%S %Z')
-                #     print('Last Modified:', dateTimeObject)
-
-                # TODO Handle priority
 
-                self._add_graph(url, None)
-
-                links = []
-
-                for match in self._extract_urls(str(response.read())):
-                    for link in match.split():
-                        is_url = self._is_url(link)
-                        link = self._normalize(link)
-                        if is_url:
-                            if self._is_internal(link):
-                                self._add_url(link, links)
-                            elif self._is_relative(link):
-                                link = urljoin(url, link)
-                                self._add_url(link, links)
-
-                if self._build_graph:
-                    self._add_all_graph(url, links)
-
-                links = [link for link in links
-                         if link not in self._graph
-                         and link not in self._error_links
-                         and link not in urls_to_request]
+                    url = self._urls[url_id]
+                    host = self._robots_host(url)
+                    if host:
+                        self._load_robots(host)
+                    if self._robots and self._robots_excluded(url):
+                        self._steps.pop(url_id, None)
+                        continue
 
-                urls_to_request.update(links)
+                    if not self._no_verbose:
+                        self._log.info('Found: %d Parsing: %s', len(self._graph.keys()), url)
 
-                if self._max_steps_depth:
-                    for link in links:
-                        steps[link] = step
+                    in_flight[executor.submit(self._request, url, self._conditional_headers(url))] = url_id
+                    self._in_flight.add(url_id)
 
-    def _request(self, url):
+                if not in_flight:
+                    if not self._frontier and not self._spill and not self._refill_frontier():
+                        break
+                    continue
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url_id = in_flight.pop(future)
+                    self._handle_response(url_id, future.result())
+                    self._in_flight.discard(url_id)
+                self._checkpoint_if_due()
+                self._emit_metrics_if_due()
+
+    def _frontier_ids(self):
+        return self._frontier | self._in_flight
+
+    def _handle_response(self, url_id, response):
+        if not response:
+            self._error_links.add(url_id)
+            return
+
+        requested_url = self._urls[url_id]
+        steps = self._steps
+        step = 0
+        if self._max_steps_depth and url_id in steps:
+            step = steps[url_id] + 1
+            del steps[url_id]
+
+        # Handle redirects
+        link = self._normalizer.normalize(response.geturl())
+        if not link:
+            return
+        url = link.url
+        parsed_id = self._urls.intern(url)
+        if url_id != parsed_id:
+            if not self._same_domain(link) or self._url_excluded(url):
+                return
+            self._add_graph(url_id, parsed_id)
+            self._frontier.discard(parsed_id)
+            if parsed_id in steps:
+                step = min(step, steps[parsed_id] + 1)
+                del steps[parsed_id]
+            if parsed_id in self._graph:
+                return
+            url_id = parsed_id
+        elif url_id in self._graph:
+            # Already reached through a redirect that was answered first
+            return
+
+        started = time.perf_counter()
+        links, lastmod, listed = self._read_page(requested_url, url_id, response.getcode(), response.info(),
+                                                 response.read())
+        self._metrics.parsed(time.perf_counter() - started)
+        self._add_node(url_id, lastmod, listed)
+
+        if self._build_graph:
+            self._add_all_graph(url_id, links)
+
+        self._enqueue(links, step)
+
+    def _enqueue(self, links, step):
+        links = [link for link in links
+                 if link not in self._graph
+                 and link not in self._error_links
+                 and link not in self._frontier
+                 and link not in self._in_flight
+                 and link not in self._spilled]
+        self._add_frontier((link, step) for link in links)
+
+    def _add_frontier(self, pairs):
+        for url_id, step in pairs:
+            if self._frontier_full(len(self._frontier)):
+                self._spill_url(url_id, step)
+            else:
+                self._push(url_id, step)
+
+    def _push(self, url_id, step):
+        self._frontier.add(url_id)
+        if self._max_steps_depth:
+            self._steps[url_id] = step
+
+    def _load_robots(self, host):
+        # Fetched once per host, a missing or unreachable robots.txt allows everything
+        response = self._fetch(self._robots_url(host))
+        self._load_sitemaps(self._set_robots(host, response.read().decode('utf-8', 'replace') if response else ''))
+
+    def _load_sitemaps(self, sitemaps):
+        while sitemaps:
+            # xml.etree is only imported by crawls seeded from sitemaps
+            from pysitemap.sitemap_reader import read_sitemap
+            response = self._fetch(sitemaps.pop())
+            if response:
+                sitemaps.extend(self._add_sitemap_locs(*read_sitemap(response.read())))
+
+    def _fetch(self, url):
+        try:
+            return self._backend.request(url, headers=self._request_headers, max_redirects=self._max_redirects)
+        except (HTTPError, URLError, ValueError):
+            return None
+
+    def _set_crawl_delay(self, host, delay):
+        self._crawl_delays[host] = delay
+
+    def _wait_crawl_delay(self, url):
+        # Requests to a host with a Crawl-delay take turns, each one waits for the delay after the previous one
+        host = urlsplit(url).netloc
+        delay = self._crawl_delays.get(host)
+        if not delay:
+            return
+        with self._delay_lock:
+            now = time.monotonic()
+            at = max(now, self._next_request.get(host, 0))
+            self._next_request[host] = at + delay
+        if at > now:
+            time.sleep(at - now)
+
+    def _request(self, url, headers=None):
+        headers = dict(self._request_headers, **headers) if headers else self._request_headers
+        if self._crawl_delays:
+            self._wait_crawl_delay(url)
         for i in range(0, self._retry_times):
+            if i:
+                self._metrics.retried()
+            started = time.monotonic()
             try:
-                req = request.Request(url, headers=self._request_headers)
-                return request.urlopen(req, context=self._context, timeout=self._timeout)
+                response = self._backend.request(url, headers=headers, max_redirects=self._max_redirects,
+                                                 body_limit=self._body_limit)
+                self._metrics.fetched(time.monotonic() - started, response.transferred)
+                if response.truncated:
+                    self._metrics.truncated_body()
+                return response
             except HTTPError as e:
+                self._metrics.error('HTTP ' + str(e.code))
                 if not self._no_verbose:
-                    print('HTTP Error code: ', e.code, ' ', url)
-                self._add_url(url, self._error_links)
+                    self._log.warning('HTTP Error code: %s %s', e.code, url)
             except URLError as e:
+                self._metrics.error(type(e.reason).__name__)
                 if not self._no_verbose:
-                    print('Error: Failed to reach server. ', e.reason)
+                    self._log.warning('Error: Failed to reach server. %s', e.reason)
             except ValueError as e:
+                self._metrics.error(type(e).__name__)
                 if not self._no_verbose:
-                    print('Error: Failed read url. ', e)
-        self._add_url(url, self._error_links)
+                    self._log.warning('Error: Failed read url. %s', e)
         return None
@@ -0,0 +1,88 @@
+import hashlib
+import re
+from collections import Counter
+
+
+# Markup, scripts and styles don't count as content, words are runs of anything but ASCII punctuation and space
+_markup_pattern = re.compile(rb'<(script|style)\b.*?</\1\s*>|<!--.*?-->|<[^>]*>', re.IGNORECASE | re.DOTALL)
+_word_pattern = re.compile(rb'[^\x00-\x2f\x3a-\x40\x5b-\x60\x7b-\x7f]+')
+_entity_pattern = re.compile(rb'&#?\w+;')
+
+SIMHASH_BITS = 64
+
+
+def simhash(body):
+    # 64 bit SimHash of the 3-word shingles of the text of an html page (Charikar, Manku et al.). Pages that
+    # differ in a few words get fingerprints that differ in a few bits.
+    text = _entity_pattern.sub(b' ', _markup_pattern.sub(b' ', body)).lower()
+    words = _word_pattern.findall(text)
+    shingles = [b' '.join(shingle) for shingle in zip(words, words[1:], words[2:])] or words
+    if not shingles:
+        return 0
+    digests = b''.join(hashlib.blake2b(shingle, digest_size=8).digest() for shingle in shingles)
+
+    # Bits are counted a byte column at a time, one Counter per column instead of a loop per bit and shingle
+    counts = [0] * SIMHASH_BITS
+    for column in range(8):
+        for value, count in Counter(digests[column::8]).items():
+            for bit in range(8):
+                if value & (1 << bit):
+                    counts[column * 8 + bit] += count
+    half = len(shingles) / 2
+    fingerprint = 0
+    for bit, count in enumerate(counts):
+        if count > half:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class SimHashIndex:
+    # Finds a stored fingerprint within max_distance bits of another. The bits are split into max_distance + 1
+    # blocks, two fingerprints that close agree on at least one whole block, so only the fingerprints sharing
+    # a block are compared.
+
+    def __init__(self, max_distance=3):
+        self._max_distance = max_distance
+        blocks = max_distance + 1
+        edges = [SIMHASH_BITS * i // blocks for i in range(blocks + 1)]
+        self._blocks = [(start, (1 << (end - start)) - 1) for start, end in zip(edges, edges[1:])]
+        self._tables = [{} for _ in self._blocks]
+
+    def find(self, fingerprint):
+        for (shift, mask), table in zip(self._blocks, self._tables):
+            for other, value in table.get((fingerprint >> shift) & mask, ()):
+                if bin(fingerprint ^ other).count('1') <= self._max_distance:
+                    return value
+        return None
+
+    def add(self, fingerprint, value):
+        for (shift, mask), table in zip(self._blocks, self._tables):
+            table.setdefault((fingerprint >> shift) & mask, []).append((fingerprint, value))
+
+
+class DuplicateDetector:
+    # Remembers the content of the pages crawled so far. Pages are compared by a hash of their body, and with
+    # near also by SimHash, which catches copies that differ in a session id, a timestamp or a counter.
+    DEFAULT_MAX_DISTANCE = 3
+
+    def __init__(self, near=False, max_distance=DEFAULT_MAX_DISTANCE):
+        self._hashes = {}
+        self._simhashes = SimHashIndex(max_distance) if near else None
+
+    def check(self, url_id, content_hash, body=None):
+        # Returns the id of the page url_id is a copy of, or None after remembering it as an original.
+        # content_hash is the hex digest of the body, body is only needed to find near duplicates.
+        key = bytes.fromhex(content_hash[:16])
+        original = self._hashes.get(key)
+        if original is not None:
+            return original
+        fingerprint = None
+        if self._simhashes is not None and body:
+            fingerprint = simhash(body)
+            original = self._simhashes.find(fingerprint)
+            if original is not None:
+                return original
+        self._hashes[key] = url_id
+        if fingerprint is not None:
+            self._simhashes.add(fingerprint, url_id)
+        return None
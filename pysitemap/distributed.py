@@ -0,0 +1,291 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from multiprocessing.connection import Client, Listener, wait
+from urllib.parse import urlsplit
+from pysitemap.sitemap_writer import SitemapWriter
+
+
+_logger = logging.getLogger('pysitemap')
+
+
+# Coordinator and shard workers of a distributed crawl. Urls are partitioned by a hash of their host, every
+# worker crawls the hosts of its shard with the usual crawler and forwards the links it finds to the other
+# hosts to the coordinator, which hands them to their owners. Workers are local processes or run on other
+# nodes, they talk to the coordinator over a TCP or Unix socket.
+#
+# The coordinator keeps count of the url batches it sent to every worker. A worker that runs out of urls
+# reports how many batches it received, and the crawl is over once every worker is idle and has received
+# every batch sent to it.
+
+
+def shard_of(url, shards):
+    # crc32 rather than hash(), which is salted differently in every process
+    return zlib.crc32(urlsplit(url).netloc.encode('utf-8')) % shards
+
+
+def parse_address(address):
+    # host:port for a TCP socket, anything else is the path of a Unix socket
+    host, separator, port = address.rpartition(':')
+    if separator and port.isdigit():
+        return host or '127.0.0.1', int(port)
+    return address
+
+
+class _ShardCrawler:
+    # Mixed into a crawler class, it only crawls the urls of its shard and exchanges the others
+    # with the coordinator
+    FORWARD_BATCH_SIZE = 512
+    FORWARD_INTERVAL = 0.1
+
+    def _join_shard(self, connection, shard, shards):
+        self._connection = connection
+        self._shard = shard
+        self._shards = shards
+        self._forward = []
+        self._forwarded = set()
+        self._received = 0
+        self._next_forward = time.monotonic() + self.FORWARD_INTERVAL
+
+    def _owns(self, url):
+        return shard_of(url, self._shards) == self._shard
+
+    def _initial_frontier(self, root_url):
+        frontier = super()._initial_frontier(root_url)
+        return {url_id: step for url_id, step in frontier.items() if self._owns(self._urls[url_id])}
+
+    def _initial_sitemaps(self, root_url):
+        # Seeded by the owner of the root url only
+        return super()._initial_sitemaps(root_url) if self._owns(root_url) else []
+
+    def _set_robots(self, host, text):
+        sitemaps = super()._set_robots(host, text)
+        return sitemaps if self._owns(self._robots_url(host)) else []
+
+    def _enqueue(self, links, step):
+        own = []
+        for url_id in links:
+            url = self._urls[url_id]
+            if self._owns(url):
+                own.append(url_id)
+            elif url_id not in self._forwarded:
+                self._forwarded.add(url_id)
+                self._forward.append((url, step))
+        super()._enqueue(own, step)
+
+        if len(self._forward) >= self.FORWARD_BATCH_SIZE or \
+                (self._forward and time.monotonic() >= self._next_forward):
+            self._send_forward()
+        # Urls sent by the other shards are picked up while crawling, not only once this one runs dry
+        while self._connection.poll():
+            self._receive(self._connection.recv())
+
+    def _refill_frontier(self):
+        self._send_forward()
+        self._connection.send(('idle', self._received))
+        return self._receive(self._connection.recv())
+
+    def _send_forward(self):
+        if self._forward:
+            self._connection.send(('links', self._forward))
+            self._forward = []
+        self._next_forward = time.monotonic() + self.FORWARD_INTERVAL
+
+    def _receive(self, message):
+        # Returns False when the coordinator ends the crawl
+        if message[0] != 'urls':
+            return False
+        self._received += 1
+        steps = {}
+        for url, step in message[1]:
+            steps.setdefault(step, []).append(self._urls.intern(url))
+        for step, url_ids in steps.items():
+            super()._enqueue(url_ids, step)
+        return True
+
+
+def _shard_crawler(asynchronous):
+    # Only the crawler a worker runs is imported, the asynchronous one brings aiohttp in
+    if asynchronous:
+        from pysitemap.async_crawler import Crawler
+    else:
+        from pysitemap.crawler import Crawler
+    return type('_ShardCrawler', (_ShardCrawler, Crawler), {})
+
+
+def run_worker(address, authkey):
+    # Connects to the coordinator, crawls the shard it is given and sends back what was found
+    connection = Client(address, authkey=authkey)
+    # Spawned workers start without the logging set up by the process that started them
+    if not logging.getLogger().handlers:
+        logging.basicConfig(format='%(message)s', level=logging.INFO)
+    try:
+        kind, shard, shards, url, asynchronous, options = connection.recv()
+        if options.get('cache'):
+            options['cache'] = '%s.%d' % (options['cache'], shard)
+        crawler = _shard_crawler(asynchronous)(url, **options)
+        crawler._join_shard(connection, shard, shards)
+        try:
+            crawler.start()
+            urls = crawler._urls
+            pages = [(urls[url_id], crawler._lastmod.get(url_id)) for url_id in crawler._graph.keys()
+                     if url_id not in crawler._unlisted]
+            connection.send(('result', pages, crawler.generate_graph(), urls.urls(crawler._error_links)))
+        finally:
+            crawler.close()
+    finally:
+        connection.close()
+
+
+class _Sender(threading.Thread):
+    # Sends the messages queued for one worker, so the coordinator never blocks on a worker that is busy
+    # crawling instead of reading
+    def __init__(self, connection):
+        threading.Thread.__init__(self, daemon=True)
+        self._connection = connection
+        self._messages = queue.Queue()
+
+    def send(self, message):
+        self._messages.put(message)
+
+    def close(self):
+        self._messages.put(None)
+        self.join()
+
+    def run(self):
+        while True:
+            message = self._messages.get()
+            if message is None:
+                return
+            try:
+                self._connection.send(message)
+            except (OSError, EOFError):
+                return
+
+
+class Coordinator:
+    # Runs a crawl split over shards workers and merges what they found. Unless local_workers is False they
+    # are started as local processes, otherwise shards workers are expected to connect to address with
+    # run_worker (python sitemap.py --join). Other keyword arguments are passed to the crawler of every worker.
+    DEFAULT_ADDRESS = ('127.0.0.1', 0)
+
+    def __init__(self, url, shards=2, address=None, authkey=None, local_workers=True, asynchronous=False,
+                 no_verbose=False, sitemap_writer=None, **options):
+        self._url = url
+        self._shards = shards if shards and shards > 0 else 1
+        self._address = address or self.DEFAULT_ADDRESS
+        self._authkey = authkey or os.urandom(32)
+        self._local_workers = local_workers
+        self._asynchronous = asynchronous
+        self._no_verbose = no_verbose
+        self._sitemap_writer = sitemap_writer
+        self._options = dict(options, no_verbose=no_verbose)
+        self._pages = {}
+        self._graph = {} if options.get('build_graph') else None
+        self._error_links = set()
+
+    def start(self):
+        processes = []
+        connections = []
+        senders = []
+        with Listener(self._address, authkey=self._authkey) as listener:
+            try:
+                if self._local_workers:
+                    # Spawned, the workers don't inherit the state of the process that started them
+                    context = multiprocessing.get_context('spawn')
+                    for _ in range(self._shards):
+                        process = context.Process(target=run_worker, args=(listener.address, self._authkey),
+                                                  daemon=True)
+                        process.start()
+                        processes.append(process)
+                elif not self._no_verbose:
+                    _logger.info('Waiting for %d workers on %s', self._shards, listener.address)
+                for shard in range(self._shards):
+                    connection = listener.accept()
+                    connection.send(('crawl', shard, self._shards, self._url, self._asynchronous, self._options))
+                    connections.append(connection)
+                    sender = _Sender(connection)
+                    sender.start()
+                    senders.append(sender)
+
+                self._exchange(connections, senders)
+                for sender in senders:
+                    sender.send(('stop',))
+                for shard, connection in enumerate(connections):
+                    self._merge(shard, self._receive(shard, connection))
+            finally:
+                for sender in senders:
+                    sender.close()
+                for connection in connections:
+                    connection.close()
+                for process in processes:
+                    process.join(5)
+                    if process.is_alive():
+                        process.terminate()
+
+        if not self._no_verbose and self._error_links:
+            _logger.warning('Failed to parse: %s', sorted(self._error_links))
+        return list(self._pages.keys())
+
+    def _exchange(self, connections, senders):
+        # Routes the links the workers forward to the shards owning them until every worker is idle
+        # and has received everything sent to it
+        sent = [0] * self._shards
+        idle = [None] * self._shards
+        shards = {connection: shard for shard, connection in enumerate(connections)}
+        forwarded = set()
+        while True:
+            for connection in wait(connections):
+                shard = shards[connection]
+                message = self._receive(shard, connection)
+                if message[0] == 'idle':
+                    idle[shard] = message[1]
+                    continue
+                batches = {}
+                for url, step in message[1]:
+                    if url not in forwarded:
+                        forwarded.add(url)
+                        batches.setdefault(shard_of(url, self._shards), []).append((url, step))
+                for owner, batch in batches.items():
+                    sent[owner] += 1
+                    senders[owner].send(('urls', batch))
+            if idle == sent:
+                return
+
+    def _receive(self, shard, connection):
+        try:
+            return connection.recv()
+        except EOFError:
+            raise ConnectionError('Worker of shard ' + str(shard) + ' disconnected')
+
+    def _merge(self, shard, result):
+        kind, pages, graph, errors = result
+        for url, lastmod in pages:
+            if url in self._pages:
+                continue
+            self._pages[url] = lastmod
+            if self._sitemap_writer is not None:
+                self._sitemap_writer.add(url, lastmod)
+        if self._graph is not None and graph:
+            for source, edges in graph.items():
+                self._graph.setdefault(source, set()).update(edges)
+        self._error_links.update(errors)
+        if not self._no_verbose:
+            _logger.info('Shard %d found %d pages', shard, len(pages))
+
+    def generate_graph(self):
+        return self._graph
+
+    def write_sitemap(self, path, base_url=None, compress=False):
+        writer = SitemapWriter(path, base_url=base_url or self._url + '/', compress=compress)
+        for url, lastmod in self._pages.items():
+            writer.add(url, lastmod)
+        return writer.close()
+
+    def close(self):
+        self._pages = {}
+        self._graph = None
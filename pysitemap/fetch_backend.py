@@ -0,0 +1,199 @@
+import zlib
+from abc import ABC, abstractmethod
+from urllib.error import HTTPError
+from urllib.parse import urljoin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# What a fetch backend does for the crawlers: send a GET, follow redirects, read the body no further than the
+# crawler wants and decode it, and report failures as urllib's HTTPError (the server answered with an error
+# status) or URLError (it couldn't be reached or the response was unreadable). Retries, pacing and robots.txt
+# stay in the crawlers.
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+BODY_CHUNK_SIZE = 64 * 1024
+# A body that isn't wanted is still read when it is this small, so the connection can be reused
+DRAIN_BYTES = 64 * 1024
+# Compressed transfer, brotli only when its module is installed
+ACCEPT_ENCODING = 'gzip, deflate, br' if brotli is not None else 'gzip, deflate'
+
+
+class FetchResponse:
+    # Mimics the parts of the object returned by urllib.request.urlopen that the crawlers use. body is decoded,
+    # transferred counts the bytes received for it and truncated tells it was cut at the limit.
+    def __init__(self, url, status, headers, body, transferred=None, truncated=False, reason=''):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self._body = body
+        self.transferred = len(body) if transferred is None else transferred
+        self.truncated = truncated
+
+    def geturl(self):
+        return self.url
+
+    def info(self):
+        return self.headers
+
+    def getcode(self):
+        return self.status
+
+    def read(self):
+        return self._body
+
+
+class _DeflateDecoder:
+    # Content-Encoding: deflate should be zlib wrapped, some servers send the raw stream. Which one it is shows
+    # in the 2 bytes of the zlib header, the first chunks are held back until they are in.
+    def __init__(self):
+        self._decoder = None
+        self._head = b''
+
+    def decompress(self, data):
+        if self._decoder is None:
+            self._head += data
+            if len(self._head) < 2:
+                return b''
+            data, self._head = self._head, b''
+            self._decoder = zlib.decompressobj()
+            try:
+                return self._decoder.decompress(data)
+            except zlib.error:
+                self._decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._decoder.decompress(data)
+
+    def flush(self):
+        if self._decoder is None:
+            # A body of a single byte can't be zlib wrapped
+            self._decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._decoder.decompress(self._head) + self._decoder.flush()
+        return self._decoder.flush()
+
+
+class _BrotliDecoder:
+    def __init__(self):
+        self._decoder = brotli.Decompressor()
+
+    def decompress(self, data):
+        # brotli.error derives from Exception only, raised as the ValueError the backends expect of a bad body
+        try:
+            return self._decoder.process(data)
+        except brotli.error as e:
+            raise ValueError('Invalid brotli body: %s' % e)
+
+    def flush(self):
+        return b''
+
+
+class BodyDecoder:
+    # Undoes the Content-Encoding of a body chunk by chunk, as it arrives. Raises ValueError for encodings it
+    # doesn't know and for corrupted brotli bodies, zlib.error for corrupted gzip and deflate ones.
+    def __init__(self, content_encoding):
+        encodings = [encoding.strip().lower() for encoding in (content_encoding or '').split(',')]
+        # Listed in the order the server applied them, undone the other way round
+        self._decoders = [self._decoder(encoding) for encoding in reversed(encodings)
+                          if encoding and encoding != 'identity']
+
+    def __bool__(self):
+        return bool(self._decoders)
+
+    @staticmethod
+    def _decoder(encoding):
+        if encoding in ('gzip', 'x-gzip'):
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if encoding == 'deflate':
+            return _DeflateDecoder()
+        if encoding == 'br' and brotli is not None:
+            return _BrotliDecoder()
+        raise ValueError('Unsupported Content-Encoding: ' + encoding)
+
+    def decode(self, data):
+        for decoder in self._decoders:
+            data = decoder.decompress(data)
+        return data
+
+    def flush(self):
+        data = b''
+        for decoder in self._decoders:
+            data = decoder.decompress(data) + decoder.flush() if data else decoder.flush()
+        return data
+
+
+def redirect_url(url, status, headers, redirects, max_redirects):
+    # The url a redirect response points to, None if the response isn't a redirect
+    location = headers.get('Location')
+    if status not in REDIRECT_CODES or not location:
+        return None
+    if redirects >= max_redirects:
+        raise HTTPError(url, status, 'The HTTP server returned a redirect error that would lead to an infinite loop.',
+                        headers, None)
+    return urljoin(url, location)
+
+
+def read_limit(status, headers, body_limit):
+    # Only the bodies of successful responses are worth reading, the others are drained if small
+    if not 200 <= status < 300:
+        return 0
+    return body_limit(headers) if body_limit else None
+
+
+class FetchBackend(ABC):
+    # Backend of the synchronous crawler, called from its worker threads
+
+    def request(self, url, headers=None, max_redirects=10, body_limit=None):
+        # body_limit is called with the headers of the final response and returns how many bytes of the
+        # decoded body to read, None for all of it
+        redirects = 0
+        while True:
+            response = self.send(url, headers, body_limit)
+            next_url = redirect_url(url, response.status, response.headers, redirects, max_redirects)
+            if next_url is None:
+                break
+            redirects += 1
+            url = next_url
+        if response.status >= 400:
+            raise HTTPError(url, response.status, response.reason, response.headers, None)
+        return response
+
+    @abstractmethod
+    def send(self, url, headers=None, body_limit=None):
+        # One request, redirects aren't followed
+        pass
+
+    def close(self):
+        pass
+
+
+class AsyncFetchBackend(ABC):
+    # Backend of the asynchronous crawler, called from its event loop
+
+    async def request(self, url, headers=None, max_redirects=10, body_limit=None):
+        redirects = 0
+        while True:
+            response = await self.send(url, headers, body_limit)
+            next_url = redirect_url(url, response.status, response.headers, redirects, max_redirects)
+            if next_url is None:
+                break
+            redirects += 1
+            url = next_url
+        if response.status >= 400:
+            raise HTTPError(url, response.status, response.reason, response.headers, None)
+        return response
+
+    @abstractmethod
+    async def send(self, url, headers=None, body_limit=None):
+        pass
+
+    async def chunks(self, url, headers=None, max_redirects=10):
+        # The decoded body in chunks, for reading large documents like sitemaps as they download. Backends that
+        # can't stream hand it over in one piece.
+        response = await self.request(url, headers, max_redirects)
+        yield response.read()
+
+    async def close(self):
+        pass
@@ -0,0 +1,126 @@
+import tempfile
+from array import array
+
+
+class IdSet:
+    # Set of url ids as a bitmap. Ids are handed out densely from 0, so one bit per url ever seen is enough,
+    # against a hash table entry and an int object per member in a set.
+
+    def __init__(self, ids=()):
+        self._bits = bytearray()
+        self._len = 0
+        self.update(ids)
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, url_id):
+        byte = url_id >> 3
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << (url_id & 7)))
+
+    def __iter__(self):
+        for byte, bits in enumerate(self._bits):
+            if bits:
+                for bit in range(8):
+                    if bits & (1 << bit):
+                        yield (byte << 3) | bit
+
+    def add(self, url_id):
+        byte = url_id >> 3
+        bits = self._bits
+        if byte >= len(bits):
+            bits.extend(bytes(max(byte + 1 - len(bits), len(bits))))
+        mask = 1 << (url_id & 7)
+        if not bits[byte] & mask:
+            bits[byte] |= mask
+            self._len += 1
+
+    def update(self, ids):
+        for url_id in ids:
+            self.add(url_id)
+
+    def discard(self, url_id):
+        byte = url_id >> 3
+        mask = 1 << (url_id & 7)
+        if byte < len(self._bits) and self._bits[byte] & mask:
+            self._bits[byte] &= ~mask
+            self._len -= 1
+
+
+class PageSet(IdSet):
+    # Stands in for the page graph when no edges are kept, the ids of the crawled pages are all it holds
+    def __setitem__(self, url_id, edges):
+        self.add(url_id)
+
+    def __getitem__(self, url_id):
+        return None
+
+    def keys(self):
+        return self
+
+    def items(self):
+        return ((url_id, None) for url_id in self)
+
+
+class SpillQueue:
+    # First in, first out queue of (url id, step) pairs kept in a temporary file, for the part of the frontier
+    # that doesn't fit in memory. Pairs are appended in chunks and read back in the order they were pushed.
+    CHUNK_SIZE = 4096
+
+    def __init__(self, directory=None):
+        self._file = tempfile.TemporaryFile(prefix='pysitemap-frontier-', dir=directory)
+        self._tail = array('i')
+        self._read = 0
+        self._written = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def push(self, url_id, step):
+        self._tail.append(url_id)
+        self._tail.append(step)
+        self._len += 1
+        if len(self._tail) >= 2 * self.CHUNK_SIZE:
+            self._flush()
+
+    def pop(self, count):
+        # Up to count of the oldest pairs
+        if self._read < self._written:
+            size = min(2 * count * self._tail.itemsize, self._written - self._read)
+            self._file.seek(self._read)
+            values = array('i')
+            values.frombytes(self._file.read(size))
+            self._read += size
+            if self._read == self._written:
+                # Drained, the file starts over from the beginning
+                self._file.seek(0)
+                self._file.truncate()
+                self._read = self._written = 0
+        else:
+            values = self._tail[:2 * count]
+            del self._tail[:2 * count]
+        self._len -= len(values) // 2
+        return list(zip(values[::2], values[1::2]))
+
+    def items(self):
+        # Every pair still queued, oldest first, without taking them out
+        position = self._read
+        while position < self._written:
+            size = min(2 * self.CHUNK_SIZE * self._tail.itemsize, self._written - position)
+            self._file.seek(position)
+            values = array('i')
+            values.frombytes(self._file.read(size))
+            position += size
+            yield from zip(values[::2], values[1::2])
+        tail = self._tail
+        yield from zip(tail[::2], tail[1::2])
+
+    def close(self):
+        self._file.close()
+
+    def _flush(self):
+        self._file.seek(self._written)
+        self._file.write(self._tail.tobytes())
+        self._written += len(self._tail) * self._tail.itemsize
+        self._tail = array('i')
@@ -0,0 +1,225 @@
+import mmap
+import struct
+import sys
+from array import array
+from pysitemap.sitemap_writer import xml_escape
+
+
+# Compact binary file of a link graph, written in one streaming pass and read back through mmap without
+# loading it. Urls are stored once in a string table and the links as compressed sparse rows: the int32
+# target ids of every url, one url after the other, and where each url's targets start.
+#
+#   header          magic, version, url count, edge count and the offset of every section
+#   url table       utf-8 urls back to back
+#   url offsets     url count + 1 int64, url i is url table[offsets[i]:offsets[i + 1]]
+#   targets         edge count int32
+#   edge offsets    url count + 1 int64, the targets of url i are targets[offsets[i]:offsets[i + 1]]
+#
+# Numbers are little-endian and sections start at multiples of 8 bytes.
+MAGIC = b'PSMGRAPH'
+VERSION = 1
+_header = struct.Struct('<8sIIQQQQQQ')
+_little_endian = sys.byteorder == 'little'
+
+
+def _align(file):
+    padding = -file.tell() % 8
+    if padding:
+        file.write(bytes(padding))
+    return file.tell()
+
+
+def _write_array(file, values):
+    if not _little_endian:
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(file)
+
+
+def write_graph(path, urls, adjacency):
+    # urls are all the urls of the graph in id order, adjacency yields (source id, target ids) pairs in
+    # increasing source id order, sources without links can be left out. Returns the number of edges.
+    with open(path, 'wb') as file:
+        file.write(bytes(_header.size))
+
+        url_table = file.tell()
+        url_offsets = array('q', [0])
+        position = 0
+        for url in urls:
+            encoded = url.encode('utf-8')
+            file.write(encoded)
+            position += len(encoded)
+            url_offsets.append(position)
+        count = len(url_offsets) - 1
+        url_offsets_start = _align(file)
+        _write_array(file, url_offsets)
+        del url_offsets
+
+        targets_start = _align(file)
+        edge_offsets = array('q', [0])
+        edges = 0
+        for source, targets in adjacency:
+            if source >= count or source < len(edge_offsets) - 1:
+                raise ValueError('Sources must be url ids in increasing order')
+            edge_offsets.extend([edges] * (source + 1 - len(edge_offsets)))
+            if not isinstance(targets, array) or targets.typecode != 'i':
+                targets = array('i', sorted(targets))
+            _write_array(file, targets)
+            edges += len(targets)
+            edge_offsets.append(edges)
+        edge_offsets.extend([edges] * (count + 1 - len(edge_offsets)))
+        edge_offsets_start = _align(file)
+        _write_array(file, edge_offsets)
+
+        file.seek(0)
+        file.write(_header.pack(MAGIC, VERSION, 0, count, edges, url_table, url_offsets_start, targets_start,
+                                edge_offsets_start))
+    return edges
+
+
+class GraphFile:
+    # A graph saved with write_graph, memory mapped. Url ids are the positions of the urls in the file.
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file can't be mapped
+            self._file.close()
+            raise ValueError(path + ' is not a graph file')
+        if len(self._map) < _header.size:
+            self.close()
+            raise ValueError(path + ' is not a graph file')
+        magic, version, _, count, edges, url_table, url_offsets, targets, edge_offsets = \
+            _header.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(path + ' is not a graph file of version ' + str(VERSION))
+        self._count = count
+        self.edge_count = edges
+        self._url_table = url_table
+        view = memoryview(self._map)
+        self._url_offsets = self._section(view, url_offsets, count + 1, 'q')
+        self._targets = self._section(view, targets, edges, 'i')
+        self._edge_offsets = self._section(view, edge_offsets, count + 1, 'q')
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _section(self, view, start, length, typecode):
+        size = array(typecode).itemsize
+        section = view[start:start + length * size]
+        if _little_endian:
+            return section.cast(typecode)
+        # Copied and swapped on big-endian machines, they can't use the mapped bytes as they are
+        values = array(typecode, section.tobytes())
+        values.byteswap()
+        return values
+
+    def url(self, url_id):
+        offsets = self._url_offsets
+        start = self._url_table + offsets[url_id]
+        return self._map[start:self._url_table + offsets[url_id + 1]].decode('utf-8')
+
+    def urls(self):
+        for url_id in range(self._count):
+            yield self.url(url_id)
+
+    def successors(self, url_id):
+        # Target ids of the links of url_id, a view on the mapped file
+        return self._targets[self._edge_offsets[url_id]:self._edge_offsets[url_id + 1]]
+
+    def adjacency(self):
+        for source in range(self._count):
+            targets = self.successors(source)
+            if len(targets):
+                yield source, targets
+
+    def edges(self):
+        for source, targets in self.adjacency():
+            for target in targets:
+                yield source, target
+
+    def to_dict(self):
+        # The graph as Crawler.generate_graph returns it, only the urls with links are keys
+        url = self.url
+        return {url(source): {url(target) for target in targets} for source, targets in self.adjacency()}
+
+    def close(self):
+        # Views on the map have to be released before it can be closed
+        for name in ('_url_offsets', '_targets', '_edge_offsets'):
+            section = self.__dict__.pop(name, None)
+            if isinstance(section, memoryview):
+                section.release()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+class DictGraph:
+    # Adapts a {url: urls} graph, as Crawler.generate_graph returns, to the reading methods of GraphFile
+    def __init__(self, graph):
+        self._ids = {}
+        self._urls = []
+        self._adjacency = []
+        for source, targets in graph.items():
+            self._adjacency.append((self._intern(source), sorted(self._intern(target) for target in targets)))
+        self._adjacency.sort()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _intern(self, url):
+        url_id = self._ids.get(url)
+        if url_id is None:
+            url_id = self._ids[url] = len(self._urls)
+            self._urls.append(url)
+        return url_id
+
+    def url(self, url_id):
+        return self._urls[url_id]
+
+    def urls(self):
+        return iter(self._urls)
+
+    def adjacency(self):
+        return iter(self._adjacency)
+
+    def edges(self):
+        for source, targets in self._adjacency:
+            for target in targets:
+                yield source, target
+
+
+def write_gexf(graph, path):
+    # Streams graph, a GraphFile or anything with the same urls() and edges(), to a GEXF file for Gephi
+    # and similar tools. Nodes are identified and labeled by their url, like networkx writes them.
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                   '<gexf xmlns="http://www.gexf.net/1.2draft" version="1.2">\n'
+                   '  <graph defaultedgetype="directed" mode="static">\n'
+                   '    <nodes>\n')
+        lines = []
+        for url in graph.urls():
+            url = xml_escape(url)
+            lines.append('      <node id="%s" label="%s" />\n' % (url, url))
+            if len(lines) >= 4096:
+                file.write(''.join(lines))
+                lines = []
+        lines.append('    </nodes>\n    <edges>\n')
+        for edge_id, (source, target) in enumerate(graph.edges()):
+            lines.append('      <edge id="%d" source="%s" target="%s" />\n' % (
+                edge_id, xml_escape(graph.url(source)), xml_escape(graph.url(target))))
+            if len(lines) >= 4096:
+                file.write(''.join(lines))
+                lines = []
+        lines.append('    </edges>\n  </graph>\n</gexf>\n')
+        file.write(''.join(lines))
@@ -0,0 +1,164 @@
+import asyncio
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+
+# Responses that mean the server is overloaded or asks us to slow down
+THROTTLE_CODES = (429, 503)
+# Responses worth asking again for, after a backoff
+RETRY_CODES = (408, 429, 500, 502, 503, 504)
+
+
+def retry_after_seconds(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+class HostLimiter:
+    # Politeness and adaptive concurrency for one host.
+    # A token bucket caps the request rate when max_rate is set. The number of requests in flight follows AIMD:
+    # it doubles per round trip until the first sign of trouble (slow start), then grows by one per round trip
+    # while latency stays close to the fastest seen, and is cut when the server errors, throttles or slows down.
+    INITIAL_CONCURRENCY = 2
+    DECREASE_FACTOR = 0.5
+    LATENCY_DECREASE_FACTOR = 0.9
+    LATENCY_TOLERANCE = 2.0
+    LATENCY_SLACK = 0.05
+    LATENCY_SMOOTHING = 0.2
+
+    def __init__(self, max_concurrency, max_rate=None, burst=1):
+        self._max_concurrency = max(1, max_concurrency)
+        self._limit = float(min(self.INITIAL_CONCURRENCY, self._max_concurrency))
+        self._slow_start = True
+        self._in_flight = 0
+        self._waiters = deque()
+        self._rate = max_rate if max_rate and max_rate > 0 else None
+        self._burst = max(1, burst)
+        self._tokens = float(self._burst)
+        self._refilled = None
+        self._resume_at = 0
+        self._latency = None
+        self._min_latency = None
+        self._decreased = 0
+
+    @property
+    def concurrency(self):
+        return max(1, int(self._limit))
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def set_delay(self, delay):
+        # A fixed delay between requests, like a robots.txt Crawl-delay, lowers the rate to match it
+        if delay and delay > 0 and (self._rate is None or 1 / delay < self._rate):
+            self._rate = 1 / delay
+
+    def pause(self, seconds):
+        # Nothing is sent to the host until the pause is over, used for Retry-After
+        if seconds and seconds > 0:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self._resume_at:
+                await asyncio.sleep(self._resume_at - now)
+                continue
+            if self._in_flight >= self.concurrency:
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                try:
+                    await waiter
+                except asyncio.CancelledError:
+                    # Pass the wake up on to another waiter if this one was woken just before being cancelled
+                    if waiter.done() and not waiter.cancelled():
+                        self._wake()
+                    raise
+                continue
+            delay = self._take_token(now)
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            self._in_flight += 1
+            return
+
+    def release(self, latency=None, throttled=False, failed=False):
+        self._in_flight -= 1
+        now = time.monotonic()
+        if throttled or failed:
+            self._decrease(now, self.DECREASE_FACTOR)
+        elif latency is not None:
+            self._observe(now, latency)
+        self._wake()
+
+    def _take_token(self, now):
+        if self._rate is None:
+            return 0
+        if self._refilled is not None:
+            self._tokens = min(self._burst, self._tokens + (now - self._refilled) * self._rate)
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self._rate
+
+    def _observe(self, now, latency):
+        self._latency = latency if self._latency is None \
+            else self._latency + self.LATENCY_SMOOTHING * (latency - self._latency)
+        self._min_latency = latency if self._min_latency is None else min(self._min_latency, latency)
+        if self._latency > max(self._min_latency * self.LATENCY_TOLERANCE, self._min_latency + self.LATENCY_SLACK):
+            self._decrease(now, self.LATENCY_DECREASE_FACTOR)
+        elif self._slow_start:
+            self._limit = min(self._max_concurrency, self._limit + 1)
+        else:
+            self._limit = min(self._max_concurrency, self._limit + 1 / self._limit)
+
+    def _decrease(self, now, factor):
+        # At most once per round trip, the responses of requests sent before the cut would cut it again
+        self._slow_start = False
+        if now - self._decreased < (self._latency or 0):
+            return
+        self._decreased = now
+        self._limit = max(1.0, self._limit * factor)
+
+    def _wake(self):
+        free = self.concurrency - self._in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class HostScheduler:
+    # Hands out a HostLimiter per host and computes retry backoffs (exponential, with full jitter)
+    DEFAULT_BACKOFF_BASE = 0.5
+    DEFAULT_BACKOFF_MAX = 60
+
+    def __init__(self, max_concurrency, max_rate=None, backoff_base=DEFAULT_BACKOFF_BASE,
+                 backoff_max=DEFAULT_BACKOFF_MAX):
+        self._max_concurrency = max_concurrency
+        self._max_rate = max_rate
+        self._backoff_base = backoff_base if backoff_base and backoff_base > 0 else self.DEFAULT_BACKOFF_BASE
+        self._backoff_max = backoff_max if backoff_max and backoff_max > 0 else self.DEFAULT_BACKOFF_MAX
+        self._hosts = {}
+
+    def host(self, host):
+        limiter = self._hosts.get(host)
+        if limiter is None:
+            limiter = self._hosts[host] = HostLimiter(self._max_concurrency, self._max_rate)
+        return limiter
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self._backoff_max, self._backoff_base * 2 ** attempt))
@@ -0,0 +1,277 @@
+import asyncio
+import ssl
+import zlib
+from http.client import HTTPMessage
+from urllib.error import URLError
+from urllib.parse import urlsplit
+from pysitemap.fetch_backend import AsyncFetchBackend, FetchResponse, BodyDecoder, read_limit
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.errors
+    import h2.events
+    import h2.exceptions
+    import h2.settings
+except ImportError:
+    h2 = None
+
+
+# Headers only HTTP/1.1 connections have, HTTP/2 forbids them
+_CONNECTION_HEADERS = ('connection', 'host', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade')
+
+
+def available():
+    return h2 is not None
+
+
+class Http2Backend(AsyncFetchBackend):
+    # Sends the requests to a host as concurrent streams of one HTTP/2 connection. https hosts are asked for
+    # HTTP/2 through ALPN, the ones that don't speak it, and plain http hosts, are left to the fallback backend.
+    # With cleartext, plain http hosts are spoken HTTP/2 to without asking (h2c with prior knowledge), for
+    # servers known to support it.
+    # Received data is acknowledged as it is read, so a stream only buffers up to its window
+    STREAM_WINDOW = 1024 * 1024
+    CONNECTION_WINDOW = 16 * 1024 * 1024
+    READ_SIZE = 64 * 1024
+    # Streams open at once on a connection, fewer if the server asks for it
+    MAX_STREAMS = 100
+
+    def __init__(self, fallback, headers=None, timeout=None, verify_ssl=False, cleartext=False,
+                 max_streams=MAX_STREAMS):
+        if h2 is None:
+            raise ImportError('HTTP/2 needs the h2 package')
+        self._fallback = fallback
+        self._headers = headers or {}
+        # Seconds for a whole request, None to wait as long as it takes
+        self._timeout = timeout
+        self._verify_ssl = verify_ssl
+        self._cleartext = cleartext
+        self._max_streams = max_streams if max_streams and max_streams > 0 else self.MAX_STREAMS
+        self._connections = {}
+        self._connecting = {}
+        # Hosts that answered ALPN without h2
+        self._http1 = set()
+
+    async def close(self):
+        connections, self._connections = self._connections, {}
+        for connection in connections.values():
+            connection.close()
+        await self._fallback.close()
+
+    async def send(self, url, headers=None, body_limit=None):
+        scheme, netloc, path, query, _ = urlsplit(url)
+        connection = await self._connection(scheme, netloc)
+        if connection is None:
+            return await self._fallback.send(url, headers, body_limit)
+        target = (path or '/') + ('?' + query if query else '')
+        request_headers = dict(self._headers, **headers) if headers else self._headers
+        try:
+            return await asyncio.wait_for(connection.request(url, target, request_headers, body_limit),
+                                          self._timeout)
+        except asyncio.TimeoutError as e:
+            raise URLError(e)
+
+    async def chunks(self, url, headers=None, max_redirects=10):
+        # Large documents are read over HTTP/1.1, a stream would hold them whole
+        async for chunk in self._fallback.chunks(url, headers, max_redirects):
+            yield chunk
+
+    async def _connection(self, scheme, netloc):
+        key = (scheme, netloc)
+        connection = self._connections.get(key)
+        if connection is not None and not connection.closed:
+            return connection
+        if key in self._http1 or (scheme != 'https' and not self._cleartext):
+            return None
+        # The requests to a host waiting for its connection share the attempt
+        connecting = self._connecting.get(key)
+        if connecting is None:
+            connecting = self._connecting[key] = asyncio.ensure_future(self._connect(scheme, netloc))
+            connecting.add_done_callback(lambda _: self._connecting.pop(key, None))
+        connection = await asyncio.shield(connecting)
+        if connection is None:
+            self._http1.add(key)
+        else:
+            self._connections[key] = connection
+        return connection
+
+    async def _connect(self, scheme, netloc):
+        split = urlsplit('//' + netloc)
+        host = split.hostname
+        try:
+            if scheme == 'https':
+                context = ssl.create_default_context()
+                if not self._verify_ssl:
+                    context.check_hostname = False
+                    context.verify_mode = ssl.CERT_NONE
+                context.set_alpn_protocols(['h2', 'http/1.1'])
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(host, split.port or 443, ssl=context, server_hostname=host),
+                    self._timeout)
+                if writer.get_extra_info('ssl_object').selected_alpn_protocol() != 'h2':
+                    writer.close()
+                    return None
+            else:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, split.port or 80),
+                                                        self._timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise URLError(e)
+        return _Connection(reader, writer, scheme, netloc, self._max_streams, self.STREAM_WINDOW,
+                           self.CONNECTION_WINDOW, self.READ_SIZE)
+
+
+class _Stream:
+    def __init__(self):
+        self.response = asyncio.get_running_loop().create_future()
+        # Data chunks, None once the stream ended or the error that ended it
+        self.data = asyncio.Queue()
+        self.ended = False
+
+    def fail(self, error):
+        if not self.response.done():
+            self.response.set_exception(error)
+        self.data.put_nowait(error)
+
+
+class _Connection:
+    # One HTTP/2 connection and the task reading its frames, which hands headers and data to the streams
+    def __init__(self, reader, writer, scheme, authority, max_streams, stream_window, connection_window, read_size):
+        self._reader = reader
+        self._writer = writer
+        self._scheme = scheme
+        self._authority = authority
+        self._read_size = read_size
+        self._max_streams = max_streams
+        self._streams = {}
+        self._slot_freed = asyncio.Event()
+        self.closed = False
+        config = h2.config.H2Configuration(client_side=True, header_encoding='utf-8')
+        self._h2 = h2.connection.H2Connection(config=config)
+        self._h2.local_settings = h2.settings.Settings(client=True, initial_values={
+            h2.settings.SettingCodes.INITIAL_WINDOW_SIZE: stream_window,
+            h2.settings.SettingCodes.ENABLE_PUSH: 0,
+        })
+        self._h2.initiate_connection()
+        self._h2.increment_flow_control_window(connection_window - 65535)
+        self._flush()
+        self._reading = asyncio.ensure_future(self._read_frames())
+
+    def close(self):
+        self.closed = True
+        self._reading.cancel()
+        self._writer.close()
+
+    def _flush(self):
+        # Frames are small, the socket buffers them without waiting for drain
+        data = self._h2.data_to_send()
+        if data:
+            self._writer.write(data)
+
+    async def request(self, url, target, headers, body_limit):
+        while not self.closed and \
+                len(self._streams) >= min(self._max_streams, self._h2.remote_settings.max_concurrent_streams):
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+        if self.closed:
+            raise URLError('HTTP/2 connection closed')
+        stream_id = self._h2.get_next_available_stream_id()
+        stream = self._streams[stream_id] = _Stream()
+        request_headers = [(':method', 'GET'), (':scheme', self._scheme), (':authority', self._authority),
+                           (':path', target)]
+        request_headers += [(name.lower(), str(value)) for name, value in headers.items()
+                            if name.lower() not in _CONNECTION_HEADERS]
+        complete = False
+        try:
+            self._h2.send_headers(stream_id, request_headers, end_stream=True)
+            self._flush()
+            response_headers = await stream.response
+            status = 0
+            message = HTTPMessage()
+            for name, value in response_headers:
+                if name == ':status':
+                    status = int(value)
+                elif not name.startswith(':'):
+                    message[name] = value
+            limit = read_limit(status, message, body_limit)
+            body = bytearray()
+            transferred = 0
+            truncated = False
+            decoder = BodyDecoder(message.get('Content-Encoding'))
+            while limit != 0:
+                chunk = await stream.data.get()
+                if chunk is None:
+                    complete = True
+                    body += decoder.flush()
+                    truncated = limit is not None and len(body) > limit
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                data, flow_controlled = chunk
+                if not self.closed:
+                    self._h2.acknowledge_received_data(flow_controlled, stream_id)
+                    self._flush()
+                transferred += len(data)
+                body += decoder.decode(data)
+                # A body of exactly limit bytes is read to its end and isn't truncated
+                if limit is not None and len(body) > limit:
+                    truncated = True
+                    break
+            return FetchResponse(url, status, message, bytes(body[:limit]) if limit is not None else bytes(body),
+                                 transferred, truncated)
+        except (h2.exceptions.H2Error, ValueError, zlib.error) as e:
+            raise URLError(e)
+        finally:
+            del self._streams[stream_id]
+            self._slot_freed.set()
+            if not complete and not self.closed:
+                # The rest of the body isn't wanted, or the request was cancelled
+                try:
+                    self._h2.reset_stream(stream_id, h2.errors.ErrorCodes.CANCEL)
+                    self._flush()
+                except h2.exceptions.H2Error:
+                    pass
+
+    async def _read_frames(self):
+        error = URLError('HTTP/2 connection closed')
+        try:
+            while True:
+                data = await self._reader.read(self._read_size)
+                if not data:
+                    break
+                for event in self._h2.receive_data(data):
+                    self._handle(event)
+                self._flush()
+        except (OSError, h2.exceptions.H2Error) as e:
+            error = URLError(e)
+        finally:
+            self.closed = True
+            for stream in self._streams.values():
+                stream.fail(error)
+            self._slot_freed.set()
+            self._writer.close()
+
+    def _handle(self, event):
+        stream = self._streams.get(getattr(event, 'stream_id', None))
+        if isinstance(event, h2.events.ResponseReceived):
+            if stream is not None:
+                stream.response.set_result(event.headers)
+        elif isinstance(event, h2.events.DataReceived):
+            if stream is not None:
+                stream.data.put_nowait((event.data, event.flow_controlled_length))
+            else:
+                # Data of a stream already given up on still counts against the connection window
+                self._h2.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+        elif isinstance(event, h2.events.StreamEnded):
+            if stream is not None:
+                stream.ended = True
+                stream.data.put_nowait(None)
+        elif isinstance(event, h2.events.StreamReset):
+            if stream is not None:
+                stream.fail(URLError('HTTP/2 stream reset, error %s' % event.error_code))
+        elif isinstance(event, h2.events.ConnectionTerminated):
+            # No new streams after a GOAWAY, the ones already sent are answered or fail when the server closes
+            self.closed = True
+            self._slot_freed.set()
+        elif isinstance(event, h2.events.RemoteSettingsChanged):
+            self._slot_freed.set()
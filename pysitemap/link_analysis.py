@@ -0,0 +1,97 @@
+from array import array
+from itertools import chain
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:
+    numpy = None
+    sparse = None
+
+
+DAMPING = 0.85
+# Iterations stop once the ranks, which add up to 1, moved less than this in total
+TOLERANCE = 1e-6
+MAX_ITERATIONS = 100
+MIN_PRIORITY = 0.1
+
+
+def available():
+    return numpy is not None and sparse is not None
+
+
+class LinkAnalysis:
+    # PageRank and in-degree of the pages of a crawl graph, {source id: target ids} as the crawlers build it,
+    # computed over a sparse adjacency matrix. pages are the url ids of the graph's keys, rank and in_degree
+    # numpy arrays in the same order. Links to urls that aren't pages of the graph, and links of a page to
+    # itself, are left out.
+
+    def __init__(self, graph, damping=DAMPING, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+        if not available():
+            raise ImportError('Link analysis needs numpy and scipy')
+        size = len(graph)
+        self.pages = numpy.fromiter(graph.keys(), dtype=numpy.int64, count=size)
+        rows, columns = self._links(graph)
+        self.in_degree = numpy.bincount(columns, minlength=size)
+        self.iterations = 0
+        self.rank = self._page_rank(rows, columns, damping, tolerance, max_iterations)
+
+    def __len__(self):
+        return len(self.pages)
+
+    def _links(self, graph):
+        # (source, target) positions in pages of every link, as two arrays
+        pages = self.pages
+        size = len(pages)
+        if not size:
+            return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+        edges = graph.values()
+        counts = numpy.fromiter(map(len, edges), dtype=numpy.int64, count=size)
+        if isinstance(next(iter(edges)), array):
+            # Compact graphs keep int32 arrays, their bytes are joined without going through Python ints
+            targets = numpy.frombuffer(b''.join(edges), dtype=numpy.int32)
+        else:
+            targets = numpy.fromiter(chain.from_iterable(edges), dtype=numpy.int64, count=int(counts.sum()))
+        # Url ids to positions in pages, -1 for the urls that aren't pages
+        position = numpy.full(int(max(pages.max(), targets.max() if len(targets) else 0)) + 1, -1,
+                              dtype=numpy.int64)
+        position[pages] = numpy.arange(size)
+        rows = numpy.repeat(numpy.arange(size), counts)
+        columns = position[targets]
+        kept = (columns >= 0) & (columns != rows)
+        return rows[kept], columns[kept]
+
+    def _page_rank(self, rows, columns, damping, tolerance, max_iterations):
+        size = len(self.pages)
+        if not size:
+            return numpy.zeros(0)
+        out_degree = numpy.bincount(rows, minlength=size)
+        # Links come grouped by source, so the rows of the matrix are built as they are, without sorting the
+        # links. Entry (source, target) is the share of the rank of source passed to target, the transpose
+        # spreads it.
+        index_type = numpy.int32 if len(columns) < 2 ** 31 else numpy.int64
+        offsets = numpy.zeros(size + 1, dtype=index_type)
+        numpy.cumsum(out_degree, out=offsets[1:])
+        transition = sparse.csr_matrix((1.0 / out_degree[rows], columns.astype(index_type), offsets),
+                                       shape=(size, size)).T
+        dangling = out_degree == 0
+        rank = numpy.full(size, 1.0 / size)
+        for iteration in range(1, max_iterations + 1):
+            self.iterations = iteration
+            # Pages without links spread their rank over every page, like the random jumps do
+            spread = (damping * rank[dangling].sum() + 1 - damping) / size
+            previous, rank = rank, damping * transition.dot(rank) + spread
+            if numpy.abs(rank - previous).sum() < tolerance:
+                break
+        return rank
+
+    def priorities(self, minimum=MIN_PRIORITY):
+        # Ranks mapped to minimum .. 1.0 on a log scale, PageRank follows a power law and on a linear scale all
+        # but a handful of pages would get the minimum. Pages all ranked the same get the default 0.5.
+        if not len(self.rank):
+            return self.rank
+        logs = numpy.log(self.rank)
+        low, high = logs.min(), logs.max()
+        if high - low < 1e-9:
+            return numpy.full(len(logs), 0.5)
+        return minimum + (1 - minimum) * (logs - low) / (high - low)
@@ -0,0 +1,168 @@
+import codecs
+import re
+from functools import lru_cache
+from html import unescape
+from urllib.parse import urljoin
+
+
+DEFAULT_CHARSET = 'utf-8'
+# Media types whose bodies are scanned for links, the body of anything else is left unread
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+# How much of the document is searched for a <meta charset> declaration, as browsers do
+SNIFF_BYTES = 1024
+
+# Only the tags that can carry a link are matched and their href is captured by the same match,
+# everything in between is skipped by the regex engine. The attributes before href are matched whole, with
+# their values, so an href written inside another attribute like title="see href=/x" isn't taken for it.
+# Unquoted values run up to a space or the end of the tag, data=x/href=/y is one attribute.
+_attribute = rb'(?:[\s/]+|(?<=["\']))[^\s/>="\']+(?:\s*=\s*(?:"[^">]*"|\'[^\'>]*\'|[^\s"\'>][^\s>]*(?=[\s>]|$)))?'
+_tag_pattern = re.compile(rb'<(a|area|link|base)((?:' + _attribute + rb')*?[\s/]*)(?<=[\s/"\'])'
+                          rb'href\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+))([^>]*)', re.IGNORECASE)
+_attribute_pattern = re.compile(rb'([^\s/>=]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]*)))?')
+_meta_charset_pattern = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([-\w.:]+)', re.IGNORECASE)
+_header_charset_pattern = re.compile(r'charset\s*=\s*["\']?([-\w.:]+)', re.IGNORECASE)
+
+_boms = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+# Tags can't be matched on the raw bytes of these encodings, so they are transcoded to utf-8 first
+_wide_charsets = ('utf-16', 'utf-16-le', 'utf-16-be', 'utf-32', 'utf-32-le', 'utf-32-be')
+
+
+@lru_cache(maxsize=8192)
+def _decode_href(raw, charset):
+    # The same navigation hrefs show up on every page of a site
+    href = raw.decode(charset, 'replace')
+    if '&' in href:
+        href = unescape(href)
+    return href.strip()
+
+
+def _attribute_value(attributes, name):
+    for match in _attribute_pattern.finditer(attributes):
+        if match.group(1).lower() == name:
+            return match.group(2) or match.group(3) or match.group(4) or b''
+    return None
+
+
+def _known_charset(charset):
+    if not charset:
+        return None
+    if isinstance(charset, bytes):
+        charset = charset.decode('ascii', 'ignore')
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return None
+
+
+def header_charset(content_type):
+    if not content_type:
+        return None
+    match = _header_charset_pattern.search(content_type)
+    return _known_charset(match.group(1)) if match else None
+
+
+def is_html(content_type):
+    # Responses without a Content-Type are treated as html
+    if not content_type:
+        return True
+    return content_type.split(';', 1)[0].strip().lower() in HTML_CONTENT_TYPES
+
+
+def sniff_charset(head):
+    for bom, charset in _boms:
+        if head.startswith(bom):
+            return charset
+    match = _meta_charset_pattern.search(head, 0, SNIFF_BYTES)
+    return _known_charset(match.group(1)) if match else None
+
+
+class LinkExtractor:
+    # Scans raw html bytes for <a>, <area>, <link rel=alternate|canonical> and <base> tags in a single pass.
+    # Chunks can be fed as they are received, only the unfinished tail of the last chunk is kept between calls.
+    # links holds the hrefs as written in the page, they are resolved against base with resolve().
+
+    def __init__(self, base_url=None, content_type=None):
+        self.base = base_url
+        self.links = []
+        self.canonical = None
+        self._base_seen = False
+        self._charset = None
+        self._decoder = None
+        self._buffer = b''
+        self._set_charset(header_charset(content_type))
+
+    @property
+    def charset(self):
+        return self._charset or DEFAULT_CHARSET
+
+    def _set_charset(self, charset):
+        if charset in _wide_charsets:
+            self._decoder = codecs.getincrementaldecoder(charset)('replace')
+            charset = 'utf-8'
+        self._charset = charset
+
+    def feed(self, chunk):
+        if self._decoder:
+            chunk = self._decoder.decode(chunk).encode('utf-8')
+        buffer = self._buffer + chunk if self._buffer else chunk
+        if self._charset is None:
+            if len(buffer) < SNIFF_BYTES:
+                self._buffer = buffer
+                return self
+            self._buffer = b''
+            self._set_charset(sniff_charset(buffer) or DEFAULT_CHARSET)
+            return self.feed(buffer)
+
+        # Tags can't contain '>', so everything up to the last one can be scanned safely
+        end = buffer.rfind(b'>') + 1
+        if end:
+            self._scan(buffer, end)
+        self._buffer = buffer[end:]
+        return self
+
+    def close(self):
+        if self._charset is None:
+            buffer, self._buffer = self._buffer, b''
+            self._set_charset(sniff_charset(buffer) or DEFAULT_CHARSET)
+            self.feed(buffer)
+        if self._decoder:
+            self._buffer += self._decoder.decode(b'', True).encode('utf-8')
+        if self._buffer:
+            self._scan(self._buffer, len(self._buffer))
+            self._buffer = b''
+        return self
+
+    def resolve(self, href):
+        if not self.base or href.startswith(('http://', 'https://')):
+            return href
+        return urljoin(self.base, href)
+
+    def _scan(self, buffer, end):
+        charset = self.charset
+        links = self.links
+        for tag, before, double_quoted, single_quoted, unquoted, after in _tag_pattern.findall(buffer, 0, end):
+            href = _decode_href(double_quoted or single_quoted or unquoted, charset)
+
+            tag = tag.lower()
+            if tag == b'a' or tag == b'area':
+                links.append(href)
+            elif tag == b'link':
+                rel = _attribute_value(before, b'rel') or _attribute_value(after, b'rel')
+                rel = rel.lower().split() if rel else ()
+                if b'canonical' in rel:
+                    if self.canonical is None:
+                        self.canonical = self.resolve(href)
+                    links.append(href)
+                elif b'alternate' in rel:
+                    links.append(href)
+            elif not self._base_seen:
+                self._base_seen = True
+                self.base = self.resolve(href)
+
+
+def extract_links(body, base_url=None, content_type=None):
+    return LinkExtractor(base_url=base_url, content_type=content_type).feed(body).close()
@@ -0,0 +1,238 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+
+# Upper bounds in seconds of the histogram buckets, requests take milliseconds to seconds and parsing a page
+# microseconds to milliseconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TIMING_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+
+class Histogram:
+    # Count of the observed values falling in each bucket, plus their sum and count, as Prometheus keeps them
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Estimated by linear interpolation inside the bucket the quantile falls in, like Prometheus'
+        # histogram_quantile. Values past the last bucket are reported as its upper bound.
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def snapshot(self):
+        # Cumulative counts by upper bound, the last one is +Inf
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+
+class CrawlMetrics:
+    # Counters, gauges and timing histograms of a crawl. The crawler records into it as it goes and the sinks
+    # are sent a snapshot every interval seconds and once more when the crawl ends.
+    DEFAULT_INTERVAL = 10
+
+    def __init__(self, sinks=None, interval=DEFAULT_INTERVAL):
+        self._sinks = list(sinks) if sinks else []
+        self._interval = interval if interval and interval > 0 else self.DEFAULT_INTERVAL
+        # The threads of the synchronous crawler fetch, and count their requests, concurrently
+        self._lock = threading.Lock()
+        self.fetch_seconds = Histogram(LATENCY_BUCKETS)
+        self.parse_seconds = Histogram(TIMING_BUCKETS)
+        self.extract_seconds = Histogram(TIMING_BUCKETS)
+        self.normalize_seconds = Histogram(TIMING_BUCKETS)
+        self.requests = 0
+        self.pages = 0
+        self.bytes = 0
+        self.retries = 0
+        # Bodies left unread because they can't contain links, and bodies cut at max_body_bytes
+        self.skipped_bodies = 0
+        self.truncated_bodies = 0
+        self.errors = {}
+        self.frontier = 0
+        self.found = 0
+        self._started = None
+        self._next_emit = 0
+        self._last_emit = None
+        self._last_pages = 0
+
+    def add_sink(self, sink):
+        self._sinks.append(sink)
+
+    def start(self):
+        now = time.monotonic()
+        if self._started is None:
+            self._started = now
+        self._next_emit = now + self._interval
+
+    def fetched(self, seconds, size):
+        with self._lock:
+            self.requests += 1
+            self.fetch_seconds.observe(seconds)
+            self.bytes += size
+
+    def retried(self):
+        with self._lock:
+            self.retries += 1
+
+    def skipped_body(self):
+        with self._lock:
+            self.skipped_bodies += 1
+
+    def truncated_body(self):
+        with self._lock:
+            self.truncated_bodies += 1
+
+    def error(self, kind):
+        # kind is the name of the exception class or of the failure
+        with self._lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def parsed(self, seconds):
+        self.pages += 1
+        self.parse_seconds.observe(seconds)
+
+    def emit_due(self):
+        return bool(self._sinks) and time.monotonic() >= self._next_emit
+
+    def emit(self):
+        if not self._sinks:
+            return None
+        snapshot = self.snapshot()
+        for sink in self._sinks:
+            sink.write(snapshot)
+        self._next_emit = time.monotonic() + self._interval
+        return snapshot
+
+    def close(self):
+        for sink in self._sinks:
+            sink.close()
+        self._sinks = []
+
+    def snapshot(self):
+        now = time.monotonic()
+        elapsed = now - self._started if self._started is not None else 0.0
+        # Pages per second over the whole crawl and since the previous snapshot
+        since, self._last_emit = self._last_emit, now
+        recent_pages, self._last_pages = self.pages - self._last_pages, self.pages
+        recent = now - since if since is not None else elapsed
+        with self._lock:
+            return {
+                'time': time.time(),
+                'elapsed': elapsed,
+                'requests': self.requests,
+                'pages': self.pages,
+                'bytes': self.bytes,
+                'retries': self.retries,
+                'skipped_bodies': self.skipped_bodies,
+                'truncated_bodies': self.truncated_bodies,
+                'errors': dict(self.errors),
+                'found': self.found,
+                'frontier': self.frontier,
+                'pages_per_second': self.pages / elapsed if elapsed > 0 else 0.0,
+                'recent_pages_per_second': recent_pages / recent if recent > 0 else 0.0,
+                'fetch_seconds': self.fetch_seconds.snapshot(),
+                'parse_seconds': self.parse_seconds.snapshot(),
+                'extract_seconds': self.extract_seconds.snapshot(),
+                'normalize_seconds': self.normalize_seconds.snapshot(),
+            }
+
+
+class JsonLinesSink:
+    # Appends every snapshot to path as one line of JSON
+    def __init__(self, path):
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, snapshot):
+        self._file.write(json.dumps(snapshot, separators=(',', ':')) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class PrometheusTextfileSink:
+    # Rewrites path with the latest snapshot in the Prometheus text format, for the node exporter's textfile
+    # collector. The file is replaced in one go so the collector never reads half of it.
+    PREFIX = 'pysitemap_'
+
+    def __init__(self, path):
+        self._path = path
+
+    def write(self, snapshot):
+        prefix = self.PREFIX
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            # samples are (suffix and labels, value) pairs
+            lines.append('# HELP ' + prefix + name + ' ' + help_text)
+            lines.append('# TYPE ' + prefix + name + ' ' + kind)
+            for suffix, value in samples:
+                lines.append(prefix + name + suffix + ' ' + repr(float(value)))
+
+        metric('requests_total', 'counter', 'Responses received.', [('', snapshot['requests'])])
+        metric('pages_total', 'counter', 'Pages parsed.', [('', snapshot['pages'])])
+        metric('bytes_total', 'counter', 'Bytes of response bodies downloaded.', [('', snapshot['bytes'])])
+        metric('retries_total', 'counter', 'Requests sent again after a failure.', [('', snapshot['retries'])])
+        metric('skipped_bodies_total', 'counter', 'Response bodies left unread, not html.',
+               [('', snapshot['skipped_bodies'])])
+        metric('truncated_bodies_total', 'counter', 'Response bodies cut at the size limit.',
+               [('', snapshot['truncated_bodies'])])
+        metric('errors_total', 'counter', 'Failed requests by error class.',
+               [('{class="' + kind.replace('\\', '\\\\').replace('"', '\\"') + '"}', count)
+                for kind, count in sorted(snapshot['errors'].items())])
+        metric('found_pages', 'gauge', 'Pages found so far.', [('', snapshot['found'])])
+        metric('frontier_size', 'gauge', 'Urls waiting to be crawled.', [('', snapshot['frontier'])])
+        metric('pages_per_second', 'gauge', 'Pages parsed per second since the previous snapshot.',
+               [('', snapshot['recent_pages_per_second'])])
+        for name, help_text in (('fetch_seconds', 'Time to fetch a page.'),
+                                ('parse_seconds', 'Time to read a page, extraction and normalization included.'),
+                                ('extract_seconds', 'Time to extract the links of a page.'),
+                                ('normalize_seconds', 'Time to normalize and filter the links of a page.')):
+            histogram = snapshot[name]
+            samples = [('_bucket{le="' + str(bound) + '"}', count) for bound, count in histogram['buckets']]
+            samples += [('_sum', histogram['sum']), ('_count', histogram['count'])]
+            metric(name, 'histogram', help_text, samples)
+
+        temporary = self._path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(temporary, self._path)
+
+    def close(self):
+        pass
+
+
+class CallbackSink:
+    # Hands every snapshot to callback
+    def __init__(self, callback):
+        self._callback = callback
+
+    def write(self, snapshot):
+        self._callback(snapshot)
+
+    def close(self):
+        pass
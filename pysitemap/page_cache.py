@@ -0,0 +1,99 @@
+from collections import namedtuple
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+# What is remembered about a page between crawls. links are the urls of its internal links, reused when the
+# server answers 304 Not Modified, lastmod is the W3C datetime written to the sitemap and canonical the url
+# of its <link rel=canonical>.
+CachedPage = namedtuple('CachedPage', ['etag', 'last_modified', 'content_hash', 'lastmod', 'links', 'canonical'],
+                        defaults=(None,))
+
+
+def _w3c_datetime(value):
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+
+def lastmod_from_header(last_modified):
+    # Last-Modified: Fri, 19 Oct 2018 18:49:51 GMT -> 2018-10-19T18:49:51+00:00
+    if not last_modified:
+        return None
+    try:
+        value = parsedate_to_datetime(last_modified)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return _w3c_datetime(value)
+
+
+def lastmod_now():
+    return _w3c_datetime(datetime.now(timezone.utc))
+
+
+# <changefreq> of a page from how long ago it last changed, pages unchanged for longer are expected to change less
+# often
+CHANGEFREQ_AGES = ((24 * 3600, 'daily'), (7 * 24 * 3600, 'weekly'), (31 * 24 * 3600, 'monthly'))
+
+
+def changefreq_from_lastmod(lastmod, now=None):
+    if not lastmod:
+        return None
+    try:
+        value = datetime.fromisoformat(lastmod)
+    except ValueError:
+        return None
+    age = ((now or datetime.now(timezone.utc)) - value).total_seconds()
+    for limit, changefreq in CHANGEFREQ_AGES:
+        if age < limit:
+            return changefreq
+    return 'yearly'
+
+
+class PageCache:
+    # SQLite store of the pages of previous crawls, keyed by the requested url. Lookups hit the database,
+    # updates are kept in memory and written in batches of batch_size.
+    DEFAULT_BATCH_SIZE = 1000
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE):
+        # Imported here, the lastmod helpers of this module are used by every crawl
+        import sqlite3
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript('''
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT,
+                                              content_hash TEXT, lastmod TEXT, links TEXT, canonical TEXT);
+        ''')
+        self._batch_size = batch_size if batch_size and batch_size > 0 else self.DEFAULT_BATCH_SIZE
+        self._pending = {}
+
+    def get(self, url):
+        page = self._pending.get(url)
+        if page is not None:
+            return page
+        row = self._connection.execute('SELECT etag, last_modified, content_hash, lastmod, links, canonical '
+                                       'FROM pages WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, content_hash, lastmod, links, canonical = row
+        return CachedPage(etag, last_modified, content_hash, lastmod, links.split('\n') if links else [], canonical)
+
+    def put(self, url, page):
+        self._pending[url] = page
+        if len(self._pending) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        with self._connection as connection:
+            connection.executemany('INSERT OR REPLACE INTO pages (url, etag, last_modified, content_hash, lastmod, '
+                                   'links, canonical) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                   ((url, page.etag, page.last_modified, page.content_hash, page.lastmod,
+                                     '\n'.join(page.links), page.canonical) for url, page in pending.items()))
+
+    def close(self):
+        self.flush()
+        self._connection.close()
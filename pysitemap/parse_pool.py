@@ -0,0 +1,58 @@
+from collections import namedtuple
+from pysitemap.link_extractor import extract_links
+from pysitemap.public_suffix import default_suffix_list
+from pysitemap.url_filter import UrlFilter
+from pysitemap.url_normalizer import UrlNormalizer, is_internal
+
+
+# Everything a parse process needs to know about the crawl to tell which links to keep, all picklable
+ParseConfig = namedtuple('ParseConfig', ['host', 'domain', 'exclude', 'max_path_depth', 'strip_params',
+                                         'sort_params'])
+
+_parser = None
+
+
+class _PageParser:
+    # Link extraction, normalization and filtering, as _Crawler._extract_links does them, with a normalizer
+    # and filter of its own in every process
+    def __init__(self, config):
+        self._host = config.host
+        self._domain = config.domain
+        self._normalizer = UrlNormalizer(get_domain=default_suffix_list().registered_domain,
+                                         strip_params=config.strip_params, sort_params=config.sort_params)
+        self._filter = UrlFilter(config.exclude, config.max_path_depth)
+
+    def parse(self, url, body, content_type):
+        extractor = extract_links(body, base_url=url, content_type=content_type)
+        normalize = self._normalizer.normalize
+        excluded = self._filter.excluded
+        urls = []
+        seen = set()
+        for href in extractor.links:
+            link = normalize(href, extractor.base)
+            if link is None or link.url in seen or not is_internal(link, self._host, self._domain) or \
+                    excluded(link.url):
+                continue
+            seen.add(link.url)
+            urls.append(link.url)
+        return urls, extractor.canonical
+
+
+def _initialize(config):
+    global _parser
+    _parser = _PageParser(config)
+
+
+def parse_page(url, body, content_type):
+    # Runs in a pool process, raw bytes in and the normalized urls of the internal links and the canonical
+    # url out
+    return _parser.parse(url, body, content_type)
+
+
+def create_parse_pool(processes, config):
+    # Spawned rather than forked, the processes only import the parsing modules and never inherit
+    # the crawler's event loop, sockets or threads. Imported here, crawls without a pool don't need them
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_initialize, initargs=(config,))
@@ -0,0 +1,110 @@
+import os
+import threading
+
+
+# A snapshot of the ICANN section of https://publicsuffix.org/list/public_suffix_list.dat ships with the package,
+# so resolving registered domains never touches the network. Replace the file to update it.
+SUFFIX_LIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'public_suffix_list.dat')
+
+_RULE = '$'
+_EXCEPTION = '!'
+_WILDCARD = '*'
+
+
+def _idna(label):
+    try:
+        return label.encode('idna').decode('ascii')
+    except UnicodeError:
+        return None
+
+
+class PublicSuffixList:
+    def __init__(self, path=SUFFIX_LIST_PATH):
+        self._path = path
+        self._trie = None
+        self._domains = {}
+        self._lock = threading.Lock()
+
+    def registered_domain(self, host):
+        # Memoized per host, the trie is only walked the first time a host is seen
+        try:
+            return self._domains[host]
+        except KeyError:
+            pass
+        domain = self._domains[host] = self._registered_domain(host)
+        return domain
+
+    def _registered_domain(self, host):
+        if '/' in host:
+            host = host.split('://', 1)[-1].split('/', 1)[0]
+        host = host.rsplit('@', 1)[-1]
+        if host.startswith('['):
+            return None
+        host = host.rsplit(':', 1)[0].rstrip('.').lower()
+        if not host or host.replace('.', '').isdigit():
+            return None
+
+        labels = host.split('.')
+        length = self._suffix_length(labels[::-1])
+        if not length or length >= len(labels):
+            return None
+        return '.'.join(labels[-length - 1:])
+
+    def _suffix_length(self, labels):
+        node = self._get_trie()
+        length = 0
+        for i, label in enumerate(labels):
+            child = node.get(label)
+            wildcard = node.get(_WILDCARD)
+            if child is not None and child.get(_EXCEPTION):
+                # Exception rules make their parent the public suffix
+                return i
+            if (child is not None and child.get(_RULE)) or (wildcard is not None and wildcard.get(_RULE)):
+                length = i + 1
+            node = child if child is not None else wildcard
+            if node is None:
+                break
+        return length
+
+    def _get_trie(self):
+        if self._trie is None:
+            with self._lock:
+                if self._trie is None:
+                    self._trie = self._compile()
+        return self._trie
+
+    def _compile(self):
+        trie = {}
+        with open(self._path, encoding='utf-8') as file:
+            for line in file:
+                rule = line.strip()
+                if not rule or rule.startswith('//'):
+                    continue
+                exception = rule.startswith('!')
+                if exception:
+                    rule = rule[1:]
+                labels = rule.split('.')[::-1]
+                self._insert(trie, labels, exception)
+                # Hosts arrive punycoded, so internationalized rules are stored in both forms
+                if not rule.isascii():
+                    encoded = [label if label == _WILDCARD else _idna(label) for label in labels]
+                    if None not in encoded:
+                        self._insert(trie, encoded, exception)
+        return trie
+
+    def _insert(self, trie, labels, exception):
+        node = trie
+        for label in labels:
+            node = node.setdefault(label, {})
+        node[_EXCEPTION if exception else _RULE] = True
+
+
+_default = None
+
+
+def default_suffix_list():
+    # Shared by every crawler of the process, so the bundled list is only compiled once
+    global _default
+    if _default is None:
+        _default = PublicSuffixList()
+    return _default
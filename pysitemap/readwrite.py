@@ -1,10 +1,9 @@
-import networkx
 # import matplotlib.pyplot as plot
-from networkx.readwrite import json_graph
-from networkx.readwrite import gexf
-import ujson
+# networkx and ujson are imported by the functions using them, they are slow to import and not needed for crawling
+import logging
 import os
 import sys
+from pysitemap.graph_store import DictGraph, GraphFile, write_graph, write_gexf
 
 
 # def visualize(dict_graph, save_path=None):
@@ -44,6 +43,8 @@ import sys
 #     # del fig
 
 
+_logger = logging.getLogger('pysitemap')
+
 _module_root_dir = None
 
 
@@ -58,6 +59,7 @@ def _get_module_root_dir():
 
 
 def convert_graph(dict_graph):
+    import networkx
     # Build networkx Directional Graph
     graph = networkx.DiGraph()
     for source, nodes in dict_graph.items():
@@ -67,68 +69,189 @@ def convert_graph(dict_graph):
 
 
 def _ensure_right_type(graph):
-    if type(graph) == networkx.classes.digraph.DiGraph:
-        return graph
     if type(graph) == dict:
         return convert_graph(graph)
+    if _is_digraph(graph):
+        return graph
+    return None
+
+
+def _is_digraph(graph):
+    # Only a graph built by networkx can be a DiGraph, and then networkx is already imported
+    networkx = sys.modules.get('networkx')
+    return networkx is not None and type(graph) == networkx.classes.digraph.DiGraph
+
+
+def _streamable(graph):
+    # dicts and graph files are written straight from their urls and ids, without going through networkx
+    if isinstance(graph, GraphFile):
+        return graph
+    if type(graph) == dict:
+        return DictGraph(graph)
     return None
 
 
+_edges_key = None
+
+
+def _node_link_edges_key():
+    # node_link_data names the list of edges 'links' or 'edges' depending on the networkx version, files
+    # written here use the name load_graph expects
+    global _edges_key
+    if _edges_key is None:
+        import networkx
+        from networkx.readwrite import json_graph
+        _edges_key = 'edges' if 'edges' in json_graph.node_link_data(networkx.DiGraph()) else 'links'
+    return _edges_key
+
+
+def _write_json_items(file, items, chunk_size=4096):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            file.write(','.join(chunk))
+            file.write(',')
+            chunk = []
+    file.write(','.join(chunk))
+
+
+def _write_node_link(file, graph):
+    # The node_link_data json of graph, written a few thousand nodes or edges at a time
+    import ujson
+    dumps = ujson.dumps
+    file.write('{"directed":true,"multigraph":false,"graph":{},"nodes":[')
+    _write_json_items(file, ('{"id":' + dumps(url) + '}' for url in graph.urls()))
+    # Urls of the nodes are kept as json strings, every edge refers to two of them
+    file.write('],"' + _node_link_edges_key() + '":[')
+    url = graph.url
+    _write_json_items(file, ('{"source":' + dumps(url(source)) + ',"target":' + dumps(url(target)) + '}'
+                             for source, target in graph.edges()))
+    file.write(']}')
+
+
 # Save graph
-# Convert the graph to json ready format using networkx.readwrite.json_graph
-# Serialize the result using ujson
-def save_graph(graph, save_path=_get_module_root_dir(), no_verbose=False):
+# dicts and graph files are streamed in the json format of networkx.readwrite.json_graph.node_link_data,
+# networkx graphs are converted with it and serialized using ujson
+def save_graph(graph, save_path=None, no_verbose=False):
+    if save_path is None:
+        save_path = _get_module_root_dir()
     if not save_path or not graph:
         if not no_verbose:
-            print('Failed to save graph:\nsave_path =', save_path, '\ngraph =', graph)
+            _logger.error('Failed to save graph:\nsave_path = %s\ngraph = %s', save_path, graph)
         return
     if not save_path.endswith('/'):
         save_path += '/'
-    graph = _ensure_right_type(graph)
+    streamable = _streamable(graph)
+    graph = _ensure_right_type(graph) if streamable is None else streamable
     if graph is None:
         if not no_verbose:
-            print('Failed to save graph. graph should be a dict or networkx.classes.digraph.DiGraph', graph)
+            _logger.error('Failed to save graph. graph should be a dict, a GraphFile or '
+                          'networkx.classes.digraph.DiGraph %s', graph)
         return
-    with open(save_path + 'graph.json', 'w') as file:
-        try:
-            file.write(ujson.dumps(json_graph.node_link_data(graph)))
-        except IOError as e:
-            if not no_verbose:
-                print('Failed to save graph: ', e.reason)
+    try:
+        with open(save_path + 'graph.json', 'w') as file:
+            if streamable is not None:
+                _write_node_link(file, streamable)
+            else:
+                import ujson
+                from networkx.readwrite import json_graph
+                ujson.dump(json_graph.node_link_data(graph), file)
+    except IOError as e:
+        if not no_verbose:
+            _logger.error('Failed to save graph: %s', e)
+
+
+# Save the graph in the compact binary format of pysitemap.graph_store, graph.bin is read back by
+# load_compact_graph without loading it in memory. Crawler.save_graph writes the same format directly from
+# the crawl.
+def save_compact_graph(graph, save_path=None, no_verbose=False):
+    if save_path is None:
+        save_path = _get_module_root_dir()
+    if not save_path or not graph:
+        if not no_verbose:
+            _logger.error('Failed to save graph:\nsave_path = %s\ngraph = %s', save_path, graph)
+        return
+    if not save_path.endswith('/'):
+        save_path += '/'
+    if _is_digraph(graph):
+        graph = DictGraph({node: graph.successors(node) for node in graph.nodes})
+    else:
+        graph = _streamable(graph)
+    if graph is None:
+        if not no_verbose:
+            _logger.error('Failed to save graph. graph should be a dict, a GraphFile or '
+                          'networkx.classes.digraph.DiGraph %s', graph)
+        return
+    try:
+        write_graph(save_path + 'graph.bin', graph.urls(), graph.adjacency())
+    except IOError as e:
+        if not no_verbose:
+            _logger.error('Failed to save graph: %s', e)
+
+
+def load_compact_graph(load_path=None, no_verbose=False):
+    if load_path is None:
+        load_path = _get_module_root_dir()
+    # A memory mapped GraphFile, close it when done
+    if not load_path:
+        if not no_verbose:
+            _logger.error('Failed to load graph:\nload_path = %s', load_path)
+        return None
+    if not load_path.endswith('/'):
+        load_path += '/'
+    try:
+        return GraphFile(load_path + 'graph.bin')
+    except (IOError, ValueError) as e:
+        if not no_verbose:
+            _logger.error('Failed to load graph: %s', e)
+    return None
 
 
-def load_graph(load_path=_get_module_root_dir(), no_verbose=False):
+def load_graph(load_path=None, no_verbose=False):
+    if load_path is None:
+        load_path = _get_module_root_dir()
     if not load_path:
         if not no_verbose:
-            print('Failed to save graph:\nsave_path =', load_path)
+            _logger.error('Failed to load graph:\nload_path = %s', load_path)
         return None
     if not load_path.endswith('/'):
         load_path += '/'
     with open(load_path + 'graph.json') as file:
         try:
+            import ujson
+            from networkx.readwrite import json_graph
             json = ujson.load(file)
             return json_graph.node_link_graph(json)
         except IOError as e:
             if not no_verbose:
-                print('Failed to save graph: ', e.reason)
+                _logger.error('Failed to load graph: %s', e)
     return None
 
 
 # Save a gexf file for opening it in Gephi or similar tools
-def export_graph(graph, save_path=_get_module_root_dir(), no_verbose=False):
+def export_graph(graph, save_path=None, no_verbose=False):
+    if save_path is None:
+        save_path = _get_module_root_dir()
     if not save_path or not graph:
         if not no_verbose:
-            print('Failed to save graph:\nsave_path =', save_path, '\ngraph =', graph)
+            _logger.error('Failed to save graph:\nsave_path = %s\ngraph = %s', save_path, graph)
         return
     if not save_path.endswith('/'):
         save_path += '/'
-    graph = _ensure_right_type(graph)
+    streamable = _streamable(graph)
+    graph = _ensure_right_type(graph) if streamable is None else streamable
     if graph is None:
         if not no_verbose:
-            print('Failed to export graph. graph should be a dict or networkx.classes.digraph.DiGraph', graph)
+            _logger.error('Failed to export graph. graph should be a dict, a GraphFile or '
+                          'networkx.classes.digraph.DiGraph %s', graph)
         return
     try:
-        gexf.write_gexf(graph, save_path + 'graph.gexf')
+        if streamable is not None:
+            write_gexf(streamable, save_path + 'graph.gexf')
+        else:
+            from networkx.readwrite import gexf
+            gexf.write_gexf(graph, save_path + 'graph.gexf')
     except IOError as e:
         if not no_verbose:
-            print('Failed to export graph: ', e.reason)
+            _logger.error('Failed to export graph: %s', e)
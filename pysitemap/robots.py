@@ -0,0 +1,90 @@
+import re
+from urllib.parse import unquote
+
+
+_line_pattern = re.compile(r'^\s*([A-Za-z-]+)\s*:\s*(.*?)\s*$')
+
+
+def _rule_pattern(path):
+    # * matches any sequence of characters and a trailing $ anchors the rule at the end of the url
+    anchored = path.endswith('$')
+    if anchored:
+        path = path[:-1]
+    return '.*'.join(re.escape(part) for part in path.split('*')) + ('$' if anchored else '')
+
+
+def _normalize_path(path):
+    # Rules and urls are compared with percent-encoded characters decoded, except for the ones with a meaning
+    if '%' not in path:
+        return path
+    return unquote(path.replace('%2F', '%252F').replace('%2f', '%252F'))
+
+
+class RobotsRules:
+    # The Allow and Disallow rules of the robots.txt group that applies to user_agent, compiled into one regex.
+    # Rules are tried longest first, Allow before Disallow on equal length, so the first alternative
+    # that matches is the one that decides (RFC 9309).
+
+    def __init__(self, text='', user_agent='*'):
+        self.crawl_delay = None
+        self.sitemaps = []
+        self._pattern = None
+        self._allows = []
+        self._parse(text, user_agent.lower())
+
+    def allowed(self, path):
+        if self._pattern is None:
+            return True
+        match = self._pattern.match(_normalize_path(path) or '/')
+        return match is None or self._allows[match.lastindex - 1]
+
+    def _parse(self, text, user_agent):
+        groups = {}
+        agents = []
+        in_rules = False
+        for line in text.splitlines():
+            match = _line_pattern.match(line.split('#', 1)[0])
+            if not match:
+                continue
+            field, value = match.group(1).lower(), match.group(2)
+            if field == 'sitemap':
+                if value:
+                    self.sitemaps.append(value)
+                continue
+            if field == 'user-agent':
+                # Consecutive user-agent lines share the rules that follow them
+                if in_rules:
+                    agents = []
+                    in_rules = False
+                agents.append(value.lower())
+                continue
+            if not agents:
+                continue
+            in_rules = True
+            for agent in agents:
+                groups.setdefault(agent, []).append((field, value))
+
+        # The most specific group naming this crawler, else the * group
+        rules = None
+        for agent in sorted(groups, key=len, reverse=True):
+            if agent != '*' and agent in user_agent:
+                rules = groups[agent]
+                break
+        if rules is None:
+            rules = groups.get('*', [])
+
+        compiled = []
+        for field, value in rules:
+            if field == 'crawl-delay':
+                try:
+                    self.crawl_delay = float(value)
+                except ValueError:
+                    pass
+            elif field in ('allow', 'disallow') and value:
+                compiled.append((len(value), field == 'allow', _rule_pattern(_normalize_path(value))))
+        if not compiled:
+            return
+        compiled.sort(key=lambda rule: (rule[0], rule[1]), reverse=True)
+        self._allows = [allow for length, allow, pattern in compiled]
+        self._pattern = re.compile('|'.join('(' + pattern + ')' for length, allow, pattern in compiled),
+                                   re.DOTALL)
@@ -0,0 +1,94 @@
+import zlib
+from xml.etree.ElementTree import XMLPullParser, ParseError
+
+
+_GZIP_MAGIC = b'\x1f\x8b'
+# The protocol limits sitemaps to 50MB uncompressed, anything past a little more than that is ignored
+MAX_SITEMAP_BYTES = 64 * 1024 * 1024
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+class SitemapParser:
+    # Streaming parser for sitemaps and sitemap indexes, plain or gzip compressed. Chunks are parsed as they
+    # are fed, like iterparse does for files, and every <url> or <sitemap> element is dropped once its <loc>
+    # was read, so memory use doesn't grow with the size of the sitemap.
+    # feed() and close() return the locs found since the previous call, index tells whether they are pages
+    # or more sitemaps.
+
+    def __init__(self, max_bytes=MAX_SITEMAP_BYTES):
+        self.index = False
+        self._parser = XMLPullParser(events=('start', 'end'))
+        self._root = None
+        self._head = b''
+        self._decompressor = None
+        self._started = False
+        self._remaining = max_bytes
+
+    def feed(self, chunk):
+        if not self._started:
+            # Compressed or not is only known once the first two bytes are in
+            chunk = self._head + chunk
+            if len(chunk) < 2:
+                self._head = chunk
+                return []
+            self._started = True
+            self._head = b''
+            if chunk.startswith(_GZIP_MAGIC):
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._remaining <= 0:
+            return []
+        if self._decompressor is not None:
+            chunk = self._decompressor.decompress(chunk, self._remaining)
+        return self._parse(chunk)
+
+    def close(self):
+        locs = []
+        if not self._started and self._head:
+            self._started = True
+            locs = self._parse(self._head)
+        if self._decompressor is not None:
+            locs += self._parse(self._decompressor.flush())
+        self._parser.close()
+        return locs + self._read_events()
+
+    def _parse(self, data):
+        if self._remaining <= 0 or not data:
+            return []
+        data = data[:self._remaining]
+        self._remaining -= len(data)
+        self._parser.feed(data)
+        return self._read_events()
+
+    def _read_events(self):
+        locs = []
+        for event, element in self._parser.read_events():
+            if event == 'start':
+                if self._root is None:
+                    self._root = element
+                    self.index = _local_name(element.tag) == 'sitemapindex'
+                continue
+            name = _local_name(element.tag)
+            if name == 'loc':
+                if element.text and element.text.strip():
+                    locs.append(element.text.strip())
+            elif name in ('url', 'sitemap') and self._root is not None:
+                element.clear()
+                if len(self._root) and self._root[0] is element:
+                    del self._root[0]
+        return locs
+
+
+def read_sitemap(body):
+    # Returns the <loc> urls of a whole sitemap and whether it is a sitemap index. A malformed sitemap
+    # returns the locs read before the error.
+    parser = SitemapParser()
+    locs = []
+    try:
+        locs += parser.feed(body)
+        locs += parser.close()
+    except (ParseError, zlib.error):
+        pass
+    return locs, parser.index
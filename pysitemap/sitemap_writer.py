@@ -0,0 +1,137 @@
+import gzip
+import os
+from urllib.parse import urljoin
+
+
+URLSET_HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+    xsi:schemaLocation="http://www.sitemaps.org/schemas/sitemap/0.9
+    http://www.sitemaps.org/schemas/sitemap/0.9/sitemap.xsd"
+    xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'''
+URLSET_FOOTER = '\n</urlset>\n'
+
+INDEX_HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'''
+INDEX_FOOTER = '\n</sitemapindex>\n'
+
+
+def xml_escape(text):
+    # Like xml.sax.saxutils.escape with quotes, which would import urllib.request at startup
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;') \
+        .replace("'", '&apos;')
+
+
+def url_entry(url, lastmod=None, changefreq=None, priority=None):
+    entry = '\n\t<url>\n\t\t<loc>' + xml_escape(url) + '</loc>'
+    if lastmod:
+        entry += '\n\t\t<lastmod>' + lastmod + '</lastmod>'
+    if changefreq:
+        entry += '\n\t\t<changefreq>' + changefreq + '</changefreq>'
+    if priority is not None:
+        entry += '\n\t\t<priority>%.1f</priority>' % priority
+    return entry + '\n\t</url>'
+
+
+class SitemapWriter:
+    # Streams <url> entries to disk as they are added, so memory use doesn't grow with the size of the site.
+    # Output rolls over to a new file at the sitemap protocol limits. If more than one file was needed they are
+    # named <name>-1.xml, <name>-2.xml, ... and listed in <name>_index.xml, otherwise the single file is written
+    # to path. base_url is where the files will be published, it is used for the <loc> entries of the index.
+    MAX_URLS = 50000
+    MAX_BYTES = 50 * 1024 * 1024
+
+    def __init__(self, path, base_url=None, compress=False, max_urls=MAX_URLS, max_bytes=MAX_BYTES):
+        self._directory, name = os.path.split(path)
+        self._name = name[:-3] if name.endswith('.gz') else name
+        self._stem, self._extension = os.path.splitext(self._name)
+        self._extension = self._extension or '.xml'
+        self._base_url = base_url
+        self._compress = compress or path.endswith('.gz')
+        self._max_urls = max_urls if max_urls and 0 < max_urls <= self.MAX_URLS else self.MAX_URLS
+        self._max_bytes = max_bytes if max_bytes and 0 < max_bytes <= self.MAX_BYTES else self.MAX_BYTES
+        self._files = []
+        self._file = None
+        self._written = None
+        self._urls = 0
+        self._bytes = 0
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, url, lastmod=None, changefreq=None, priority=None):
+        entry = url_entry(url, lastmod, changefreq, priority).encode('utf-8')
+        if self._file is None or self._urls >= self._max_urls \
+                or self._bytes + len(entry) + len(URLSET_FOOTER) > self._max_bytes:
+            self._next_file()
+        self._file.write(entry)
+        self._urls += 1
+        self._bytes += len(entry)
+        self.count += 1
+
+    def close(self):
+        # Returns the paths written, the index comes first when there is one
+        if self._written is not None:
+            return self._written
+        if self._file is None and not self._files:
+            self._next_file()
+        self._close_file()
+        if len(self._files) == 1:
+            path = self._output_path(self._name)
+            os.replace(self._files[0], path)
+            self._remove_stale(self._output_path(self._stem + '_index' + self._extension))
+            self._written = [path]
+            return self._written
+        index = self._output_path(self._stem + '_index' + self._extension)
+        with self._open(index) as file:
+            file.write(INDEX_HEADER.encode('utf-8'))
+            for path in self._files:
+                loc = os.path.basename(path)
+                if self._base_url:
+                    loc = urljoin(self._base_url, loc)
+                file.write(('\n\t<sitemap>\n\t\t<loc>' + xml_escape(loc) + '</loc>\n\t</sitemap>').encode('utf-8'))
+            file.write(INDEX_FOOTER.encode('utf-8'))
+        self._remove_stale()
+        self._written = [index] + self._files
+        return self._written
+
+    def _remove_stale(self, *paths):
+        # A previous run over a bigger site left more shards, they would still be served without being indexed
+        number = len(self._files) + 1
+        while True:
+            path = self._shard_path(number)
+            if not os.path.exists(path):
+                break
+            os.remove(path)
+            number += 1
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _shard_path(self, number):
+        return self._output_path('%s-%d%s' % (self._stem, number, self._extension))
+
+    def _output_path(self, name):
+        return os.path.join(self._directory, name + ('.gz' if self._compress else ''))
+
+    def _open(self, path):
+        return gzip.open(path, 'wb') if self._compress else open(path, 'wb')
+
+    def _next_file(self):
+        self._close_file()
+        path = self._shard_path(len(self._files) + 1)
+        self._files.append(path)
+        self._file = self._open(path)
+        header = URLSET_HEADER.encode('utf-8')
+        self._file.write(header)
+        self._urls = 0
+        self._bytes = len(header)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.write(URLSET_FOOTER.encode('utf-8'))
+            self._file.close()
+            self._file = None
@@ -0,0 +1,54 @@
+import logging
+import threading
+import time
+
+
+class ThrottledLogger:
+    # Wraps a logging.Logger so that each message format is logged at most rate times per second, with bursts
+    # of up to burst messages. Messages dropped in between are counted and reported with the next one let
+    # through, so a crawl of thousands of pages per second doesn't spend its time writing to the terminal.
+    DEFAULT_RATE = 10
+    DEFAULT_BURST = 20
+
+    def __init__(self, logger, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.logger = logger
+        self._rate = rate
+        self._burst = burst
+        # Token bucket and dropped message count of every message format
+        self._buckets = {}
+        # Worker threads log concurrently, a bucket is read and updated under the lock
+        self._lock = threading.Lock()
+
+    def debug(self, message, *args):
+        self.log(logging.DEBUG, message, *args)
+
+    def info(self, message, *args):
+        self.log(logging.INFO, message, *args)
+
+    def warning(self, message, *args):
+        self.log(logging.WARNING, message, *args)
+
+    def error(self, message, *args):
+        self.log(logging.ERROR, message, *args)
+
+    def log(self, level, message, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        if self._rate:
+            with self._lock:
+                now = time.monotonic()
+                bucket = self._buckets.get(message)
+                if bucket is None:
+                    bucket = self._buckets[message] = [self._burst, now, 0]
+                tokens = min(self._burst, bucket[0] + (now - bucket[1]) * self._rate)
+                bucket[1] = now
+                if tokens < 1:
+                    bucket[0] = tokens
+                    bucket[2] += 1
+                    return
+                bucket[0] = tokens - 1
+                suppressed, bucket[2] = bucket[2], 0
+            if suppressed:
+                message += ' (%d similar messages suppressed)'
+                args += (suppressed,)
+        self.logger.log(level, message, *args)
@@ -0,0 +1,130 @@
+import re
+from functools import lru_cache
+
+
+_backreference_pattern = re.compile(r'\\[1-9]|\(\?P=')
+_metacharacters = frozenset('.^$*+?{}[]\\|()')
+_quantifiers = frozenset('*+?{')
+# A class like [?&] of up to this many plain characters is spelled out, one literal start per character
+_MAX_CLASS_CHARACTERS = 4
+_MAX_LITERAL_STARTS = 16
+
+
+class _PatternList:
+    def __init__(self, patterns):
+        self._patterns = patterns
+
+    def search(self, string):
+        for pattern in self._patterns:
+            match = pattern.search(string)
+            if match:
+                return match
+        return None
+
+
+def _alternatives(pattern):
+    # pattern split at every | outside of a group or class, a url matches it if it matches any of them
+    alternatives = []
+    depth = 0
+    start = position = 0
+    while position < len(pattern):
+        character = pattern[position]
+        if character == '\\':
+            position += 1
+        elif character == '[':
+            # A ] right after the opening [ or [^ is part of the class
+            position = pattern.find(']', position + (3 if pattern.startswith('[^', position) else 2))
+            if position < 0:
+                return [pattern]
+        elif character == '(':
+            depth += 1
+        elif character == ')':
+            depth -= 1
+        elif character == '|' and not depth:
+            alternatives.append(pattern[start:position])
+            start = position + 1
+        position += 1
+    return alternatives + [pattern[start:]]
+
+
+def _literal_starts(pattern):
+    # The literal texts, as lists of escaped characters, one of which every match of pattern starts with,
+    # and the regex of the rest of it. pattern has no | outside of groups.
+    starts = [['^']] if pattern.startswith('^') else [[]]
+    position = len(starts[0])
+    while position < len(pattern):
+        character = pattern[position]
+        if character == '\\':
+            escaped = pattern[position + 1:position + 2]
+            if not escaped or escaped.isalnum():
+                break
+            characters, end = escaped, position + 2
+        elif character == '[':
+            end = pattern.find(']', position + 1)
+            characters = set(pattern[position + 1:end])
+            if end < 0 or not characters or len(characters) > _MAX_CLASS_CHARACTERS or \
+                    characters & set('\\^-['):
+                break
+            end += 1
+        elif character in _metacharacters:
+            break
+        else:
+            characters, end = character, position + 1
+        # A quantified character may repeat or be left out
+        if pattern[end:end + 1] in _quantifiers or len(starts) * len(characters) > _MAX_LITERAL_STARTS:
+            break
+        starts = [start + [re.escape(character)] for start in starts for character in sorted(characters)]
+        position = end
+    return starts, pattern[position:]
+
+
+def _trie_source(node):
+    # The regex of a trie of literal starts, the patterns sharing a start are only tried past it. The
+    # patterns ending at a node are kept under None, an empty one matches there whatever follows.
+    rests = node.get(None, ())
+    if '' in rests:
+        return ''
+    alternatives = [token + _trie_source(node[token]) for token in sorted(key for key in node if key is not None)]
+    alternatives += ['(?:' + rest + ')' for rest in rests]
+    return alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+
+
+def compile_patterns(patterns):
+    compiled = [re.compile(pattern) for pattern in patterns]
+    # All patterns are searched at once as a single regex. Their literal starts are merged in a trie, so at
+    # any position of the url only the patterns starting with the text found there are tried, however many
+    # there are. A pattern like \.jpg|\.png goes in as two, the ones with no literal start are plain
+    # alternatives. Group references would point to the wrong group once combined and inline flags are only
+    # allowed at the start, those are searched one by one.
+    if not any(_backreference_pattern.search(pattern) for pattern in patterns):
+        trie = {}
+        for pattern in (alternative for pattern in patterns for alternative in _alternatives(pattern)):
+            starts, rest = _literal_starts(pattern)
+            for start in starts:
+                node = trie
+                for token in start:
+                    node = node.setdefault(token, {})
+                node.setdefault(None, []).append(rest)
+        try:
+            return re.compile(_trie_source(trie))
+        except re.error:
+            pass
+    return _PatternList(compiled)
+
+
+class UrlFilter:
+    # The --exclude patterns and the path depth limit. The same links show up on many pages, so the decision
+    # is remembered per url. patterns and max_path_depth are kept as given, so the filter can be rebuilt
+    # in another process.
+    DEFAULT_CACHE_SIZE = 100000
+
+    def __init__(self, patterns=None, max_path_depth=None, cache_size=DEFAULT_CACHE_SIZE):
+        self.patterns = list(patterns) if patterns else []
+        self.max_path_depth = max_path_depth
+        self.pattern = compile_patterns(self.patterns) if self.patterns else None
+        self.excluded = lru_cache(maxsize=cache_size)(self._excluded)
+
+    def _excluded(self, url):
+        if self.max_path_depth and url.count('/') > self.max_path_depth:
+            return True
+        return self.pattern is not None and self.pattern.search(url) is not None
@@ -0,0 +1,143 @@
+import os
+import tempfile
+from collections import OrderedDict
+from pysitemap.bloom_filter import ScalableBloomFilter
+
+
+class UrlIndex:
+    # Interns every url seen during a crawl as a small integer id, so that the frontier, visited and error
+    # stores and the link graph hold ints instead of many copies of the same url string
+
+    def __init__(self):
+        self._ids = {}
+        self._urls = []
+
+    def __len__(self):
+        return len(self._urls)
+
+    def __contains__(self, url):
+        return url in self._ids
+
+    def __getitem__(self, url_id):
+        return self._urls[url_id]
+
+    def __iter__(self):
+        # Every url in id order
+        return iter(self._urls)
+
+    def intern(self, url):
+        url_id = self._ids.get(url)
+        if url_id is None:
+            url_id = len(self._urls)
+            self._ids[url] = url_id
+            self._urls.append(url)
+        return url_id
+
+    def get(self, url, default=None):
+        return self._ids.get(url, default)
+
+    def urls(self, url_ids):
+        urls = self._urls
+        return [urls[url_id] for url_id in url_ids]
+
+    def close(self):
+        pass
+
+
+class _LruCache:
+    def __init__(self, size):
+        self._size = size
+        self._items = OrderedDict()
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._items[key] = value
+        if len(self._items) > self._size:
+            self._items.popitem(last=False)
+
+
+class DiskUrlIndex:
+    # UrlIndex keeping the urls in a temporary SQLite file instead of memory, for sites with more urls than
+    # fit in RAM. Most links are either recent, answered by the caches, or new. A Bloom filter tells those
+    # new urls apart without a lookup, only its false positives and older urls go to the disk.
+    DEFAULT_CACHE_SIZE = 100000
+    DEFAULT_CAPACITY = 1000000
+    DEFAULT_ERROR_RATE = 0.01
+    COMMIT_SIZE = 10000
+
+    def __init__(self, directory=None, cache_size=DEFAULT_CACHE_SIZE, capacity=DEFAULT_CAPACITY,
+                 error_rate=DEFAULT_ERROR_RATE):
+        # Imported here, crawls keeping their urls in memory don't need it
+        import sqlite3
+        handle, self._path = tempfile.mkstemp(prefix='pysitemap-urls-', suffix='.db', dir=directory)
+        os.close(handle)
+        self._connection = sqlite3.connect(self._path)
+        self._connection.executescript('''
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE urls (id INTEGER PRIMARY KEY, url TEXT NOT NULL UNIQUE);
+        ''')
+        self._bloom_filter = ScalableBloomFilter(capacity, error_rate)
+        self._ids = _LruCache(cache_size)
+        self._urls = _LruCache(cache_size)
+        self._len = 0
+        self._uncommitted = 0
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, url):
+        return self.get(url) is not None
+
+    def __getitem__(self, url_id):
+        url = self._urls.get(url_id)
+        if url is None:
+            row = self._connection.execute('SELECT url FROM urls WHERE id = ?', (url_id,)).fetchone()
+            if row is None:
+                raise IndexError('url id out of range')
+            url = row[0]
+            self._urls.put(url_id, url)
+        return url
+
+    def __iter__(self):
+        for (url,) in self._connection.execute('SELECT url FROM urls ORDER BY id'):
+            yield url
+
+    def intern(self, url):
+        url_id = self.get(url)
+        if url_id is None:
+            url_id = self._len
+            self._connection.execute('INSERT INTO urls (id, url) VALUES (?, ?)', (url_id, url))
+            self._len += 1
+            self._bloom_filter.add(url)
+            self._ids.put(url, url_id)
+            self._urls.put(url_id, url)
+            self._uncommitted += 1
+            if self._uncommitted >= self.COMMIT_SIZE:
+                self._connection.commit()
+                self._uncommitted = 0
+        return url_id
+
+    def get(self, url, default=None):
+        url_id = self._ids.get(url)
+        if url_id is not None:
+            return url_id
+        if url not in self._bloom_filter:
+            return default
+        row = self._connection.execute('SELECT id FROM urls WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return default
+        self._ids.put(url, row[0])
+        return row[0]
+
+    def urls(self, url_ids):
+        return [self[url_id] for url_id in url_ids]
+
+    def close(self):
+        self._connection.close()
+        os.remove(self._path)
@@ -0,0 +1,116 @@
+import re
+from fnmatch import translate
+from collections import namedtuple
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit, urljoin
+
+try:
+    from url_normalize import url_normalize
+except ImportError:
+    url_normalize = None
+
+
+# Everything the crawler needs to know about a link, computed once when it is normalized
+NormalizedUrl = namedtuple('NormalizedUrl', ['url', 'scheme', 'host', 'path', 'domain', 'depth'])
+
+_absolute_prefixes = ('http://', 'https://')
+# A scheme, unless what follows the colon is a port like in localhost:8000
+_scheme_pattern = re.compile(r'[a-zA-Z][a-zA-Z0-9+.-]*:(?!\d)')
+# ;name=value path parameters, like ;jsessionid=
+_path_parameter_pattern = re.compile(r';([^/;=]+)=[^/;]*')
+
+# Parameters that only track visits or sessions and never change the page
+TRACKING_PARAMS = ('utm_*', 'gclid', 'fbclid', 'msclkid', 'mc_cid', 'mc_eid', '_ga', 'sessionid', 'session_id',
+                   'sid', 'phpsessid', 'jsessionid', 'aspsessionid*', 'cfid', 'cftoken')
+
+
+def is_internal(link, host, domain=None):
+    # Whether a normalized link belongs to the crawled site, its host or, given a domain, any host under it
+    if domain:
+        return link.domain == domain or domain in link.host
+    return link.host == host
+
+
+def _needs_www(netloc):
+    # IP addresses and single label hosts like localhost can't be reached with a www. prefix
+    host = netloc.rsplit(':', 1)[0] if not netloc.endswith(']') else netloc
+    return '.' in host and not host.startswith('[') and not host.replace('.', '').isdigit()
+
+
+class UrlNormalizer:
+    DEFAULT_CACHE_SIZE = 100000
+
+    def __init__(self, get_domain=None, cache_size=DEFAULT_CACHE_SIZE, strip_params=None, sort_params=False):
+        self._get_domain = get_domain
+        # Query and path parameters whose name matches one of the strip_params shell patterns are dropped,
+        # with sort_params the rest are put in order of name, so the same page gets the same url
+        self._strip_params = re.compile('|'.join(translate(pattern.lower()) for pattern in strip_params)) \
+            if strip_params else None
+        self._sort_params = sort_params
+        # The same navigation links repeat on every page, so results are kept in a bounded LRU
+        # keyed by the raw href and the part of the base url it actually depends on
+        self._normalize_cached = lru_cache(maxsize=cache_size)(self._normalize)
+        self._origin = lru_cache(maxsize=1024)(self._split_origin)
+
+    def normalize(self, href, base=None):
+        if base is not None:
+            if href.startswith(_absolute_prefixes):
+                base = None
+            elif href.startswith('/') and not href.startswith('//'):
+                base = self._origin(base)
+        return self._normalize_cached(href, base)
+
+    def cache_info(self):
+        return self._normalize_cached.cache_info()
+
+    def _split_origin(self, base):
+        scheme, netloc, path, qs, anchor = urlsplit(base)
+        return urlunsplit((scheme, netloc, '', '', ''))
+
+    def _normalize(self, href, base):
+        url = urljoin(base, href) if base else href
+        if not base and not url.startswith('//') and not _scheme_pattern.match(url):
+            url = 'http://' + url
+        try:
+            if url_normalize:
+                url = url_normalize(url, default_scheme='http')
+            if url.endswith('/'):
+                url = url[:-1]
+            scheme, netloc, path, qs, anchor = urlsplit(url)
+        except (ValueError, UnicodeError):
+            return None
+        if self._strip_params is not None or self._sort_params:
+            path, qs = self._clean_params(path, qs)
+
+        if scheme == 'https' or scheme == '':
+            scheme = 'http'
+        elif scheme != 'http':
+            return None
+        netloc = netloc.lower()
+        if not netloc:
+            return None
+        if not netloc.startswith('www.') and _needs_www(netloc):
+            netloc = 'www.' + netloc
+
+        domain = self._get_domain(netloc) if self._get_domain else None
+        return NormalizedUrl(urlunsplit((scheme, netloc, path, qs, '')), scheme, netloc, path, domain,
+                             path.count('/'))
+
+    def _clean_params(self, path, qs):
+        strip = self._strip_params
+        if strip is not None and ';' in path:
+            path = _path_parameter_pattern.sub(lambda match: '' if strip.match(match.group(1).lower())
+                                               else match.group(0), path)
+        if not qs:
+            return path, qs
+        params = qs.split('&')
+        if strip is not None:
+            params = [param for param in params if param and not strip.match(param.split('=', 1)[0].lower())]
+        if self._sort_params:
+            # Stable, repeated parameters keep their order
+            params.sort(key=lambda param: param.split('=', 1)[0])
+        qs = '&'.join(params)
+        # Without a query left, the url ends like one that never had it
+        if not qs and path.endswith('/'):
+            path = path[:-1]
+        return path, qs
@@ -0,0 +1,85 @@
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LocalSite:
+    # A site served on 127.0.0.1 from pages, {path: (headers, body)} or {path: (headers, body, status)}, that
+    # tests may change between crawls. Conditional requests are answered with 304 when the ETag or
+    # Last-Modified of the page still matches, unless conditional is off. Pages in delays are answered that many
+    # seconds late, served lists the paths in the order their responses were sent and connections counts the
+    # connections accepted.
+    def __init__(self, pages=None):
+        self.pages = dict(pages or {})
+        self.conditional = True
+        self.requests = []
+        self.served = []
+        self.delays = {}
+        self.connections = 0
+        self._lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately, with Nagle's algorithm every response would wait for an ACK
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                with site._lock:
+                    site.connections += 1
+                BaseHTTPRequestHandler.setup(self)
+
+            def do_GET(self):
+                site.requests.append(self.path)
+                page = site.pages.get(self.path)
+                if page is None:
+                    self.send_error(404)
+                    return
+                headers, body, status = page if len(page) == 3 else page + (200,)
+                if self.path in site.delays:
+                    time.sleep(site.delays[self.path])
+                if isinstance(body, str):
+                    body = body.encode('utf-8')
+                headers = dict(headers)
+                headers.setdefault('Content-Type', 'text/html; charset=utf-8')
+                not_modified = site.conditional and (
+                    'ETag' in headers and self.headers.get('If-None-Match') == headers['ETag'] or
+                    'Last-Modified' in headers and self.headers.get('If-Modified-Since') == headers['Last-Modified'])
+                self.send_response(304 if not_modified else status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if not_modified:
+                    self.end_headers()
+                else:
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                site.served.append(self.path)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.01,), daemon=True)
+        self._thread.start()
+        self.url = 'http://127.0.0.1:%d' % self._server.server_port
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def http_date(seconds):
+    return formatdate(seconds, usegmt=True)
+
+
+def links_page(*paths):
+    return '<html><body>%s</body></html>' % ''.join('<a href="%s">%s</a>' % (path, path) for path in paths)
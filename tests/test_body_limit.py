@@ -0,0 +1,95 @@
+import asyncio
+import gzip
+
+import pytest
+
+from benchmarks.synthetic_site import SyntheticSite
+from pysitemap.aiohttp_backend import AiohttpBackend
+from pysitemap.async_crawler import Crawler as AsyncCrawler
+from pysitemap.connection_pool import ConnectionPool
+from pysitemap.crawler import Crawler
+from tests.local_site import LocalSite
+
+LIMIT = 1000
+
+
+def pages():
+    pages = {}
+    for size in (LIMIT - 1, LIMIT, LIMIT + 1):
+        body = b'x' * size
+        pages['/%d' % size] = ({}, body)
+        pages['/gzip/%d' % size] = ({'Content-Encoding': 'gzip'}, gzip.compress(body))
+    return pages
+
+
+def check(response, size):
+    assert response.read() == b'x' * min(size, LIMIT)
+    assert response.truncated == (size > LIMIT)
+
+
+@pytest.mark.parametrize('size', [LIMIT - 1, LIMIT, LIMIT + 1])
+@pytest.mark.parametrize('prefix', ['', '/gzip'])
+def test_connection_pool_reads_up_to_the_limit(size, prefix):
+    with LocalSite(pages()) as site:
+        pool = ConnectionPool(timeout=5)
+        try:
+            check(pool.request(site.url + '%s/%d' % (prefix, size), body_limit=lambda headers: LIMIT), size)
+            # The connection is reused after a body cut short
+            check(pool.request(site.url + '/%d' % size, body_limit=lambda headers: LIMIT), size)
+        finally:
+            pool.close()
+        assert site.connections <= 2
+
+
+@pytest.mark.parametrize('size', [LIMIT - 1, LIMIT, LIMIT + 1])
+@pytest.mark.parametrize('prefix', ['', '/gzip'])
+def test_aiohttp_backend_reads_up_to_the_limit(size, prefix):
+    async def fetch(url):
+        backend = AiohttpBackend()
+        try:
+            check(await backend.request(url, body_limit=lambda headers: LIMIT), size)
+        finally:
+            await backend.close()
+
+    with LocalSite(pages()) as site:
+        asyncio.run(fetch(site.url + '%s/%d' % (prefix, size)))
+
+
+@pytest.mark.parametrize('extra', [-1, 0, 1])
+def test_http2_backend_reads_up_to_the_limit(extra):
+    pytest.importorskip('h2')
+    from pysitemap.http2_backend import Http2Backend
+    site = SyntheticSite(pages=2)
+    url = site.start_http2()
+    size = len(site.body(0, 'h2'))
+
+    async def fetch():
+        backend = Http2Backend(AiohttpBackend(), cleartext=True)
+        try:
+            response = await backend.request(url, body_limit=lambda headers: size + extra)
+            assert response.read() == site.body(0, 'h2')[:size + extra]
+            assert response.truncated == (extra < 0)
+        finally:
+            await backend.close()
+
+    try:
+        asyncio.run(fetch())
+    finally:
+        site.close()
+
+
+@pytest.mark.parametrize('crawler_class', [Crawler, AsyncCrawler])
+def test_crawler_reads_html_only_up_to_max_body_bytes(crawler_class):
+    head = b'<a href="/before">' + b' ' * 2000
+    pages = {'/': ({}, head + b'<a href="/after">'), '/before': ({}, b'<a href="/file.pdf">'),
+             '/after': ({}, b''), '/file.pdf': ({'Content-Type': 'application/pdf'}, b'%PDF' * 1000)}
+    with LocalSite(pages) as site:
+        crawler = crawler_class(site.url + '/', no_verbose=True, robots=False, seed_sitemaps=False,
+                                max_body_bytes=len(head))
+        try:
+            found = crawler.start()
+            assert crawler.metrics.truncated_bodies == 1 and crawler.metrics.skipped_bodies == 1
+        finally:
+            crawler.close()
+    # The pdf is listed without its body being read
+    assert sorted(found) == [site.url, site.url + '/before', site.url + '/file.pdf']
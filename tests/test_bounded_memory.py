@@ -0,0 +1,92 @@
+import pytest
+
+from pysitemap.async_crawler import Crawler as AsyncCrawler
+from pysitemap.bloom_filter import BloomFilter, ScalableBloomFilter
+from pysitemap.crawler import Crawler
+from pysitemap.frontier import PageSet, SpillQueue
+from pysitemap.url_index import DiskUrlIndex
+from tests.local_site import LocalSite, links_page
+
+
+def test_bloom_filter_error_rate():
+    bloom_filter = BloomFilter(10000, 0.01)
+    for i in range(10000):
+        bloom_filter.add('http://example.com/%d' % i)
+    assert all('http://example.com/%d' % i in bloom_filter for i in range(10000))
+    false_positives = sum('http://example.org/%d' % i in bloom_filter for i in range(20000))
+    assert false_positives < 20000 * 0.02
+
+
+def test_scalable_bloom_filter_stays_under_its_error_rate():
+    bloom_filter = ScalableBloomFilter(1000, 0.01)
+    for i in range(20000):
+        bloom_filter.add('http://example.com/%d' % i)
+    assert len(bloom_filter._filters) == 5
+    assert all('http://example.com/%d' % i in bloom_filter for i in range(20000))
+    false_positives = sum('http://example.org/%d' % i in bloom_filter for i in range(20000))
+    assert false_positives < 20000 * 0.02
+
+
+def test_disk_url_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(DiskUrlIndex, 'COMMIT_SIZE', 100)
+    urls = DiskUrlIndex(str(tmp_path), cache_size=10, capacity=100)
+    for i in range(1000):
+        assert urls.intern('http://example.com/%d' % i) == i
+    # Older urls are out of the caches and read back from disk
+    assert urls.intern('http://example.com/0') == 0
+    assert urls.get('http://example.com/5') == 5 and urls.get('http://example.com/missing') is None
+    assert urls[7] == 'http://example.com/7' and 'http://example.com/999' in urls
+    assert len(urls) == 1000
+    assert list(urls)[:2] == ['http://example.com/0', 'http://example.com/1']
+    with pytest.raises(IndexError):
+        urls[1000]
+    urls.close()
+    assert not list(tmp_path.iterdir())
+
+
+def test_spill_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(SpillQueue, 'CHUNK_SIZE', 8)
+    queue = SpillQueue(str(tmp_path))
+    for i in range(50):
+        queue.push(i, i % 3)
+    assert len(queue) == 50
+    assert list(queue.items()) == [(i, i % 3) for i in range(50)]
+    assert queue.pop(5) == [(i, i % 3) for i in range(5)]
+    popped = []
+    while queue:
+        popped += queue.pop(7)
+    assert popped == [(i, i % 3) for i in range(5, 50)]
+    # Drained, it can be filled again
+    queue.push(99, 1)
+    assert queue.pop(10) == [(99, 1)] and len(queue) == 0
+    queue.close()
+
+
+def test_page_set():
+    pages = PageSet()
+    pages[3] = {1, 2}
+    pages[3] = None
+    assert list(pages.keys()) == [3] and pages[3] is None and list(pages.items()) == [(3, None)]
+
+
+@pytest.mark.parametrize('crawler_class', [Crawler, AsyncCrawler])
+def test_crawl_with_bounded_memory_finds_the_same_site(tmp_path, crawler_class):
+    pages = {'/': ({}, links_page(*['/p/%d' % i for i in range(60)]))}
+    for i in range(60):
+        pages['/p/%d' % i] = ({}, links_page('/p/%d/sub' % i, '/p/%d' % ((i + 1) % 60)))
+        pages['/p/%d/sub' % i] = ({}, links_page('/'))
+    results = []
+    with LocalSite(pages) as site:
+        for max_memory in (None, 1):
+            crawler = crawler_class(site.url + '/', no_verbose=True, robots=False, seed_sitemaps=False,
+                                    max_memory=max_memory, spill_dir=str(tmp_path))
+            if max_memory:
+                # A window small enough for the frontier to spill to disk
+                crawler._frontier_window = 5
+            try:
+                results.append(sorted(crawler.start()))
+                assert (crawler._spill is not None) == bool(max_memory)
+            finally:
+                crawler.close()
+    assert results[0] == results[1]
+    assert len(results[0]) == 121
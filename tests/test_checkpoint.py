@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+
+from pysitemap.crawler import Crawler
+from tests.local_site import LocalSite, links_page
+
+
+def site_pages():
+    pages = {'/': ({}, links_page(*['/p/%d' % i for i in range(0, 40, 8)]))}
+    for i in range(40):
+        pages['/p/%d' % i] = ({}, links_page('/p/%d' % ((i + 1) % 40), '/p/%d' % (i * 3 % 40)))
+    return pages
+
+
+def crawl(site, checkpoint=None, resume=None, stop_after=None):
+    crawler = Crawler(site.url + '/', no_verbose=True, robots=False, seed_sitemaps=False, build_graph=True,
+                      checkpoint=checkpoint)
+    if stop_after:
+        # Interrupts the crawl once that many pages were served, like Ctrl+C would
+        def watch():
+            while len(site.served) < stop_after:
+                time.sleep(0.001)
+            crawler.stop()
+        threading.Thread(target=watch, daemon=True).start()
+    try:
+        found = crawler.start(resume=resume)
+        return sorted(found), crawler.generate_graph()
+    finally:
+        crawler.close()
+
+
+def test_resumed_crawl_finds_the_same_site(tmp_path):
+    checkpoint = str(tmp_path / 'crawl.db')
+    with LocalSite(site_pages()) as site:
+        full = crawl(site)
+        del site.requests[:], site.served[:]
+        site.delays = dict.fromkeys(site.pages, 0.02)
+        interrupted = crawl(site, checkpoint, stop_after=10)
+        first = list(site.requests)
+        del site.requests[:]
+        resumed = crawl(site, resume=checkpoint)
+    assert len(full[0]) == 41
+    assert 0 < len(interrupted[0]) < len(full[0])
+    assert resumed == full
+    # Pages crawled before the interruption aren't requested again
+    assert not set(first) & set(site.requests)
+    assert len(first) + len(site.requests) == 41
+
+
+def test_checkpoint_of_another_site(tmp_path):
+    checkpoint = str(tmp_path / 'crawl.db')
+    with LocalSite(site_pages()) as site:
+        crawl(site, checkpoint)
+    crawler = Crawler('http://example.com/', no_verbose=True)
+    try:
+        with pytest.raises(ValueError):
+            crawler.start(resume=checkpoint)
+    finally:
+        crawler.close()
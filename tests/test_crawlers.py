@@ -0,0 +1,71 @@
+import re
+
+import pytest
+
+from pysitemap.async_crawler import Crawler as AsyncCrawler
+from pysitemap.crawler import Crawler
+from tests.local_site import LocalSite, links_page
+
+MODES = [(Crawler, {}), (Crawler, {'workers': 4}), (AsyncCrawler, {}), (AsyncCrawler, {'max_requests': 2})]
+
+
+def site_pages():
+    pages = {'/': ({}, links_page('/p/0', '/p/15')), '/old': ({'Location': '/p/29'}, '', 301)}
+    for i in range(30):
+        pages['/p/%d' % i] = ({}, links_page('/p/%d' % (i * 7 % 30), '/p/%d' % ((i + 1) % 30), '/missing', '/old',
+                                             'http://other.example/x'))
+    return pages
+
+
+def crawl(crawler_class, url, **options):
+    crawler = crawler_class(url, no_verbose=True, robots=False, seed_sitemaps=False, build_graph=True, **options)
+    try:
+        found = crawler.start()
+        # Pages are listed in the order they were crawled, which depends on the mode
+        locs = re.findall('<loc>([^<]*)</loc>', crawler.generate_sitemap())
+        return sorted(found), crawler.generate_graph(), sorted(locs)
+    finally:
+        crawler.close()
+
+
+@pytest.fixture(scope='module')
+def site():
+    with LocalSite(site_pages()) as site:
+        yield site
+
+
+@pytest.fixture(scope='module')
+def expected(site):
+    return crawl(Crawler, site.url + '/')
+
+
+@pytest.mark.parametrize('crawler_class, options', MODES)
+def test_every_mode_finds_the_same_site(site, expected, crawler_class, options):
+    del site.requests[:]
+    assert crawl(crawler_class, site.url + '/', **options) == expected
+    # Following the redirect of /old requests its target again
+    requests = [path for path in site.requests if path != '/p/29']
+    assert len(requests) == len(set(requests))
+    found, graph, locs = expected
+    assert site.url + '/p/29' in found and site.url + '/missing' not in found
+    assert graph[site.url] == {site.url + '/p/0', site.url + '/p/15'}
+    assert locs == found
+
+
+@pytest.mark.parametrize('crawler_class, options', MODES)
+def test_connections_are_reused(site, crawler_class, options):
+    site.connections = 0
+    del site.requests[:]
+    crawl(crawler_class, site.url + '/', **options)
+    # Connections are kept alive between requests, only the 404 closes its own
+    assert site.connections < len(site.requests) / 3
+
+
+@pytest.mark.parametrize('crawler_class, options', [(Crawler, {'workers': 4}), (AsyncCrawler, {'max_requests': 4})])
+def test_slow_pages_dont_hold_back_the_others(crawler_class, options):
+    pages = {'/': ({}, links_page('/slow', '/a')), '/slow': ({}, links_page()), '/a': ({}, links_page('/b')),
+             '/b': ({}, links_page('/c')), '/c': ({}, links_page('/d')), '/d': ({}, links_page())}
+    with LocalSite(pages) as site:
+        site.delays['/slow'] = 1
+        crawl(crawler_class, site.url + '/', **options)
+    assert site.served.index('/d') < site.served.index('/slow')
@@ -0,0 +1,75 @@
+import hashlib
+import re
+
+import pytest
+
+from pysitemap.crawler import Crawler
+from pysitemap.dedup import DuplicateDetector, SimHashIndex, simhash
+from tests.local_site import LocalSite, links_page
+
+ARTICLE = ('<html><head><script>var s = "%s";</script></head><body><h1>On crawling</h1><p>' +
+           ' '.join('word%d' % i for i in range(300)) + '</p><p>Visitor %s</p></body></html>')
+
+
+def distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def test_simhash():
+    page = (ARTICLE % ('a', '1')).encode()
+    assert simhash(page) == simhash(page.replace(b'<p>', b'<p class="x">'))
+    # Scripts and markup don't count, a word of text changes a few bits only
+    assert simhash(page) == simhash((ARTICLE % ('b', '1')).encode())
+    assert 0 < distance(simhash(page), simhash((ARTICLE % ('a', '2')).encode())) <= 3
+    assert distance(simhash(page), simhash(b'<p>' + b' '.join(b'other%d' % i for i in range(300)))) > 10
+    assert simhash(b'<p></p>') == 0
+
+
+def test_simhash_index():
+    index = SimHashIndex(max_distance=3)
+    index.add(0b1011 << 40, 'a')
+    assert index.find(0b1011 << 40) == 'a'
+    assert index.find((0b1011 << 40) ^ 0b111) == 'a'
+    assert index.find((0b1011 << 40) ^ 0b1111) is None
+
+
+def test_duplicate_detector():
+    def check(detector, url_id, body):
+        return detector.check(url_id, hashlib.sha1(body).hexdigest(), body)
+
+    pages = [(ARTICLE % ('a', n)).encode() for n in range(3)]
+    exact = DuplicateDetector()
+    assert check(exact, 1, pages[0]) is None
+    assert check(exact, 2, pages[0]) == 1
+    assert check(exact, 3, pages[1]) is None
+    near = DuplicateDetector(near=True)
+    assert check(near, 1, pages[0]) is None
+    assert check(near, 2, pages[1]) == 1
+    assert check(near, 3, b'<p>something else entirely, with enough words to tell</p>') is None
+
+
+def crawl(site, dedup):
+    crawler = Crawler(site.url + '/', no_verbose=True, robots=False, seed_sitemaps=False, dedup=dedup)
+    try:
+        crawler.start()
+        return sorted(loc[len(site.url):] for loc in re.findall('<loc>([^<]*)</loc>', crawler.generate_sitemap()))
+    finally:
+        crawler.close()
+
+
+@pytest.mark.parametrize('dedup, listed', [
+    (None, ['', '/a', '/a?sid=1', '/article', '/b']),
+    ('exact', ['', '/a', '/article', '/b']),
+    ('near', ['', '/a', '/article']),
+])
+def test_crawl_lists_one_copy(dedup, listed):
+    printable = '<link rel="canonical" href="/article"><p>The article</p>'
+    pages = {'/': ({}, links_page('/a', '/a?sid=1', '/b', '/print')),
+             '/a': ({}, ARTICLE % ('a', 1) + links_page('/')),
+             '/a?sid=1': ({}, ARTICLE % ('a', 1) + links_page('/')),
+             '/b': ({}, ARTICLE % ('a', 2) + links_page('/')),
+             # Only found through the canonical url of its copy, crawled first, and listed in its place
+             '/print': ({}, printable),
+             '/article': ({}, printable)}
+    with LocalSite(pages) as site:
+        assert crawl(site, dedup) == listed
@@ -0,0 +1,59 @@
+import zlib
+
+import pytest
+
+from pysitemap.crawler import Crawler
+from pysitemap.distributed import Coordinator, parse_address, shard_of
+from tests.local_site import LocalSite, links_page
+
+OPTIONS = dict(no_verbose=True, robots=False, seed_sitemaps=False, build_graph=True, domain='127.0.0.1')
+
+
+def test_shard_of():
+    urls = ['http://host%d.example.com/page' % i for i in range(100)]
+    shards = [shard_of(url, 4) for url in urls]
+    assert set(shards) == {0, 1, 2, 3}
+    # Stable across processes and the same for every page of a host
+    shard = zlib.crc32(b'example.com') % 4
+    assert shard_of('http://example.com/a', 4) == shard_of('http://example.com/b?c', 4) == shard
+    assert parse_address('example.com:8000') == ('example.com', 8000)
+    assert parse_address(':8000') == ('127.0.0.1', 8000)
+    assert parse_address('/tmp/socket') == '/tmp/socket'
+
+
+@pytest.fixture(scope='module')
+def sites():
+    # Sites on hosts of more than one shard, each linking to the next
+    sites = [LocalSite(), LocalSite()]
+    while len({shard_of(site.url, 2) for site in sites}) < 2:
+        sites.append(LocalSite())
+    for n, site in enumerate(sites):
+        other = sites[(n + 1) % len(sites)].url
+        site.pages['/'] = ({}, links_page('/a', other + '/b'))
+        site.pages['/a'] = ({}, links_page('/', other + '/'))
+        site.pages['/b'] = ({}, links_page('/a'))
+    yield sites
+    for site in sites:
+        site.close()
+
+
+@pytest.mark.parametrize('asynchronous', [False, True])
+def test_distributed_crawl_finds_the_same_pages(sites, asynchronous):
+    crawler = Crawler(sites[0].url + '/', **OPTIONS)
+    try:
+        found = sorted(crawler.start())
+        graph = crawler.generate_graph()
+    finally:
+        crawler.close()
+    assert len(found) == 3 * len(sites)
+
+    for site in sites:
+        del site.requests[:]
+    coordinator = Coordinator(sites[0].url, shards=2, asynchronous=asynchronous, **OPTIONS)
+    try:
+        assert sorted(coordinator.start()) == found
+        assert coordinator.generate_graph() == graph
+    finally:
+        coordinator.close()
+    # Every page was crawled by one shard only
+    assert all(sorted(site.requests) == ['/', '/a', '/b'] for site in sites)
@@ -0,0 +1,176 @@
+import asyncio
+import gzip
+import zlib
+from urllib.error import HTTPError
+
+import pytest
+
+from benchmarks.synthetic_site import SyntheticSite
+from pysitemap.aiohttp_backend import AiohttpBackend
+from pysitemap.async_crawler import Crawler as AsyncCrawler
+from pysitemap.connection_pool import ConnectionPool
+from pysitemap.fetch_backend import ACCEPT_ENCODING, BodyDecoder, FetchBackend, FetchResponse, redirect_url
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BODY = b'<html><body>' + b''.join(b'<a href="/p/%d">page %d</a>' % (i, i) for i in range(200)) + b'</body></html>'
+
+
+def raw_deflate(data):
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decode(content_encoding, data, size=None):
+    decoder = BodyDecoder(content_encoding)
+    size = size or len(data)
+    return b''.join(decoder.decode(data[i:i + size]) for i in range(0, len(data), size)) + decoder.flush()
+
+
+@pytest.mark.parametrize('content_encoding, encode', [
+    ('gzip', gzip.compress),
+    ('X-Gzip', gzip.compress),
+    ('deflate', zlib.compress),
+    ('deflate', raw_deflate),
+    ('identity', bytes),
+    (None, bytes),
+])
+@pytest.mark.parametrize('size', [None, 1, 100])
+def test_decoded_chunk_by_chunk(content_encoding, encode, size):
+    assert decode(content_encoding, encode(BODY), size) == BODY
+    assert bool(BodyDecoder(content_encoding)) == (encode is not bytes)
+
+
+@pytest.mark.skipif(brotli is None, reason='brotli is not installed')
+def test_brotli():
+    assert 'br' in ACCEPT_ENCODING
+    assert decode('br', brotli.compress(BODY), 10) == BODY
+    # Listed in the order they were applied
+    assert decode('gzip, br', brotli.compress(gzip.compress(BODY)), 7) == BODY
+    with pytest.raises(ValueError):
+        decode('br', b'\x1b' + b'\xff' * 50)
+
+
+def test_chained_encodings():
+    assert decode('deflate, gzip', gzip.compress(zlib.compress(BODY)), 3) == BODY
+    assert decode('gzip, identity, gzip', gzip.compress(gzip.compress(BODY))) == BODY
+
+
+def test_unsupported_and_corrupted_encodings():
+    with pytest.raises(ValueError):
+        BodyDecoder('compress')
+    with pytest.raises(zlib.error):
+        decode('gzip', b'not gzip at all')
+
+
+def test_redirect_url():
+    assert redirect_url('http://example.com/a/b', 200, {'Location': '/x'}, 0, 10) is None
+    assert redirect_url('http://example.com/a/b', 301, {}, 0, 10) is None
+    assert redirect_url('http://example.com/a/b', 302, {'Location': 'c'}, 0, 10) == 'http://example.com/a/c'
+    with pytest.raises(HTTPError):
+        redirect_url('http://example.com/a/b', 308, {'Location': '/x'}, 10, 10)
+
+
+class _Redirects(FetchBackend):
+    # /loop redirects to itself, /n/<count> redirects count times before answering
+    def __init__(self):
+        self.sent = []
+
+    def send(self, url, headers=None, body_limit=None):
+        self.sent.append(url)
+        path = url.split('/', 3)[3]
+        if path == 'loop':
+            return FetchResponse(url, 302, {'Location': '/loop'}, b'')
+        count = int(path.split('/')[1])
+        if count:
+            return FetchResponse(url, 301, {'Location': '/n/%d' % (count - 1)}, b'')
+        return FetchResponse(url, 200, {}, b'done')
+
+
+def test_redirects_are_followed_up_to_the_limit():
+    backend = _Redirects()
+    response = backend.request('http://example.com/n/3', max_redirects=3)
+    assert response.read() == b'done' and response.geturl() == 'http://example.com/n/0'
+    assert len(backend.sent) == 4
+    with pytest.raises(HTTPError) as error:
+        _Redirects().request('http://example.com/loop', max_redirects=5)
+    assert error.value.code == 302
+    with pytest.raises(HTTPError):
+        _Redirects().request('http://example.com/n/4', max_redirects=3)
+
+
+@pytest.fixture
+def site():
+    site = SyntheticSite(pages=20, error_rate=0, corrupt_rate=0, redirect_rate=0)
+    site.start()
+    yield site
+    site.close()
+
+
+def test_connection_pool_decodes_compressed_bodies(site):
+    pool = ConnectionPool(timeout=5)
+    try:
+        response = pool.request(site.url + 'p/3', headers={'Accept-Encoding': ACCEPT_ENCODING})
+        assert response.read() == site.body(3)
+        assert response.transferred == len(site.compressed_body(3)) < len(site.body(3))
+        response = pool.request(site.url + 'p/3')
+        assert response.read() == site.body(3) and response.transferred == len(site.body(3))
+    finally:
+        pool.close()
+
+
+def test_aiohttp_backend_decodes_compressed_bodies(site):
+    async def fetch():
+        backend = AiohttpBackend(headers={'Accept-Encoding': ACCEPT_ENCODING})
+        try:
+            response = await backend.request(site.url + 'p/3')
+            assert response.read() == site.body(3)
+            assert response.transferred == len(site.compressed_body(3)) < len(site.body(3))
+            with pytest.raises(HTTPError):
+                await backend.request(site.url + 'missing')
+        finally:
+            await backend.close()
+
+    asyncio.run(fetch())
+
+
+@pytest.fixture
+def http2_site():
+    pytest.importorskip('h2')
+    site = SyntheticSite(pages=120, fanout=5, depth=4, error_rate=0, corrupt_rate=0, page_size=2048)
+    site.start()
+    site.start_http2()
+    yield site
+    site.close()
+
+
+def test_http2_requests_share_one_connection(http2_site):
+    from pysitemap.http2_backend import Http2Backend
+
+    async def fetch():
+        backend = Http2Backend(AiohttpBackend(), headers={'Accept-Encoding': ACCEPT_ENCODING}, cleartext=True)
+        try:
+            responses = await asyncio.gather(*(backend.request(http2_site.http2_url + 'p/%d' % page)
+                                               for page in range(1, 40)))
+            assert [response.read() for response in responses] == \
+                [http2_site.body(page, 'h2') for page in range(1, 40)]
+            assert len(backend._connections) == 1
+        finally:
+            await backend.close()
+
+    asyncio.run(fetch())
+
+
+def test_http2_crawl_finds_the_same_pages(http2_site):
+    found = []
+    for url, http2 in ((http2_site.url, False), (http2_site.http2_url, 'h2c')):
+        crawler = AsyncCrawler(url, no_verbose=True, robots=False, seed_sitemaps=False, http2=http2)
+        try:
+            found.append({found_url[len(url) - 1:] for found_url in crawler.start()})
+        finally:
+            crawler.close()
+    assert found[0] == found[1]
+    assert {'/p/%d' % page for page in range(1, 120)} <= found[1]
@@ -0,0 +1,15 @@
+from pysitemap.frontier import IdSet
+
+
+def test_id_set():
+    ids = IdSet([3, 0, 3])
+    assert len(ids) == 2 and 3 in ids and 0 in ids and 1 not in ids and 10000 not in ids
+    ids.add(10000)
+    ids.add(10000)
+    assert len(ids) == 3 and 10000 in ids
+    assert list(ids) == [0, 3, 10000]
+    ids.discard(3)
+    ids.discard(3)
+    ids.discard(123456)
+    assert len(ids) == 2 and 3 not in ids
+    assert list(ids) == [0, 10000]
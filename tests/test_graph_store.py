@@ -0,0 +1,80 @@
+import re
+
+import pytest
+
+from pysitemap import readwrite
+from pysitemap.graph_store import DictGraph, GraphFile, write_gexf, write_graph
+
+GRAPH = {'http://example.com/': {'http://example.com/a', 'http://example.com/ü?x=1&y="2"'},
+         'http://example.com/a': {'http://example.com/'},
+         'http://example.com/ü?x=1&y="2"': set()}
+
+
+def test_graph_file_round_trip(tmp_path):
+    path = str(tmp_path / 'graph.bin')
+    urls = ['http://example.com/', 'http://example.com/a', 'http://example.com/b', 'http://example.com/ü']
+    assert write_graph(path, urls, [(0, [3, 1]), (2, [0])]) == 3
+    with GraphFile(path) as graph:
+        assert len(graph) == 4 and graph.edge_count == 3
+        assert list(graph.urls()) == urls
+        assert list(graph.successors(0)) == [1, 3]
+        assert list(graph.successors(1)) == []
+        assert list(graph.edges()) == [(0, 1), (0, 3), (2, 0)]
+        assert graph.to_dict() == {urls[0]: {urls[1], urls[3]}, urls[2]: {urls[0]}}
+
+
+def test_dict_graph_round_trip(tmp_path):
+    graph = DictGraph(GRAPH)
+    path = str(tmp_path / 'graph.bin')
+    write_graph(path, graph.urls(), graph.adjacency())
+    with GraphFile(path) as loaded:
+        assert loaded.to_dict() == {url: urls for url, urls in GRAPH.items() if urls}
+
+
+def test_sources_in_increasing_order(tmp_path):
+    with pytest.raises(ValueError):
+        write_graph(str(tmp_path / 'graph.bin'), ['a', 'b'], [(1, [0]), (0, [1])])
+
+
+def test_not_a_graph_file(tmp_path):
+    for content in (b'', b'not a graph file, long enough to hold a header of the format ' * 2):
+        path = tmp_path / 'graph.bin'
+        path.write_bytes(content)
+        with pytest.raises(ValueError):
+            GraphFile(str(path))
+
+
+def test_gexf_nodes_are_urls(tmp_path):
+    path = str(tmp_path / 'graph.gexf')
+    write_gexf(DictGraph(GRAPH), path)
+    with open(path, encoding='utf-8') as file:
+        gexf = file.read()
+    assert '<node id="http://example.com/a" label="http://example.com/a" />' in gexf
+    assert re.search(r'source="http://example.com/a" target="http://example.com/"', gexf)
+
+
+def test_gexf_read_by_networkx(tmp_path):
+    gexf = pytest.importorskip('networkx.readwrite.gexf')
+    readwrite.export_graph(GRAPH, str(tmp_path), no_verbose=True)
+    graph = gexf.read_gexf(str(tmp_path / 'graph.gexf'))
+    assert {(source, target) for source, target in graph.edges()} == \
+        {(source, target) for source, targets in GRAPH.items() for target in targets}
+
+
+def test_json_round_trip(tmp_path):
+    pytest.importorskip('networkx')
+    pytest.importorskip('ujson')
+    readwrite.save_graph(GRAPH, str(tmp_path), no_verbose=True)
+    graph = readwrite.load_graph(str(tmp_path), no_verbose=True)
+    assert set(graph.nodes()) == set(GRAPH)
+    assert {(source, target) for source, target in graph.edges()} == \
+        {(source, target) for source, targets in GRAPH.items() for target in targets}
+
+
+def test_compact_round_trip(tmp_path):
+    readwrite.save_compact_graph(GRAPH, str(tmp_path), no_verbose=True)
+    graph = readwrite.load_compact_graph(str(tmp_path), no_verbose=True)
+    try:
+        assert graph.to_dict() == {url: urls for url, urls in GRAPH.items() if urls}
+    finally:
+        graph.close()
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+from pysitemap import host_scheduler
+from pysitemap.host_scheduler import HostLimiter, HostScheduler, retry_after_seconds
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds('120') == 120
+    assert 50 < retry_after_seconds(formatdate(time.time() + 60, usegmt=True)) <= 60
+    assert retry_after_seconds(formatdate(time.time() - 60, usegmt=True)) == 0
+    assert retry_after_seconds('') is None and retry_after_seconds('soon') is None
+
+
+def test_backoff_is_capped_with_jitter():
+    scheduler = HostScheduler(4, backoff_base=1, backoff_max=10)
+    assert all(0 <= scheduler.backoff(attempt) <= min(10, 2 ** attempt) for attempt in range(8) for _ in range(50))
+    assert scheduler.host('example.com') is scheduler.host('example.com')
+    assert scheduler.host('example.com') is not scheduler.host('example.org')
+
+
+def test_concurrency_grows_then_backs_off(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(host_scheduler.time, 'monotonic', lambda: now[0])
+    limiter = HostLimiter(8)
+    assert limiter.concurrency == 2
+
+    def round_trip(latency, **outcome):
+        now[0] += latency
+        limiter._in_flight += 1
+        limiter.release(latency, **outcome)
+
+    # Slow start adds one per response
+    for _ in range(4):
+        round_trip(0.1)
+    assert limiter.concurrency == 6
+    round_trip(0.1, throttled=True)
+    assert limiter.concurrency == 3
+    # A second error within the same round trip doesn't cut it again
+    now[0] -= 0.1
+    limiter._in_flight += 1
+    limiter.release(failed=True)
+    assert limiter.concurrency == 3
+    # Then one per round trip, up to the maximum
+    for _ in range(40):
+        round_trip(0.1)
+    assert limiter.concurrency == 8
+    # Latency well above the fastest seen lowers it
+    for _ in range(5):
+        round_trip(1.0)
+    assert limiter.concurrency < 8
+
+
+def test_requests_in_flight_stay_under_the_limit():
+    limiter = HostLimiter(3)
+    limiter._limit = 3.0
+    peak = [0]
+
+    async def request():
+        await limiter.acquire()
+        peak[0] = max(peak[0], limiter.in_flight)
+        await asyncio.sleep(0.01)
+        limiter.release()
+
+    async def crawl():
+        await asyncio.gather(*(request() for _ in range(30)))
+
+    asyncio.run(crawl())
+    assert peak[0] == 3 and limiter.in_flight == 0
+
+
+def test_rate_and_crawl_delay():
+    limiter = HostLimiter(10, max_rate=50)
+    limiter.set_delay(0.05)
+    limiter.set_delay(0.01)
+
+    async def crawl():
+        for _ in range(6):
+            await limiter.acquire()
+            limiter.release()
+
+    start = time.monotonic()
+    asyncio.run(crawl())
+    # The first request takes the burst token, the next five wait 1 / 20 s each
+    assert 0.24 <= time.monotonic() - start < 1
+
+
+def test_pause():
+    limiter = HostLimiter(2)
+    limiter.pause(0.2)
+
+    async def request():
+        await limiter.acquire()
+        limiter.release()
+
+    start = time.monotonic()
+    asyncio.run(request())
+    assert time.monotonic() - start >= 0.19
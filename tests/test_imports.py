@@ -0,0 +1,76 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tests.local_site import LocalSite, links_page
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules of features a crawl has to ask for and the optional packages behind them, none of them should be
+# loaded by a crawl that doesn't use them
+FEATURE_MODULES = ('pysitemap.crawl_state', 'pysitemap.dedup', 'pysitemap.distributed', 'pysitemap.graph_store',
+                   'pysitemap.http2_backend', 'pysitemap.link_analysis', 'pysitemap.parse_pool', 'pysitemap.robots',
+                   'pysitemap.sitemap_reader', 'pysitemap.sitemap_writer', 'aiohttp', 'h2', 'multiprocessing',
+                   'networkx', 'numpy', 'scipy', 'sqlite3', 'ujson', 'xml.etree')
+
+CRAWL = '''
+import json, sys
+from pysitemap.crawler import Crawler
+options = dict({'robots': False, 'seed_sitemaps': False}, **json.loads(sys.argv[2]))
+crawler = Crawler(sys.argv[1], no_verbose=True, **options)
+crawler.start()
+crawler.close()
+print(json.dumps(sorted(sys.modules)))
+'''
+
+HELP = '''
+import json, runpy, sys
+sys.argv = ['pysitemap', '--help']
+try:
+    runpy.run_module('pysitemap', run_name='__main__')
+except SystemExit:
+    pass
+print(json.dumps(sorted(sys.modules)))
+'''
+
+
+def loaded_modules(code, *args):
+    output = subprocess.run([sys.executable, '-c', code] + list(args), cwd=ROOT, stdout=subprocess.PIPE,
+                            check=True, universal_newlines=True).stdout
+    modules = json.loads(output.splitlines()[-1])
+    return {name for name in FEATURE_MODULES if any(module == name or module.startswith(name + '.')
+                                                    for module in modules)}
+
+
+@pytest.fixture(scope='module')
+def site():
+    with LocalSite({'/': ({}, links_page('/a')), '/a': ({}, links_page('/')),
+                    '/robots.txt': ({'Content-Type': 'text/plain'}, 'User-agent: *\nDisallow: /private/'),
+                    '/sitemap.xml': ({'Content-Type': 'application/xml'}, '<urlset></urlset>')}) as site:
+        yield site
+
+
+def test_help_loads_no_feature(site):
+    assert loaded_modules(HELP) == set()
+
+
+def test_plain_crawl_loads_no_feature(site):
+    del site.requests[:]
+    assert loaded_modules(CRAWL, site.url + '/', '{}') == set()
+    assert '/a' in site.requests
+
+
+@pytest.mark.parametrize('options, modules', [
+    ({'robots': True}, {'pysitemap.robots'}),
+    ({'seed_sitemaps': True}, {'pysitemap.sitemap_reader', 'xml.etree'}),
+    ({'dedup': 'exact'}, {'pysitemap.dedup'}),
+    ({'cache': 'CACHE'}, {'sqlite3'}),
+    ({'max_memory': 1}, {'sqlite3'}),
+])
+def test_features_load_their_modules(site, tmp_path, options, modules):
+    if options.get('cache') == 'CACHE':
+        options = {'cache': str(tmp_path / 'cache.db')}
+    assert loaded_modules(CRAWL, site.url + '/', json.dumps(options)) == modules
@@ -0,0 +1,52 @@
+import re
+
+from pysitemap.crawler import Crawler
+from tests.local_site import LocalSite, http_date, links_page
+
+PDF = {'Content-Type': 'application/pdf'}
+
+
+def crawl(url, cache):
+    crawler = Crawler(url + '/', no_verbose=True, cache=cache, robots=False)
+    try:
+        crawler.start()
+        sitemap = crawler.generate_sitemap()
+    finally:
+        crawler.close()
+    return dict(re.findall(r'<loc>https?://[^/<]*([^<]*)</loc>\s*(?:<lastmod>([^<]*)</lastmod>)?', sitemap))
+
+
+def test_unchanged_page_keeps_its_lastmod(tmp_path):
+    cache = str(tmp_path / 'cache.db')
+    with LocalSite({'/': ({}, links_page('/a')), '/a': ({}, 'a')}) as site:
+        first = crawl(site.url, cache)
+        site.pages['/'] = ({}, links_page('/a') + ' ')
+        second = crawl(site.url, cache)
+    assert first['/a'] and second['/a'] == first['/a']
+
+
+def test_last_modified_header_is_the_lastmod(tmp_path):
+    with LocalSite({'/': ({}, links_page('/a')), '/a': ({'Last-Modified': http_date(1539907200)}, 'a')}) as site:
+        lastmods = crawl(site.url, str(tmp_path / 'cache.db'))
+    assert lastmods['/a'].startswith('2018-10-19')
+
+
+def test_unread_body_without_validators_gets_no_lastmod(tmp_path):
+    cache = str(tmp_path / 'cache.db')
+    with LocalSite({'/': ({}, links_page('/doc.pdf')), '/doc.pdf': (PDF, b'%PDF-1')}) as site:
+        assert crawl(site.url, cache)['/doc.pdf'] == ''
+        site.pages['/doc.pdf'] = (PDF, b'%PDF-2')
+        assert crawl(site.url, cache)['/doc.pdf'] == ''
+
+
+def test_unread_body_changes_with_its_etag(tmp_path, monkeypatch):
+    cache = str(tmp_path / 'cache.db')
+    with LocalSite({'/': ({}, links_page('/doc.pdf')), '/doc.pdf': (dict(PDF, ETag='"1"'), b'%PDF-1')}) as site:
+        monkeypatch.setattr('pysitemap.abc_crawler.lastmod_now', lambda: '2020-01-01T00:00:00+00:00')
+        assert crawl(site.url, cache)['/doc.pdf'] == '2020-01-01T00:00:00+00:00'
+        # Answered in full with the same ETag
+        site.conditional = False
+        monkeypatch.setattr('pysitemap.abc_crawler.lastmod_now', lambda: '2021-01-01T00:00:00+00:00')
+        assert crawl(site.url, cache)['/doc.pdf'] == '2020-01-01T00:00:00+00:00'
+        site.pages['/doc.pdf'] = (dict(PDF, ETag='"2"'), b'%PDF-2')
+        assert crawl(site.url, cache)['/doc.pdf'] == '2021-01-01T00:00:00+00:00'
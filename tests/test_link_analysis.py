@@ -0,0 +1,103 @@
+import random
+import re
+from array import array
+
+import pytest
+
+from pysitemap.async_crawler import Crawler as AsyncCrawler
+from pysitemap.crawler import Crawler
+from pysitemap.link_analysis import LinkAnalysis
+from tests.local_site import LocalSite, links_page
+
+pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+
+
+def ranks(analysis):
+    return dict(zip(analysis.pages.tolist(), analysis.rank.tolist()))
+
+
+def test_known_small_graph():
+    # r0 = 0.05 + 0.85 * (r1 + r2) and r1 = r2 = 0.05 + 0.85 * r0 / 2
+    analysis = LinkAnalysis({0: {1, 2}, 1: {0}, 2: {0}}, tolerance=1e-12)
+    expected = 0.135 / 0.2775
+    assert ranks(analysis) == pytest.approx({0: expected, 1: (1 - expected) / 2, 2: (1 - expected) / 2})
+    assert analysis.in_degree.tolist() == [2, 1, 1]
+    assert analysis.iterations > 1
+
+
+def test_dangling_pages_spread_their_rank():
+    # Page 1 has no links, its rank goes to every page as a random jump does
+    analysis = LinkAnalysis({0: {1}, 1: set()}, tolerance=1e-12)
+    # r0 = (0.85 * r1 + 0.15) / 2 and r1 = 0.85 * r0 + r0
+    assert ranks(analysis) == pytest.approx({0: 1 / 2.85, 1: 1.85 / 2.85})
+    assert analysis.rank.sum() == pytest.approx(1)
+
+
+def test_same_ranks_as_networkx():
+    networkx = pytest.importorskip('networkx')
+    rng = random.Random(3)
+    graph = {page: {rng.randrange(200) for _ in range(rng.randrange(6))} - {page} for page in range(200)}
+    analysis = LinkAnalysis(graph, tolerance=1e-10)
+    digraph = networkx.DiGraph()
+    digraph.add_nodes_from(graph)
+    digraph.add_edges_from((source, target) for source, targets in graph.items() for target in targets)
+    assert ranks(analysis) == pytest.approx(networkx.pagerank(digraph, tol=1e-12), abs=1e-8)
+    assert analysis.in_degree.tolist() == [digraph.in_degree(page) for page in analysis.pages.tolist()]
+
+
+def test_compact_graphs_give_the_same_ranks():
+    graph = {10: {11, 12, 13}, 11: {10}, 12: {11, 10}, 13: set()}
+    compact = {source: array('i', sorted(targets)) for source, targets in graph.items()}
+    assert LinkAnalysis(compact).rank.tolist() == pytest.approx(LinkAnalysis(graph).rank.tolist())
+
+
+def test_self_links_and_links_out_of_the_graph_are_left_out():
+    analysis = LinkAnalysis({5: {5, 6, 99}, 6: {5, 6, 100}})
+    assert analysis.in_degree.tolist() == [1, 1]
+    assert analysis.rank.tolist() == pytest.approx([0.5, 0.5])
+
+
+def test_empty_graph():
+    analysis = LinkAnalysis({})
+    assert len(analysis) == 0 and len(analysis.priorities()) == 0
+
+
+def test_priorities():
+    analysis = LinkAnalysis({0: {1, 2}, 1: {0}, 2: {0}, 3: {0}})
+    priorities = dict(zip(analysis.pages.tolist(), analysis.priorities().tolist()))
+    assert priorities[0] == pytest.approx(1) and priorities[3] == pytest.approx(0.1)
+    assert priorities[1] == priorities[2] and 0.1 < priorities[1] < 1
+    assert LinkAnalysis({0: {1}, 1: {0}}).priorities().tolist() == [0.5, 0.5]
+
+
+@pytest.mark.parametrize('crawler_class', [Crawler, AsyncCrawler])
+def test_sitemap_priorities(crawler_class):
+    pages = {'/': ({}, links_page('/a', '/b')), '/a': ({}, links_page('/', '/b')), '/b': ({}, links_page('/')),
+             '/c': ({}, links_page('/'))}
+    with LocalSite(pages) as site:
+        crawler = crawler_class(site.url + '/', no_verbose=True, robots=False, seed_sitemaps=False,
+                                build_graph=True)
+        try:
+            crawler.start()
+            page_ranks = crawler.page_ranks()
+            sitemap = crawler.generate_sitemap(priority=True)
+        finally:
+            crawler.close()
+    root, a, b = site.url, site.url + '/a', site.url + '/b'
+    assert set(page_ranks) == {root, a, b}
+    assert sum(rank for rank, in_degree in page_ranks.values()) == pytest.approx(1)
+    assert page_ranks[root][1] == 2 and page_ranks[a][1] == 1 and page_ranks[b][1] == 2
+    priorities = dict(re.findall(r'<loc>([^<]*)</loc>\s*<priority>([^<]*)</priority>', sitemap))
+    assert set(priorities) == {root, a, b}
+    assert priorities[root] == '1.0' and priorities[a] == '0.1' and 0.1 < float(priorities[b]) < 1
+
+def test_no_priorities_without_the_graph():
+    with LocalSite({'/': ({}, links_page('/a')), '/a': ({}, links_page('/'))}) as site:
+        crawler = Crawler(site.url + '/', no_verbose=True, robots=False, seed_sitemaps=False)
+        try:
+            crawler.start()
+            assert crawler.page_ranks() is None
+            assert '<priority>' not in crawler.generate_sitemap(priority=True)
+        finally:
+            crawler.close()
@@ -0,0 +1,90 @@
+import pytest
+
+from pysitemap.link_extractor import LinkExtractor, extract_links, header_charset, is_html, sniff_charset
+
+
+def links(html, base_url='http://example.com/dir/'):
+    return extract_links(html, base_url).links
+
+
+@pytest.mark.parametrize('html, expected', [
+    (b'<a href="/a">', ['/a']),
+    (b"<A HREF='/a'>", ['/a']),
+    (b'<a href=/a/b/>', ['/a/b/']),
+    (b'<a\nclass="c"\n  href = "/a" >', ['/a']),
+    (b'<a\thref=/a>', ['/a']),
+    (b'<a/href="/a">', ['/a']),
+    (b'<area shape="rect" href="/a">', ['/a']),
+    (b'<a href=/a', ['/a']),
+    (b'<a href>/x</a>', []),
+    (b'<abbr href=/x>', []),
+    (b'<ahref=/x>', []),
+])
+def test_href_of_link_tags(html, expected):
+    assert links(html) == expected
+
+
+@pytest.mark.parametrize('html', [
+    b'<a title="see href=/x" href="/y">',
+    b"<a title='a \"href=/x' href=/y>",
+    b'<a data-href=/x href=/y>',
+    b'<a data=foo/href=/x href=/y>',
+    b'<a title="x"href="/y">',
+    b'<a title="x"class="y" href="/y">',
+    b'<a class=foo" href="/y">',
+])
+def test_href_only_taken_at_attribute_boundaries(html):
+    assert links(html) == ['/y']
+
+
+def test_no_backtracking_on_malformed_tags():
+    for html in (b'<a' + b' ' * 20000 + b'>', b'<a ' + b'x=1 ' * 5000 + b'>', b'<a ' + b'"' * 20000 + b'>',
+                 b'<a ' + b'"x"' * 7000 + b'>', b'<a ' + b'x="y"/' * 5000 + b'>', b'<a title="' + b'x' * 20000):
+        assert links(html) == []
+
+
+def test_link_rel():
+    html = (b'<link rel="stylesheet" href="/site.css"><link href="/page" REL="Canonical">'
+            b'<link rel="alternate" hreflang="de" href="/de/page"><link title="rel=canonical" href="/t">')
+    extractor = extract_links(html, 'http://example.com/')
+    assert extractor.links == ['/page', '/de/page']
+    assert extractor.canonical == 'http://example.com/page'
+
+
+def test_first_base_wins():
+    extractor = extract_links(b'<base href="/other/"><base href="/last/"><a href="page">', 'http://example.com/dir/')
+    assert extractor.base == 'http://example.com/other/'
+    assert extractor.links == ['page']
+    assert extractor.resolve('page') == 'http://example.com/other/page'
+    assert extractor.resolve('https://example.org/') == 'https://example.org/'
+
+
+def test_entities_are_unescaped():
+    assert links(b'<a href="/p?a=1&amp;b=2"> <a href=" /q ">') == ['/p?a=1&b=2', '/q']
+
+
+def test_chunks_give_the_same_links_as_the_whole_page():
+    html = b''.join(b'<p>text %d</p><a class="c" title="href=/no" href="/page/%d">' % (i, i) for i in range(500))
+    for size in (1, 7, 100, 4096):
+        extractor = LinkExtractor('http://example.com/')
+        for i in range(0, len(html), size):
+            extractor.feed(html[i:i + size])
+        assert extractor.close().links == links(html)
+    assert links(html) == ['/page/%d' % i for i in range(500)]
+
+
+def test_charsets():
+    assert header_charset('text/html; charset="ISO-8859-1"') == 'iso8859-1'
+    assert header_charset('text/html; charset=nonsense') is None
+    assert sniff_charset(b'<meta charset="windows-1252">') == 'cp1252'
+    assert sniff_charset(b'\xef\xbb\xbf<a>') == 'utf-8'
+    html = '<meta charset="iso-8859-1"><a href="/caf\xe9">'.encode('latin-1')
+    assert links(html) == ['/caf\xe9']
+    html = '<a href="/\xfc">'.encode('utf-16')
+    assert extract_links(html, content_type='text/html; charset=utf-16').links == ['/\xfc']
+    assert extract_links(b'\xff\xfe' + '<a href="/x">'.encode('utf-16-le')).links == ['/x']
+
+
+def test_is_html():
+    assert is_html(None) and is_html('text/html; charset=utf-8') and is_html('application/xhtml+xml')
+    assert not is_html('application/pdf')
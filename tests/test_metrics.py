@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from pysitemap.async_crawler import Crawler as AsyncCrawler
+from pysitemap.crawler import Crawler
+from pysitemap.metrics import CallbackSink, CrawlMetrics, Histogram, JsonLinesSink, PrometheusTextfileSink
+from tests.local_site import LocalSite, links_page
+
+
+def test_histogram():
+    histogram = Histogram((1, 2, 4))
+    assert histogram.quantile(0.5) is None
+    for value in (0.5, 1, 1.5, 3, 3.5, 10):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 2, 1]
+    assert histogram.snapshot() == {'count': 6, 'sum': 19.5, 'buckets': [(1, 2), (2, 3), (4, 5), ('+Inf', 6)]}
+    assert histogram.quantile(0.5) == 2
+    assert histogram.quantile(0.25) == 0.75
+    assert histogram.quantile(1) == 4
+
+
+def test_snapshots_are_sent_to_the_sinks():
+    snapshots = []
+    metrics = CrawlMetrics([CallbackSink(snapshots.append)], interval=3600)
+    metrics.start()
+    assert not metrics.emit_due()
+    metrics.fetched(0.02, 1000)
+    metrics.error('HTTP 404')
+    metrics.error('HTTP 404')
+    metrics.parsed(0.001)
+    assert metrics.emit() is snapshots[0]
+    assert snapshots[0]['requests'] == 1 and snapshots[0]['bytes'] == 1000 and snapshots[0]['pages'] == 1
+    assert snapshots[0]['errors'] == {'HTTP 404': 2}
+    assert CrawlMetrics().emit() is None
+
+
+@pytest.mark.parametrize('crawler_class', [Crawler, AsyncCrawler])
+def test_crawl_metrics(tmp_path, crawler_class):
+    pages = {'/': ({}, links_page('/a', '/b', '/missing', '/file.pdf')), '/a': ({}, links_page('/')),
+             '/b': ({}, links_page('/a')), '/file.pdf': ({'Content-Type': 'application/pdf'}, b'%PDF' * 100)}
+    json_path = tmp_path / 'metrics.jsonl'
+    prometheus_path = tmp_path / 'metrics.prom'
+    with LocalSite(pages) as site:
+        crawler = crawler_class(site.url + '/', no_verbose=True, robots=False, seed_sitemaps=False,
+                                metrics_sinks=[JsonLinesSink(str(json_path)),
+                                               PrometheusTextfileSink(str(prometheus_path))])
+        try:
+            crawler.start()
+            metrics = crawler.metrics
+            assert metrics.requests == 4 and metrics.pages == 4
+            assert metrics.errors == {'HTTP 404': 1}
+            assert metrics.skipped_bodies == 1
+            assert metrics.found == 4 and metrics.frontier == 0
+            assert metrics.fetch_seconds.count == 4 and metrics.extract_seconds.count == 3
+        finally:
+            crawler.close()
+    snapshot = json.loads(json_path.read_text().splitlines()[-1])
+    assert snapshot['requests'] == 4 and snapshot['errors'] == {'HTTP 404': 1}
+    text = prometheus_path.read_text()
+    assert 'pysitemap_requests_total 4.0\n' in text
+    assert 'pysitemap_errors_total{class="HTTP 404"} 1.0\n' in text
+    assert 'pysitemap_fetch_seconds_bucket{le="+Inf"} 4.0\n' in text
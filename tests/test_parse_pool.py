@@ -0,0 +1,37 @@
+from pysitemap import parse_pool
+from pysitemap.async_crawler import Crawler as AsyncCrawler
+from pysitemap.parse_pool import ParseConfig, parse_page
+from tests.local_site import LocalSite, links_page
+
+
+def test_parse_page_keeps_internal_links():
+    # The depth limit counts the slashes of the whole url, like the crawler passes it
+    parse_pool._initialize(ParseConfig('www.example.com', None, ['/skip'], 4, ['utm_*'], True))
+    html = ('<base href="http://example.com/dir/"><link rel="canonical" href="/dir/page">'
+            '<a href="a?utm_source=x&b=1"><a href="/dir/a?b=1"><a href="http://other.example/"><a href="/skip/x">'
+            '<a href="/too/deep/page"><a href="mailto:someone@example.com"><a href="/">').encode()
+    urls, canonical = parse_page('http://example.com/dir/page', html, 'text/html')
+    assert urls == ['http://www.example.com/dir/page', 'http://www.example.com/dir/a?b=1', 'http://www.example.com']
+    assert canonical == 'http://example.com/dir/page'
+
+
+def test_crawl_with_a_parse_pool_finds_the_same_site():
+    # Pages past PARSE_POOL_MIN_BYTES are parsed in the pool, the others in the event loop
+    padding = '<p>%s</p>' % ('x' * AsyncCrawler.PARSE_POOL_MIN_BYTES)
+    pages = {'/': ({}, links_page('/big/0', '/small/0'))}
+    for i in range(20):
+        pages['/big/%d' % i] = ({}, padding + links_page('/big/%d' % ((i + 1) % 20), '/small/%d' % i, '/skip/%d' % i))
+        pages['/small/%d' % i] = ({}, links_page('/small/%d' % ((i + 3) % 20), '/big/%d' % (i * 7 % 20)))
+    results = []
+    with LocalSite(pages) as site:
+        for processes in (0, 2):
+            crawler = AsyncCrawler(site.url + '/', no_verbose=True, robots=False, seed_sitemaps=False, build_graph=True,
+                                   exclude='/skip/', parse_processes=processes)
+            try:
+                found = crawler.start()
+                results.append((sorted(found), crawler.generate_graph()))
+                assert (crawler._parse_pool is not None) == bool(processes)
+            finally:
+                crawler.close()
+    assert results[0] == results[1]
+    assert len(results[0][0]) == 41
@@ -0,0 +1,42 @@
+import pytest
+
+from pysitemap.public_suffix import PublicSuffixList, default_suffix_list
+
+
+@pytest.mark.parametrize('host, domain', [
+    ('www.example.co.uk', 'example.co.uk'),
+    ('Example.COM.:8080', 'example.com'),
+    ('http://user@www.example.com:80/path', 'example.com'),
+    # *.kawasaki.jp and !city.kawasaki.jp
+    ('a.b.kawasaki.jp', 'a.b.kawasaki.jp'),
+    ('city.kawasaki.jp', 'city.kawasaki.jp'),
+    ('www.city.kawasaki.jp', 'city.kawasaki.jp'),
+    # *.ck and !www.ck
+    ('foo.bar.ck', 'foo.bar.ck'),
+    ('x.www.ck', 'www.ck'),
+    # 公司.cn, in unicode and punycode
+    ('www.example.xn--55qx5d.cn', 'example.xn--55qx5d.cn'),
+    ('例子.公司.cn', '例子.公司.cn'),
+    ('www.xn--e1afmkfd.xn--p1ai', 'xn--e1afmkfd.xn--p1ai'),
+    ('co.uk', None),
+    ('bar.ck', None),
+    ('localhost', None),
+    ('127.0.0.1', None),
+    ('[::1]:80', None),
+])
+def test_registered_domain(host, domain):
+    assert default_suffix_list().registered_domain(host) == domain
+
+
+def test_list_is_read_once_and_hosts_are_memoized(tmp_path):
+    path = tmp_path / 'list.dat'
+    path.write_text('// comment\n\nexample\n*.wild.example\n!keep.wild.example\nдом.example\n', encoding='utf-8')
+    suffixes = PublicSuffixList(str(path))
+    assert suffixes.registered_domain('a.b.example') == 'b.example'
+    assert suffixes.registered_domain('a.b.wild.example') == 'a.b.wild.example'
+    assert suffixes.registered_domain('a.keep.wild.example') == 'keep.wild.example'
+    assert suffixes.registered_domain('a.b.xn--d1aqf.example') == 'b.xn--d1aqf.example'
+    path.write_text('other\n', encoding='utf-8')
+    assert suffixes.registered_domain('a.b.example') == 'b.example'
+    assert suffixes.registered_domain('a.b.other') is None
+    assert default_suffix_list() is default_suffix_list()
@@ -0,0 +1,73 @@
+import pytest
+
+from pysitemap.crawler import Crawler
+from pysitemap.robots import RobotsRules
+from tests.local_site import LocalSite, links_page
+
+ROBOTS = '''
+User-agent: *
+Disallow: /private
+Allow: /private/public
+Disallow: /*.pdf$
+Disallow: /search?
+Allow: /page
+Disallow: /page
+Disallow: /a%3cd
+Crawl-delay: 2.5
+Sitemap: http://example.com/sitemap.xml
+
+User-agent: pysitemap
+User-agent: other
+Disallow: /other # comment
+Crawl-delay: nonsense
+'''
+
+
+@pytest.mark.parametrize('path, allowed', [
+    ('/', True),
+    ('/private', False),
+    ('/private/page', False),
+    # The longest rule decides
+    ('/private/public/page', True),
+    # On a tie Allow wins
+    ('/page', True),
+    ('/file.pdf', False),
+    ('/file.pdf?download=1', True),
+    ('/dir/file.PDF', True),
+    ('/search?q=x', False),
+    ('/search', True),
+    ('/a%3Cd', False),
+    ('/a<d', False),
+])
+def test_longest_match(path, allowed):
+    assert RobotsRules(ROBOTS).allowed(path) == allowed
+
+
+def test_groups():
+    rules = RobotsRules(ROBOTS, 'Mozilla/5.0 (compatible; PySitemap/1.0)')
+    assert not rules.allowed('/other') and rules.allowed('/private')
+    assert rules.crawl_delay is None
+    rules = RobotsRules(ROBOTS)
+    assert rules.allowed('/other')
+    assert rules.crawl_delay == 2.5
+    assert rules.sitemaps == ['http://example.com/sitemap.xml']
+
+
+def test_empty_rules_allow_everything():
+    assert RobotsRules('').allowed('/anything')
+    assert RobotsRules('User-agent: *\nDisallow:\n').allowed('/anything')
+    assert not RobotsRules('User-agent: *\nDisallow: /\n').allowed('/anything')
+
+
+def test_crawler_skips_disallowed_pages():
+    pages = {'/robots.txt': ({'Content-Type': 'text/plain'}, 'User-agent: *\nDisallow: /private\n'),
+             '/': ({}, links_page('/public', '/private/page')), '/public': ({}, links_page()),
+             '/private/page': ({}, links_page())}
+    with LocalSite(pages) as site:
+        crawler = Crawler(site.url + '/', no_verbose=True, seed_sitemaps=False)
+        try:
+            found = crawler.start()
+        finally:
+            crawler.close()
+    assert sorted(found) == [site.url, site.url + '/public']
+    assert '/private/page' not in site.requests
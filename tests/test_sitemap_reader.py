@@ -0,0 +1,77 @@
+import gzip
+
+import pytest
+
+from pysitemap.async_crawler import Crawler as AsyncCrawler
+from pysitemap.crawler import Crawler
+from pysitemap.sitemap_reader import SitemapParser, read_sitemap
+from pysitemap.sitemap_writer import INDEX_FOOTER, INDEX_HEADER, URLSET_FOOTER, URLSET_HEADER, url_entry
+from tests.local_site import LocalSite, links_page
+
+
+def urlset(*urls):
+    return URLSET_HEADER + ''.join(url_entry(url) for url in urls) + URLSET_FOOTER
+
+
+def sitemap_index(*urls):
+    return INDEX_HEADER + ''.join('<sitemap><loc>%s</loc></sitemap>' % url for url in urls) + INDEX_FOOTER
+
+
+def test_read_sitemap():
+    assert read_sitemap(urlset('http://example.com/a', 'http://example.com/b?x=1&y=2').encode()) == \
+        (['http://example.com/a', 'http://example.com/b?x=1&y=2'], False)
+    assert read_sitemap(sitemap_index('http://example.com/s1.xml').encode()) == (['http://example.com/s1.xml'], True)
+    assert read_sitemap(gzip.compress(urlset('http://example.com/a').encode())) == (['http://example.com/a'], False)
+
+
+def test_malformed_sitemap_keeps_the_locs_read():
+    body = urlset('http://example.com/a', 'http://example.com/b').encode()
+    assert read_sitemap(body[:body.rindex(b'<url>')] + b'<url><loc>broken')[0] == ['http://example.com/a']
+    assert read_sitemap(b'not a sitemap') == ([], False)
+    # Cut before its checksum
+    assert read_sitemap(gzip.compress(body)[:-8])[0] == ['http://example.com/a', 'http://example.com/b']
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_chunks_are_parsed_as_fed(compress):
+    urls = ['http://example.com/page/%d' % i for i in range(2000)]
+    body = urlset(*urls).encode()
+    if compress:
+        body = gzip.compress(body)
+    parser = SitemapParser()
+    locs = []
+    # Byte by byte until the gzip magic number is known, then in larger chunks
+    for i in range(10):
+        locs += parser.feed(body[i:i + 1])
+    for i in range(10, len(body), 4096):
+        locs += parser.feed(body[i:i + 4096])
+    locs += parser.close()
+    assert locs == urls and not parser.index
+    # Elements already read are dropped
+    assert len(parser._root) <= 1
+
+
+def test_size_limit():
+    body = urlset(*('http://example.com/page/%d' % i for i in range(1000))).encode()
+    parser = SitemapParser(max_bytes=len(body) // 2)
+    locs = parser.feed(gzip.compress(body))
+    assert 400 < len(locs) < 500
+
+
+@pytest.mark.parametrize('crawler_class', [Crawler, AsyncCrawler])
+def test_crawl_is_seeded_from_sitemaps(crawler_class):
+    pages = {'/': ({}, links_page('/linked')), '/linked': ({}, links_page()), '/orphan': ({}, links_page()),
+             '/deep/orphan': ({}, links_page())}
+    with LocalSite(pages) as site:
+        site.pages['/robots.txt'] = ({'Content-Type': 'text/plain'}, 'Sitemap: %s/index.xml.gz\n' % site.url)
+        site.pages['/index.xml.gz'] = ({'Content-Type': 'application/gzip'},
+                                       gzip.compress(sitemap_index(site.url + '/part.xml').encode()))
+        site.pages['/part.xml'] = ({'Content-Type': 'application/xml'},
+                                   urlset(site.url + '/deep/orphan', 'http://other.example/x'))
+        site.pages['/sitemap.xml'] = ({'Content-Type': 'application/xml'}, urlset(site.url + '/orphan'))
+        crawler = crawler_class(site.url + '/', no_verbose=True)
+        try:
+            found = crawler.start()
+        finally:
+            crawler.close()
+    assert sorted(found) == [site.url, site.url + '/deep/orphan', site.url + '/linked', site.url + '/orphan']
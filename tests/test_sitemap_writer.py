@@ -0,0 +1,81 @@
+import gzip
+import os
+
+from pysitemap.sitemap_reader import read_sitemap
+from pysitemap.sitemap_writer import SitemapWriter
+
+
+def write(path, count, **options):
+    with SitemapWriter(str(path), **options) as writer:
+        for i in range(count):
+            writer.add('http://example.com/page/%d?a=1&b=2' % i, lastmod='2024-01-02')
+    return writer.close()
+
+
+def read(path):
+    with open(path, 'rb') as file:
+        return read_sitemap(file.read())
+
+
+def names(directory):
+    return sorted(os.listdir(str(directory)))
+
+
+def test_single_file(tmp_path):
+    paths = write(tmp_path / 'sitemap.xml', 3)
+    assert paths == [str(tmp_path / 'sitemap.xml')]
+    assert names(tmp_path) == ['sitemap.xml']
+    assert read(paths[0]) == (['http://example.com/page/%d?a=1&b=2' % i for i in range(3)], False)
+
+
+def test_empty_sitemap(tmp_path):
+    paths = write(tmp_path / 'sitemap.xml', 0)
+    assert read(paths[0]) == ([], False)
+
+
+def test_rollover_at_the_url_limit(tmp_path):
+    paths = write(tmp_path / 'sitemap.xml', SitemapWriter.MAX_URLS + 1, base_url='http://example.com/maps/')
+    assert names(tmp_path) == ['sitemap-1.xml', 'sitemap-2.xml', 'sitemap_index.xml']
+    assert read(paths[0]) == (['http://example.com/maps/sitemap-1.xml', 'http://example.com/maps/sitemap-2.xml'],
+                              True)
+    assert len(read(paths[1])[0]) == SitemapWriter.MAX_URLS
+    assert read(paths[2])[0] == ['http://example.com/page/%d?a=1&b=2' % SitemapWriter.MAX_URLS]
+
+
+def test_rollover_at_the_byte_limit(tmp_path):
+    paths = write(tmp_path / 'sitemap.xml', 100, max_bytes=2000)
+    locs = []
+    for path in paths[1:]:
+        assert os.path.getsize(path) <= 2000
+        locs += read(path)[0]
+    assert len(paths) > 3
+    assert locs == ['http://example.com/page/%d?a=1&b=2' % i for i in range(100)]
+
+
+def test_limits_are_capped_by_the_protocol(tmp_path):
+    writer = SitemapWriter(str(tmp_path / 'sitemap.xml'), max_urls=10 ** 6, max_bytes=0)
+    assert writer._max_urls == SitemapWriter.MAX_URLS and writer._max_bytes == SitemapWriter.MAX_BYTES
+    writer.close()
+
+
+def test_compressed(tmp_path):
+    paths = write(tmp_path / 'sitemap.xml.gz', 10, max_urls=4)
+    assert names(tmp_path) == ['sitemap-1.xml.gz', 'sitemap-2.xml.gz', 'sitemap-3.xml.gz', 'sitemap_index.xml.gz']
+    with gzip.open(paths[1]) as file:
+        assert file.read().startswith(b'<?xml')
+    assert read(paths[0]) == (['sitemap-1.xml.gz', 'sitemap-2.xml.gz', 'sitemap-3.xml.gz'], True)
+    assert sum(len(read(path)[0]) for path in paths[1:]) == 10
+
+
+def test_stale_shards_are_removed(tmp_path):
+    write(tmp_path / 'sitemap.xml', 10, max_urls=2)
+    assert len(names(tmp_path)) == 6
+    paths = write(tmp_path / 'sitemap.xml', 5, max_urls=2)
+    assert names(tmp_path) == ['sitemap-1.xml', 'sitemap-2.xml', 'sitemap-3.xml', 'sitemap_index.xml']
+    assert len(read(paths[0])[0]) == 3
+    write(tmp_path / 'sitemap.xml', 1, max_urls=2)
+    assert names(tmp_path) == ['sitemap.xml']
+    # Files of other sitemaps in the same directory are left alone
+    write(tmp_path / 'news.xml', 3, max_urls=1)
+    write(tmp_path / 'news.xml', 2, max_urls=1)
+    assert names(tmp_path) == ['news-1.xml', 'news-2.xml', 'news_index.xml', 'sitemap.xml']
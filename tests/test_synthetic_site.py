@@ -0,0 +1,58 @@
+import gzip
+
+import pytest
+
+from benchmarks.synthetic_site import SyntheticSite
+from pysitemap.async_crawler import Crawler as AsyncCrawler
+from pysitemap.crawler import Crawler
+
+
+def test_same_seed_same_site():
+    first, second, other = SyntheticSite(pages=200, seed=3), SyntheticSite(pages=200, seed=3), SyntheticSite(pages=200)
+    assert all(first.links(page) == second.links(page) for page in range(200))
+    assert first.body(17) == second.body(17) != other.body(17)
+    assert [first.is_error(page) for page in range(200)] == [second.is_error(page) for page in range(200)]
+    assert len(first.body(17)) >= 16 * 1024
+
+
+def test_every_page_is_reachable():
+    site = SyntheticSite(pages=500, fanout=4, depth=6, redirect_rate=0)
+    reached = {0}
+    queue = [0]
+    while queue:
+        for path in site.links(queue.pop()):
+            page = int(path.rsplit('/', 1)[1])
+            if page not in reached:
+                reached.add(page)
+                queue.append(page)
+    assert reached == set(range(500))
+
+
+def test_responses():
+    site = SyntheticSite(pages=100, error_rate=0.2, corrupt_rate=0.2, redirect_chain=2)
+    assert site.respond('/')[0] == 200
+    assert site.respond('/r/2/5') == (301, b'', {'Location': '/r/1/5'})
+    assert site.respond('/r/1/5') == (301, b'', {'Location': '/p/5'})
+    assert site.respond('/p/100')[0] == 404 and site.respond('/nothing')[0] == 404
+    statuses = [site.respond('/p/%d' % page)[0] for page in range(1, 100)]
+    assert 0 < statuses.count(500) < 40
+    page = next(page for page in range(1, 100) if not site.is_error(page) and not site.is_corrupt(page))
+    status, body, headers = site.respond('/p/%d' % page, 'gzip, deflate')
+    assert headers == {'Content-Encoding': 'gzip'} and gzip.decompress(body) == site.body(page)
+
+
+@pytest.mark.parametrize('crawler_class', [Crawler, AsyncCrawler])
+def test_crawl_finds_every_page(crawler_class):
+    site = SyntheticSite(pages=150, fanout=5, depth=4, error_rate=0, corrupt_rate=0, page_size=2048)
+    url = site.start()
+    try:
+        crawler = crawler_class(url, no_verbose=True, robots=False, seed_sitemaps=False)
+        try:
+            found = crawler.start()
+        finally:
+            crawler.close()
+    finally:
+        site.close()
+    pages = {found_url[len(url) - 1:] for found_url in found if '/p/' in found_url}
+    # Random links may point back at the root as /p/0
+    assert pages - {'/p/0'} == {'/p/%d' % page for page in range(1, 150)}
@@ -0,0 +1,74 @@
+import logging
+import threading
+import time
+
+from pysitemap import throttled_log
+from pysitemap.throttled_log import ThrottledLogger
+
+
+class Records(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def logger(name):
+    records = Records()
+    logger = logging.getLogger('tests.throttled_log.' + name)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    logger.handlers = [records]
+    return logger, records
+
+
+def test_bursts_and_suppressed_count(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(throttled_log.time, 'monotonic', lambda: now[0])
+    log, records = logger('burst')
+    throttled = ThrottledLogger(log, rate=2, burst=3)
+    for i in range(10):
+        throttled.info('page %s', i)
+    throttled.info('other')
+    assert records.messages == ['page 0', 'page 1', 'page 2', 'other']
+    now[0] += 0.5
+    throttled.info('page %s', 10)
+    throttled.info('page %s', 11)
+    assert records.messages[4:] == ['page 10 (7 similar messages suppressed)']
+
+
+def test_disabled_levels_and_no_rate():
+    log, records = logger('levels')
+    log.setLevel(logging.WARNING)
+    throttled = ThrottledLogger(log, rate=0)
+    for i in range(50):
+        throttled.debug('hidden')
+        throttled.warning('shown %d', i)
+    assert records.messages == ['shown %d' % i for i in range(50)]
+
+
+def test_threads_share_the_burst(monkeypatch):
+    # Give the other threads a chance to run between reading a bucket and updating it
+    def slow_min(*args):
+        time.sleep(0)
+        return min(*args)
+    monkeypatch.setattr(throttled_log, 'min', slow_min, raising=False)
+    log, records = logger('threads')
+    throttled = ThrottledLogger(log, rate=1e-9, burst=50)
+    barrier = threading.Barrier(8)
+
+    def work():
+        barrier.wait()
+        for _ in range(500):
+            throttled.info('message')
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(records.messages) == 50
+    assert throttled._buckets['message'][2] == 8 * 500 - 50
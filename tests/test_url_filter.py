@@ -0,0 +1,62 @@
+import re
+
+from pysitemap.url_filter import UrlFilter, compile_patterns
+
+URLS = ['http://example.com/', 'http://example.com/tag/word1', 'http://example.com/tag/word12/page',
+        'http://example.com/files/report.pdf', 'http://example.com/a.png?x=1', 'http://example.com/?sid=3',
+        'http://example.com/p?a=1&session7=x', 'http://example.com/archive/2019/05/', 'http://example.com/ADMIN/']
+
+
+def one_by_one(patterns, url):
+    return any(re.search(pattern, url) for pattern in patterns)
+
+
+def test_combined_patterns_match_like_each_pattern():
+    patterns = [r'/tag/word1(/|$)', r'\.pdf$', r'\.jpg|\.png', r'[?&]session\d+=', r'/archive/20\d\d/', r'\?sid=',
+                r'^http://example\.com/$', r'(?:ADMIN|admin)/', r'x*', r'/tag/word12/']
+    for count in range(1, len(patterns) + 1):
+        pattern = compile_patterns(patterns[:count])
+        for url in URLS:
+            assert (pattern.search(url) is not None) == one_by_one(patterns[:count], url), (patterns[:count], url)
+
+
+def test_literal_starts_are_merged():
+    assert compile_patterns([r'\.jpg|\.png']).pattern == r'\.(?:jpg|png)'
+    assert compile_patterns(['/tag/', '/tags/']).pattern == '/tag(?:/|s/)'
+    # A class of a few characters is spelled out
+    assert compile_patterns(['[?&]sid=']).pattern == r'(?:\&sid=|\?sid=)'
+
+
+def test_pattern_matching_everywhere():
+    assert compile_patterns(['/tag/', '']).search('http://example.com/')
+    assert compile_patterns(['/tag/', 'a|']).search('http://example.com/')
+
+
+def test_group_references_searched_one_by_one():
+    pattern = compile_patterns([r'/(\w+)/\1/', r'\.pdf$'])
+    assert pattern.search('http://example.com/a/a/')
+    assert not pattern.search('http://example.com/a/b/')
+    assert pattern.search('http://example.com/a.pdf')
+
+
+def test_flags_searched_one_by_one():
+    pattern = compile_patterns(['(?i)/admin/', r'\.pdf$'])
+    assert pattern.search('http://example.com/ADMIN/')
+    assert pattern.search('http://example.com/a.pdf')
+
+
+def test_many_patterns():
+    patterns = [r'/section-%d/' % i for i in range(300)] + [r'\.ext%d$' % i for i in range(300)]
+    pattern = compile_patterns(patterns)
+    assert pattern.search('http://example.com/section-299/item')
+    assert pattern.search('http://example.com/file.ext0')
+    assert not pattern.search('http://example.com/section-300/item')
+    assert not pattern.search('http://example.com/file.ext0.html')
+
+
+def test_url_filter():
+    url_filter = UrlFilter([r'\.pdf$'], max_path_depth=4)
+    assert url_filter.excluded('http://example.com/a.pdf')
+    assert url_filter.excluded('http://example.com/a/b/c')
+    assert not url_filter.excluded('http://example.com/a/b')
+    assert not UrlFilter().excluded('http://example.com/a.pdf')
@@ -0,0 +1,31 @@
+from pysitemap.crawler import Crawler
+from pysitemap.url_index import UrlIndex
+from tests.local_site import LocalSite, links_page
+
+
+def test_urls_are_interned_once():
+    urls = UrlIndex()
+    assert urls.intern('http://example.com/') == 0
+    assert urls.intern('http://example.com/a') == 1
+    assert urls.intern('http://example.com/') == 0
+    assert len(urls) == 2
+    assert 'http://example.com/a' in urls and 'http://example.com/b' not in urls
+    assert urls[1] == 'http://example.com/a'
+    assert urls.get('http://example.com/b') is None and urls.get('http://example.com/b', -1) == -1
+    assert list(urls) == ['http://example.com/', 'http://example.com/a']
+    assert urls.urls([1, 0]) == ['http://example.com/a', 'http://example.com/']
+
+
+def test_every_page_requested_once():
+    pages = {'/': ({}, links_page('/a', '/b', '/a', '/c'))}
+    pages.update(('/' + name, ({}, links_page('/', '/a', '/b', '/c'))) for name in 'abc')
+    with LocalSite(pages) as site:
+        crawler = Crawler(site.url + '/', no_verbose=True, robots=False, seed_sitemaps=False, build_graph=True,
+                          workers=4)
+        try:
+            crawler.start()
+            graph = crawler.generate_graph()
+        finally:
+            crawler.close()
+    assert sorted(site.requests) == ['/', '/a', '/b', '/c']
+    assert graph[site.url] == {site.url + '/a', site.url + '/b', site.url + '/c'}
@@ -0,0 +1,55 @@
+import pytest
+
+from pysitemap.url_normalizer import TRACKING_PARAMS, UrlNormalizer, is_internal
+
+
+@pytest.mark.parametrize('href, base, url', [
+    ('/a/b/', 'http://example.com/x/y', 'http://www.example.com/a/b'),
+    ('c', 'http://example.com/x/y', 'http://www.example.com/x/c'),
+    ('//example.com/q', 'https://example.com/', 'http://www.example.com/q'),
+    ('/a#fragment', 'http://example.com/', 'http://www.example.com/a'),
+    ('HTTPS://Example.COM/A/', None, 'http://www.example.com/A'),
+    ('example.com/a', None, 'http://www.example.com/a'),
+    ('localhost:8000/a', None, 'http://localhost:8000/a'),
+    ('127.0.0.1/a', None, 'http://127.0.0.1/a'),
+    ('http://[::1]:80/a', None, 'http://[::1]/a'),
+])
+def test_normalize(href, base, url):
+    assert UrlNormalizer().normalize(href, base).url == url
+
+
+@pytest.mark.parametrize('href', ['mailto:someone@example.com', 'ftp://example.com/', 'javascript:void(0)', 'http://'])
+def test_links_that_cant_be_crawled(href):
+    assert UrlNormalizer().normalize(href, 'http://example.com/') is None
+
+
+def test_parts_of_the_url():
+    link = UrlNormalizer(get_domain=lambda host: 'example.com').normalize('/a/b?c=1', 'http://shop.example.com/')
+    assert link == ('http://www.shop.example.com/a/b?c=1', 'http', 'www.shop.example.com', '/a/b', 'example.com', 2)
+
+
+def test_root_relative_links_share_a_cache_entry():
+    normalizer = UrlNormalizer()
+    for page in range(10):
+        assert normalizer.normalize('/about', 'http://example.com/page/%d' % page).url == 'http://www.example.com/about'
+    assert normalizer.cache_info().hits == 9
+    # A relative link depends on the whole base url
+    assert normalizer.normalize('about', 'http://example.com/page/1').url == 'http://www.example.com/page/about'
+    assert normalizer.cache_info().misses == 2
+
+
+def test_strip_and_sort_params():
+    normalizer = UrlNormalizer(strip_params=TRACKING_PARAMS, sort_params=True)
+    assert normalizer.normalize('http://example.com/p;jsessionid=1?utm_source=x&b=2&a=1&a=0&GCLID=3').url == \
+        'http://www.example.com/p?a=1&a=0&b=2'
+    assert normalizer.normalize('http://example.com/p/?utm_source=x').url == 'http://www.example.com/p'
+    assert UrlNormalizer().normalize('http://example.com/p?utm_source=x&b=2&a=1').url == \
+        'http://www.example.com/p?utm_source=x&b=2&a=1'
+
+
+def test_is_internal():
+    normalizer = UrlNormalizer(get_domain=lambda host: host.split('.', 1)[1])
+    link = normalizer.normalize('http://blog.example.com/')
+    assert not is_internal(link, 'www.example.com')
+    assert is_internal(link, 'www.blog.example.com')
+    assert is_internal(link, 'www.example.com', 'blog.example.com')